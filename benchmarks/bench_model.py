@@ -0,0 +1,61 @@
+"""
+Compare constructing ``Episode`` / ``WebsiteBangumi`` with validation and with ``trusted``.
+
+    python benchmarks/bench_model.py [count]
+"""
+
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from bgmi.website.model import Episode, WebsiteBangumi
+
+
+def rows(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "title": f"[Lilith-Raws] Bangumi Name - {i % 24 + 1:02d} [Baha][WEB-DL][1080p][AVC AAC][CHT][MP4]",
+            "download": f"magnet:?xt=urn:btih:{i:040x}",
+            "episode": i % 24 + 1,
+            "time": 1700000000 + i,
+            "subtitle_group": "34",
+        }
+        for i in range(count)
+    ]
+
+
+def bench(name: str, count: int, build: Callable[[], Any]) -> None:
+    build()  # warm up
+
+    start = time.perf_counter()
+    build()
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    print(f"{name:<28} {elapsed / count * 1e6:8.2f} us/episode {peak / count:8.0f} bytes/episode")
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    data = rows(count)
+
+    bench("Episode(**row)", count, lambda: [Episode(**row) for row in data])
+    bench("Episode.trusted(**row)", count, lambda: [Episode.trusted(**row) for row in data])
+
+    episodes = [Episode.trusted(**row) for row in data]
+    bench("WebsiteBangumi(episodes)", count, lambda: WebsiteBangumi(keyword="1", update_time="Mon", episodes=episodes))
+    bench(
+        "WebsiteBangumi.trusted(...)",
+        count,
+        lambda: WebsiteBangumi.trusted(keyword="1", update_time="Mon", episodes=episodes),
+    )
+
+
+if __name__ == "__main__":
+    main()
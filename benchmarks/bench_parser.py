@@ -0,0 +1,157 @@
+"""
+Throughput and peak memory of data source parsers.
+
+    python benchmarks/bench_parser.py [--rows 2000] [--pages DIR] [--repeat 3] [-k mikan]
+
+Pages are generated by ``pages.py`` with ``--rows`` rows,
+pages saved from real websites in ``--pages`` (same file names as ``pages.PAGES``) are used instead if exist.
+Network functions are patched to return these pages, nothing is sent to websites.
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sized
+from unittest import mock
+
+import pages as generated_pages
+from pages import generate
+
+from bgmi.config import cfg
+from bgmi.utils import parse_episode
+from bgmi.website import bangumi_moe, mikan, share_dmhy
+
+
+class Pages:
+    def __init__(self, rows: int, directory: Optional[Path]):
+        self.rows = rows
+        self.directory = directory
+
+    def __getitem__(self, name: str) -> str:
+        if self.directory is not None and self.directory.joinpath(name).exists():
+            return self.directory.joinpath(name).read_text(encoding="utf-8")
+        return generate(name, self.rows)
+
+
+def bench(name: str, run: Callable[[], Sized], repeat: int) -> None:
+    run()  # warm up
+
+    best = float("inf")
+    rows = 0
+    for _ in range(repeat):
+        parse_episode.cache_clear()
+        start = time.perf_counter()
+        rows = len(run())
+        best = min(best, time.perf_counter() - start)
+
+    parse_episode.cache_clear()
+    tracemalloc.start()
+    result = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    print(f"{name:<44} {rows:>7} rows {rows / best:>10.0f} rows/s {peak / 1024:>10.0f} KiB peak")
+
+
+def benchmarks(pages: Pages) -> List[Any]:
+    mikan_bangumi = pages["mikan_bangumi.html"]
+    # every subtitle group has more episodes than bangumi page shows
+    mikan_expanded = generated_pages.mikan_bangumi(12, random.Random(0), expand=True)
+    expand_response = mock.Mock(text=pages["mikan_expand.html"])
+
+    programme = pages["dmhy_programme.html"]
+    dmhy_search = pages["dmhy_search.html"]
+    torrents = json.loads(pages["bangumi_moe_torrents.json"])["torrents"]
+
+    def dmhy_week_days() -> list:
+        # how calendar was parsed before `parse_bangumi_calendar`
+        return [
+            b
+            for array_name, update_time in share_dmhy._WEEK_DAY_ARRAYS.items()  # pylint: disable=protected-access
+            for b in share_dmhy.parse_bangumi_with_week_days(programme, update_time, array_name)
+        ]
+
+    def with_patch(target: str, run: Callable[[], Sized], **kwargs: Any) -> Callable[[], Sized]:
+        def patched() -> Sized:
+            with mock.patch(target, **kwargs):
+                return run()
+
+        return patched
+
+    return [
+        (
+            "mikan parse_episodes",
+            with_patch(
+                "bgmi.website.mikan.requests.get",
+                lambda: mikan.parse_episodes(mikan_bangumi, "3141"),
+                return_value=expand_response,
+            ),
+        ),
+        (
+            "mikan parse_bangumi_details_page",
+            lambda: mikan.Mikanani().parse_bangumi_details_page(mikan_bangumi)["subtitle_group"],
+        ),
+        (
+            "mikan parse_episodes (expand)",
+            with_patch(
+                "bgmi.website.mikan.requests.get",
+                lambda: mikan.parse_episodes(mikan_expanded, "3141"),
+                return_value=expand_response,
+            ),
+        ),
+        (
+            "mikan search_by_keyword",
+            with_patch(
+                "bgmi.website.mikan.get_text",
+                lambda: mikan.Mikanani().search_by_keyword("name"),
+                return_value=pages["mikan_search.html"],
+            ),
+        ),
+        (
+            "mikan fetch_bangumi_calendar",
+            with_patch(
+                "bgmi.website.mikan.get_text",
+                lambda: mikan.Mikanani().fetch_bangumi_calendar(),
+                return_value=pages["mikan_calendar.html"],
+            ),
+        ),
+        ("mikan parse_rss_episodes", lambda: mikan.parse_rss_episodes(pages["mikan_rss.xml"].encode())),
+        ("dmhy parse_bangumi_with_week_days x7", dmhy_week_days),
+        ("dmhy parse_bangumi_calendar", lambda: share_dmhy.parse_bangumi_calendar(programme)),
+        (
+            "dmhy search_by_keyword",
+            with_patch(
+                "bgmi.website.share_dmhy.fetch_url",
+                lambda: share_dmhy.DmhySource().search_by_keyword("name", count=1),
+                return_value=dmhy_search,
+            ),
+        ),
+        (
+            "bangumi_moe process_search_result",
+            lambda: bangumi_moe.BangumiMoe().process_search_result("name", torrents),
+        ),
+        ("bangumi_moe parse_torrents", lambda: bangumi_moe.BangumiMoe().parse_torrents(torrents)),
+    ]
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=2000, help="rows of generated pages")
+    parser.add_argument("--pages", type=Path, default=None, help="directory of pages saved from websites")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-k", dest="keyword", default="", help="only run benchmarks containing keyword")
+    args = parser.parse_args(argv)
+
+    print(f"html parser: {mikan.make_soup('').builder.NAME}, config: {cfg.html_parser!r}")
+    for name, run in benchmarks(Pages(args.rows, args.pages)):
+        if args.keyword in name:
+            bench(name, run, args.repeat)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,52 @@
+"""
+Compare parsing release time of data sources with ``strptime`` and ``bgmi.utils.parse_time``.
+
+    python benchmarks/bench_time.py [count]
+"""
+
+import datetime
+import sys
+import time
+from typing import Callable, List
+
+from bgmi.utils import parse_time
+
+
+def time_strings(count: int, fmt: str) -> List[str]:
+    start = datetime.datetime(2024, 1, 1)
+    return [(start + datetime.timedelta(minutes=17 * i)).strftime(fmt) for i in range(count)]
+
+
+def bench(name: str, count: int, parse: Callable[[], List[int]]) -> List[int]:
+    parse()  # warm up
+
+    start = time.perf_counter()
+    result = parse()
+    elapsed = time.perf_counter() - start
+
+    print(f"{name:<36} {elapsed / count * 1e6:8.2f} us/row {count / elapsed:12.0f} rows/s")
+    return result
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    mikan = time_strings(count, "%Y/%m/%d %H:%M")
+    expected = bench(
+        "time.mktime(time.strptime(...))",
+        count,
+        lambda: [int(time.mktime(time.strptime(s, "%Y/%m/%d %H:%M"))) for s in mikan],
+    )
+    assert bench("parse_time (mikan, dmhy)", count, lambda: [parse_time(s) for s in mikan]) == expected
+
+    moe = [s + ".000Z" for s in time_strings(count, "%Y-%m-%dT%H:%M:%S")]
+    expected = bench(
+        "datetime.strptime(...).timestamp()",
+        count,
+        lambda: [int(datetime.datetime.strptime(s.split(".")[0], "%Y-%m-%dT%H:%M:%S").timestamp()) for s in moe],
+    )
+    assert bench("parse_time (bangumi.moe, rss)", count, lambda: [parse_time(s) for s in moe]) == expected
+
+
+if __name__ == "__main__":
+    main()
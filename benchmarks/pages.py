@@ -0,0 +1,180 @@
+"""
+Generate pages of data sources with any number of rows, in the layout parsers of ``bgmi.website`` read.
+
+    python benchmarks/pages.py <output dir> [rows]
+
+writes one file of each kind in ``PAGES`` to output dir,
+pages saved from real websites with the same file names can be used by ``bench_parser.py`` instead.
+"""
+
+import datetime
+import json
+import random
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List
+from xml.sax.saxutils import escape
+
+_TITLES = [
+    "[喵萌奶茶屋&LoliHouse] 葬送的芙莉莲 / Sousou no Frieren - {e:02d} [WebRip 1080p HEVC-10bit AAC][简繁日内封字幕]",
+    "【喵萌奶茶屋】★十月新番★[葬送的芙莉莲 / Sousou no Frieren][{e:02d}][1080p][简日双语]",
+    "[ANi] 葬送的芙莉蓮 - {e:02d} [1080P][Baha][WEB-DL][AAC AVC][CHT][MP4]",
+    "[云光字幕组] 葬送的芙莉莲 Sousou no Frieren 第{e:02d}话 [简体双语][1080p]招募翻译",
+    "[Lilith-Raws] 葬送的芙莉蓮 / Sousou no Frieren - {e:02d} [Baha][WEB-DL][1080p][AVC AAC][CHT][MP4]",
+    "[桜都字幕组] 葬送的芙莉莲 / Sousou no Frieren [{e:02d}][1080P][简繁内封]",
+    "[北宇治字幕组] 葬送的芙莉莲 / Sousou no Frieren [{e:02d}-{e2:02d}][WebRip][1080p][HEVC_AAC][简繁日内封]",
+]
+
+_START = datetime.datetime(2023, 9, 29, 23, 0)
+
+
+def _title(i: int, rnd: random.Random) -> str:
+    e = i % 28 + 1
+    return rnd.choice(_TITLES).format(e=e, e2=e + 1)
+
+
+def _time(i: int) -> datetime.datetime:
+    return _START + datetime.timedelta(minutes=37 * i)
+
+
+def _group(i: int) -> int:
+    return 500 + i % 12
+
+
+def _mikan_rows(rows: int, rnd: random.Random, start: int = 0) -> str:
+    return "".join(
+        f"""
+    <tr>
+      <td><a class="magnet-link-wrap" href="/Home/Episode/{i:040x}">{escape(_title(i, rnd))}</a>
+          <a class="js-magnet magnet-link" data-clipboard-text="magnet:?xt=urn:btih:{i:040x}">[复制磁连]</a></td>
+      <td>1.2GB</td><td>{_time(i):%Y/%m/%d %H:%M}</td><td><a href="/Download/{i:040x}.torrent"></a></td>
+    </tr>"""
+        for i in range(start, start + rows)
+    )
+
+
+def mikan_bangumi(rows: int, rnd: random.Random, expand: bool = False) -> str:
+    groups = [_group(i) for i in range(min(rows, 12))]
+    per_group = max(1, rows // max(1, len(groups)))
+    nav = "".join(f'<li><a data-anchor="#{g}">字幕组{g}</a></li>' for g in groups)
+    central = ""
+    for index, g in enumerate(groups):
+        central += f'<div class="subgroup-text" id="{g}">字幕组{g}</div>'
+        central += "<table><tr><th>番组名</th><th>大小</th><th>更新时间</th><th>下载</th></tr>"
+        central += _mikan_rows(per_group, rnd, index * per_group) + "</table>"
+        if expand:
+            central += f'<div class="episode-expand" data-bangumiid="3141" data-subtitlegroupid="{g}"></div>'
+    return f"""<html><body>
+<div class="pull-left leftbar-container">
+  <p class="bangumi-title">葬送的芙莉莲</p>
+  <p class="bangumi-info">放送日期：星期五</p>
+  <div class="leftbar-nav"><ul>{nav}</ul></div>
+</div>
+<div class="central-container">{central}</div>
+</body></html>"""
+
+
+def mikan_expand(rows: int, rnd: random.Random) -> str:
+    return f"<table><tr><th>番组名</th><th>大小</th><th>更新时间</th><th>下载</th></tr>{_mikan_rows(rows, rnd)}</table>"
+
+
+def mikan_search(rows: int, rnd: random.Random) -> str:
+    body = _mikan_rows(rows, rnd).replace("<tr>", '<tr class="js-search-results-row">')
+    return f'<html><body><table class="table-striped">{body}</table></body></html>'
+
+
+def mikan_calendar(rows: int, rnd: random.Random) -> str:
+    days = ""
+    for day in (0, 1, 2, 3, 4, 5, 6, 8):
+        items = "".join(
+            f'<li><span data-src="/images/Bangumi/202310/{i:08x}.jpg?width=400"></span>'
+            f'<a href="/Home/Bangumi/{3000 + i}" title="番剧{i}">番剧{i}</a></li>'
+            for i in range(day, rows, 8)
+        )
+        days += f'<div class="sk-bangumi" data-dayofweek="{day}"><ul>{items}</ul></div>'
+    return f"<html><body>{days}</body></html>"
+
+
+def mikan_rss(rows: int, rnd: random.Random) -> str:
+    items = "".join(
+        f"""<item>
+  <title>{escape(_title(i, rnd))}</title>
+  <link>https://mikanani.me/Home/Episode/{i:040x}</link>
+  <torrent xmlns="https://mikanani.me/0.1/"><pubDate>{_time(i):%Y-%m-%dT%H:%M:%S}.123</pubDate></torrent>
+  <enclosure type="application/x-bittorrent" length="1" url="https://mikanani.me/Download/{i:040x}.torrent" />
+</item>"""
+        for i in range(rows)
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><rss version="2.0"><channel>{items}</channel></rss>'
+
+
+def dmhy_programme(rows: int, rnd: random.Random) -> str:
+    lines = [f"var {day}array = new Array();" for day in ("sun", "mon", "tue", "wed", "thu", "fri", "sat")]
+    for i in range(rows):
+        day = ("sun", "mon", "tue", "wed", "thu", "fri", "sat")[i % 7]
+        groups = "".join(
+            f'<a href="/topics/list?keyword=%E8%8A%99{i}+team_id%3A{_group(i + j)}">字幕组{_group(i + j)}</a>'
+            for j in range(i % 5 + 1)
+        )
+        keyword = f"番剧{i}|Bangumi {i}" if i % 3 else f"'+encodeURIComponent('番剧{i}')+'"
+        lines.append(
+            f"{day}array.push(['https://share.dmhy.org/images/weekly/{i:08x}.jpg','番剧{i}','{keyword}','{groups}','']);"
+        )
+    return "<html><head><script>\n" + "\n".join(lines) + "\n</script></head><body></body></html>"
+
+
+def dmhy_search(rows: int, rnd: random.Random) -> str:
+    body = "".join(
+        f"""
+<tr class="">
+  <td><span style="display: none;">{_time(i):%Y/%m/%d %H:%M}</span></td>
+  <td><a class="sort-{2 if i % 10 else 31}" href="/topics/list/sort_id/2">動畫</a></td>
+  <td class="title"><span class="tag"><a href="/topics/list/team_id/{_group(i)}">字幕组{_group(i)}</a></span>
+      <a href="/topics/view/{i}.html" target="_blank">{escape(_title(i, rnd))}</a></td>
+  <td><a class="download-arrow arrow-magnet" href="magnet:?xt=urn:btih:{i:040x}">&nbsp;</a></td>
+</tr>"""
+        for i in range(rows)
+    )
+    table = f'<table id="topic_list"><thead><tr><th></th></tr></thead><tbody>{body}</tbody></table>'
+    return f"<html><body>{table}</body></html>"
+
+
+def bangumi_moe_torrents(rows: int, rnd: random.Random) -> str:
+    torrents = [
+        {
+            "_id": f"{i:024x}",
+            "team_id": f"{_group(i):024x}",
+            "title": _title(i, rnd),
+            "publish_time": f"{_time(i):%Y-%m-%dT%H:%M:%S}.000Z",
+        }
+        for i in range(rows)
+    ]
+    return json.dumps({"torrents": torrents, "page_count": 1}, ensure_ascii=False)
+
+
+PAGES: Dict[str, Callable[[int, random.Random], str]] = {
+    "mikan_bangumi.html": mikan_bangumi,
+    "mikan_expand.html": mikan_expand,
+    "mikan_search.html": mikan_search,
+    "mikan_calendar.html": mikan_calendar,
+    "mikan_rss.xml": mikan_rss,
+    "dmhy_programme.html": dmhy_programme,
+    "dmhy_search.html": dmhy_search,
+    "bangumi_moe_torrents.json": bangumi_moe_torrents,
+}
+
+
+def generate(name: str, rows: int, seed: int = 0) -> str:
+    return PAGES[name](rows, random.Random(seed))
+
+
+def main(argv: List[str]) -> None:
+    out = Path(argv[1])
+    rows = int(argv[2]) if len(argv) > 2 else 2000
+    out.mkdir(parents=True, exist_ok=True)
+    for name in PAGES:
+        out.joinpath(name).write_text(generate(name, rows), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -88,6 +88,56 @@ class HTTP(BaseSetting):
     )
 
 
+class SourceNetwork(BaseSetting):
+    cache_ttl: int = Field(300, description="seconds a cached response is used without asking the website again")
+    pool_size: int = Field(10, description="max connections kept alive for each host")
+    keep_alive: bool = Field(True, description="reuse connections between requests")
+    connect_timeout: float = Field(10, description="seconds to wait for establishing a connection")
+    read_timeout: float = Field(60, description="seconds to wait for server sending response")
+    retries: int = Field(3, description="times to retry a request on connection error or 5xx response")
+    backoff_factor: float = Field(0.5, description="sleep {backoff_factor} * 2 ** (retry - 1) seconds between retries")
+    rate_limit: float = Field(5, description="max requests per second sent to the host, 0 means no limit")
+    burst: int = Field(4, description="requests can be sent at once before rate_limit applies")
+    mirrors: List[HttpUrl] = Field(
+        [], description="other base urls of the source, requests go to the fastest healthy one of them and source url"
+    )
+
+
+class Network(BaseSetting):
+    cache: bool = Field(
+        not os.getenv("BGMI_DISABLE_HTTP_CACHE"),
+        description="cache http responses of data sources in tmp_path, revalidate them with ETag/Last-Modified",
+    )
+    cache_max_size: int = Field(64 * 1024 * 1024, description="max size of http cache in bytes")
+
+    mikan_project: SourceNetwork = SourceNetwork()
+    bangumi_moe: SourceNetwork = SourceNetwork()
+    dmhy: SourceNetwork = SourceNetwork()
+    # npm, pypi and bangumi covers
+    other: SourceNetwork = SourceNetwork(cache_ttl=0, retries=1, rate_limit=0)
+
+
+class PollingConfig(BaseSetting):
+    enable: bool = Field(True, description="poll subscriptions more often around their release time in `bgmi daemon`")
+    hot_interval: int = Field(30 * 60, description="seconds between two polls of a bangumi around its release time")
+    cold_interval: int = Field(6 * 60 * 60, description="seconds between two polls of a bangumi at other time")
+    hot_window: int = Field(12 * 60 * 60, description="seconds after expected release time a bangumi is polled often")
+
+
+class DaemonConfig(BaseSetting):
+    update_interval: int = Field(2 * 60 * 60, description="seconds between two updates of subscriptions")
+    calendar_interval: int = Field(10 * 60 * 60, description="seconds between two updates of bangumi calendar")
+    download: bool = Field(True, description="download episodes when subscriptions are updated")
+
+
+class ReleasePreference(BaseSetting):
+    """which release is kept when an episode is released by multiple subtitle groups, first item is most preferred"""
+
+    subtitle_groups: List[str] = Field([], description="preferred subtitle group ids")
+    keywords: List[str] = Field([], description="preferred keywords in title, e.g. `1080`, `简体`")
+    newest: bool = Field(False, description="prefer newest release, instead of the first one returned by data source")
+
+
 class Config(BaseSetting):
     data_source: Source = Field(
         os.getenv("BGMI_DATA_SOURCE") or Source.BangumiMoe, description="data source"
@@ -114,6 +164,13 @@ class Config(BaseSetting):
 
     max_path: int = 3
 
+    update_workers: int = Field(4, description="how many subscriptions are fetched at the same time when updating")
+    max_connections_per_host: int = Field(2, description="max concurrent requests sent to a single host")
+    html_parser: str = Field(
+        os.getenv("BGMI_HTML_PARSER") or "",
+        description="parser used by beautifulsoup (lxml, html.parser), use lxml if installed when empty",
+    )
+
     bangumi_moe_url: HttpUrl = Field(
         os.getenv("BGMI_BANGUMI_MOE_URL") or "https://bangumi.moe", description="Setting bangumi.moe url"
     )  # type: ignore
@@ -124,10 +181,18 @@ class Config(BaseSetting):
         os.getenv("BGMI_MIKAN_URL") or "https://mikanani.me", description="Setting mikanani.me url"
     )  # type: ignore
 
+    network: Network = Network()
+
     mikan_username: str = os.getenv("BGMI_MIKAN_USERNAME") or ""
     mikan_password: str = os.getenv("BGMI_MIKAN_PASSWORD") or ""
+    mikan_fetch_rss: bool = Field(
+        bool(os.getenv("BGMI_MIKAN_FETCH_RSS")),
+        description="fetch mikan episodes from rss feeds, bangumi page is only used for bangumi info",
+    )
 
     http: HTTP = HTTP()
+    daemon: DaemonConfig = DaemonConfig()
+    polling: PollingConfig = PollingConfig()
 
     # language
     lang: str = os.getenv("BGMI_LANG") or "zh_cn"
@@ -145,6 +210,8 @@ class Config(BaseSetting):
         ["Leopard-Raws", "hevc", "x265", "c-a Raws", "U3-Web"], description="Global exclude keywords"
     )
 
+    release_preference: ReleasePreference = ReleasePreference()
+
     save_path_map: Dict[str, Path] = Field(default_factory=dict, description="per-bangumi save path")
 
     def save(self) -> None:
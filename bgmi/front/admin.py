@@ -1,4 +1,5 @@
 import functools
+import inspect
 import json
 import traceback
 from concurrent.futures.thread import ThreadPoolExecutor
@@ -10,7 +11,7 @@ from tornado.ioloop import IOLoop
 from tornado.web import HTTPError, RequestHandler
 
 from bgmi.front.base import BaseHandler
-from bgmi.lib.controllers import add, cal, cfg, delete, filter_, mark, search, status_, update
+from bgmi.lib.controllers import add, cal, cfg, delete, filter_, mark, search_async, status_, update
 from bgmi.lib.download import download_prepare
 
 ACTION_AUTH = "auth"
@@ -24,7 +25,8 @@ def auth_(token: str = "") -> Dict[str, str]:
 API_MAP_POST: Dict[str, Callable] = {
     "add": add,
     "delete": delete,
-    "search": search,
+    # data source is requested without blocking the server
+    "search": search_async,
     "download": download_prepare,
     "auth": auth_,
     "mark": mark,
@@ -69,11 +71,13 @@ class AdminApiHandler(BaseHandler):
         self.finish(self.jsonify(**result))
 
     @auth
-    def post(self, action: str) -> None:
+    async def post(self, action: str) -> None:
         data = self.get_json()
 
         try:
             result = API_MAP_POST[action](**data)
+            if inspect.isawaitable(result):
+                result = await result
             if result["status"] == "error":
                 raise HTTPError(400)
         except HTTPError:
@@ -1,15 +1,18 @@
+import hashlib
+import json
 import os.path
 import time
+from concurrent.futures import ThreadPoolExecutor
 from operator import itemgetter
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import filetype
-import requests.exceptions
 
 from bgmi.config import Source, cfg
 from bgmi.lib.constants import BANGUMI_UPDATE_TIME, SUPPORT_WEBSITE
 from bgmi.lib.download import Episode, download_prepare
-from bgmi.lib.fetch import website
+from bgmi.lib import polling
+from bgmi.lib.fetch import async_website, website
 from bgmi.lib.models import (
     FOLLOWED_STATUS,
     STATUS_DELETED,
@@ -17,15 +20,16 @@ from bgmi.lib.models import (
     STATUS_NOT_DOWNLOAD,
     STATUS_UPDATED,
     Bangumi,
-    DoesNotExist,
     Download,
     Filter,
     Followed,
+    Scripts,
     Subtitle,
-    model_to_dict,
+    db,
     recreate_source_relatively_table,
 )
 from bgmi.script import HookRunner, ScriptRunner
+from bgmi.session import session, source_url
 from bgmi.utils import (
     COLOR_END,
     GREEN,
@@ -34,11 +38,15 @@ from bgmi.utils import (
     episode_filter_regex,
     logger,
     normalize_path,
+    parse_episode_stats,
     print_error,
     print_info,
     print_success,
     print_warning,
+    release_preference_key,
 )
+from bgmi.website.base import old_row_cutoff, single_flight
+from bgmi.website.model import WebsiteBangumi
 
 ControllerResult = Dict[str, Any]
 
@@ -277,53 +285,83 @@ def search(
     tag: bool = False,
     subtitle: Optional[str] = None,
 ) -> ControllerResult:
+    options = _search_options(keyword, count, regex, dupe, min_episode, max_episode)
+    pages: int = options["count"]
     try:
-        count = int(count)
-    except (TypeError, ValueError):
-        count = 3
+        if tag:
+            data = single_flight(
+                (type(website), "search_by_tag", keyword, subtitle, pages),
+                lambda: website.search_by_tag(keyword, subtitle=subtitle, count=pages),
+            )
+        else:
+            data = single_flight(
+                (type(website), "search_by_keyword", keyword, pages),
+                lambda: website.search_by_keyword(keyword, count=pages),
+            )
+        return _search_result(data, options)
+    except Exception as e:
+        if os.environ.get("DEBUG"):
+            raise
+        return {"status": "error", "message": str(e), "options": options, "data": []}
+
+
+async def search_async(
+    keyword: str,
+    count: Union[str, int] = cfg.max_path,
+    regex: Optional[str] = None,
+    dupe: bool = False,
+    min_episode: Optional[int] = None,
+    max_episode: Optional[int] = None,
+    tag: bool = False,
+    subtitle: Optional[str] = None,
+) -> ControllerResult:
+    """``search`` with ``async_website``, for the web server"""
+    options = _search_options(keyword, count, regex, dupe, min_episode, max_episode)
     try:
         if tag:
-            data = website.search_by_tag(keyword, subtitle=subtitle, count=count)
+            data = await async_website.search_by_tag(keyword, subtitle=subtitle, count=options["count"])
         else:
-            data = website.search_by_keyword(keyword, count=count)
-        data = episode_filter_regex(data, regex=regex)
-        if min_episode is not None:
-            data = [x for x in data if x.episode >= min_episode]
-        if max_episode is not None:
-            data = [x for x in data if x.episode <= max_episode]
-
-        if not dupe:
-            data = Episode.remove_duplicated_bangumi(data)
-        data.sort(key=lambda x: x.episode)
-        return {
-            "status": "success",
-            "message": "",
-            "options": {
-                "keyword": keyword,
-                "count": count,
-                "regex": regex,
-                "dupe": dupe,
-                "min_episode": min_episode,
-                "max_episode": max_episode,
-            },
-            "data": data,
-        }
+            data = await async_website.search_by_keyword(keyword, count=options["count"])
+        return _search_result(data, options)
     except Exception as e:
         if os.environ.get("DEBUG"):
             raise
-        return {
-            "status": "error",
-            "message": str(e),
-            "options": {
-                "keyword": keyword,
-                "count": count,
-                "regex": regex,
-                "dupe": dupe,
-                "min_episode": min_episode,
-                "max_episode": max_episode,
-            },
-            "data": [],
-        }
+        return {"status": "error", "message": str(e), "options": options, "data": []}
+
+
+def _search_options(
+    keyword: str,
+    count: Union[str, int],
+    regex: Optional[str],
+    dupe: bool,
+    min_episode: Optional[int],
+    max_episode: Optional[int],
+) -> Dict[str, Any]:
+    try:
+        count = int(count)
+    except (TypeError, ValueError):
+        count = 3
+    return {
+        "keyword": keyword,
+        "count": count,
+        "regex": regex,
+        "dupe": dupe,
+        "min_episode": min_episode,
+        "max_episode": max_episode,
+    }
+
+
+def _search_result(data: List[Episode], options: Dict[str, Any]) -> ControllerResult:
+    data = episode_filter_regex(data, regex=options["regex"])
+    if options["min_episode"] is not None:
+        data = [x for x in data if x.episode >= options["min_episode"]]
+    if options["max_episode"] is not None:
+        data = [x for x in data if x.episode <= options["max_episode"]]
+
+    if not options["dupe"]:
+        data = Episode.remove_duplicated_bangumi(data, key=release_preference_key())
+    data.sort(key=lambda x: x.episode)
+    return {"status": "success", "message": "", "options": options, "data": data}
 
 
 def source(data_source: str) -> ControllerResult:
@@ -343,45 +381,166 @@ def source(data_source: str) -> ControllerResult:
     return result
 
 
-def update(names: List[str], download: Optional[bool] = False, not_ignore: bool = False) -> ControllerResult:
+def _fetch_since(followed_obj: Followed) -> int:
+    """
+    episodes published before last update (with one day of tolerance) have been seen already,
+    no need to crawl pages which only contain them.
+    """
+    since = old_row_cutoff()
+    if followed_obj.updated_time:
+        since = max(since, followed_obj.updated_time - 24 * 3600)
+    return since
+
+
+def _fingerprint_context(followed_obj: Followed, followed_filter_obj: Filter) -> str:
+    """settings changing update result, subscription should be re-checked when any of them changed"""
+    return json.dumps(
+        [
+            followed_obj.episode,
+            followed_filter_obj.subtitle,
+            followed_filter_obj.include,
+            followed_filter_obj.exclude,
+            followed_filter_obj.regex,
+            cfg.enable_global_filters,
+            cfg.global_filters,
+            cfg.enable_global_include_keywords,
+            cfg.global_include_keywords,
+        ]
+    )
+
+
+def _fingerprint(probe: str, context: str) -> str:
+    return hashlib.sha1(f"{probe}\n{context}".encode("utf-8")).hexdigest()
+
+
+def _fetch_subscription(
+    keyword: str,
+    subtitle_list: List[str],
+    since: Optional[int],
+    fingerprint_context: Optional[str],
+    last_fingerprint: Optional[str],
+    info_known: bool,
+) -> Tuple[Optional[str], Optional[Tuple[Optional[WebsiteBangumi], List[Episode]]]]:
+    """
+    run in worker thread, probe fingerprint of subscription and fetch all episodes if it changed.
+
+    :return: result of ``website.fetch_fingerprint`` (``None`` if fingerprint is not used) and
+        result of ``website.fetch_followed_episodes`` (``None`` if nothing changed since last update).
+    """
+    probe = None
+    # pages fetched by probe are not downloaded again, even if http cache is off
+    with session.reuse_responses():
+        if fingerprint_context is not None:
+            probe = website.fetch_fingerprint(keyword, subtitle_list=subtitle_list)
+            if _fingerprint(probe, fingerprint_context) == last_fingerprint:
+                return probe, None
+
+        return probe, website.fetch_followed_episodes(
+            keyword, subtitle_list=subtitle_list, max_page=cfg.max_path, since=since, info_known=info_known
+        )
+
+
+def _save_fetch_result(
+    followed_obj: Followed,
+    probe: Optional[str],
+    fetched: Optional[Tuple[Optional[WebsiteBangumi], List[Episode]]],
+    ignore: bool,
+    now: float,
+    result: ControllerResult,
+) -> List[Episode]:
+    """
+    apply result of ``_fetch_subscription`` to ``followed_obj`` (saved by caller) and ``result``.
+
+    :return: new episodes to download
+    """
+    followed_obj.last_polled = int(now)
+
+    if fetched is None:
+        logger.debug("{} has no new torrent since last update, skip", followed_obj.bangumi_name)
+        result["data"]["skipped"] += 1
+        return []
+
+    info, episodes = fetched
+    if info is not None:
+        website.save_bangumi(info)
+
+    episode, all_episode_data = website.select_maximum_episode(
+        followed_obj.bangumi_obj, followed_obj.filter_obj, episodes, ignore_old_row=ignore
+    )
+
+    download_queue: List[Episode] = []
+    saved_episode = followed_obj.episode or 0
+    if episode > saved_episode:
+        episode_range = range(saved_episode + 1, episode + 1)
+        print_success(f"{followed_obj.bangumi_name} updated, episode: {episode:d}")
+        followed_obj.episode = episode
+        followed_obj.status = STATUS_UPDATED
+        followed_obj.updated_time = int(time.time())
+        polling.record_release(
+            followed_obj,
+            min((e.time for e in all_episode_data if e.episode == episode and e.time), default=int(now)),
+        )
+        result["data"]["updated"].append({"bangumi": followed_obj.bangumi_name, "episode": episode})
+
+        releases = {
+            epi.episode: epi
+            for epi in Episode.remove_duplicated_bangumi(all_episode_data, key=release_preference_key())
+        }
+        download_queue = [releases[i] for i in episode_range if i in releases]
+
+    if probe is not None:
+        followed_obj.fingerprint = _fingerprint(probe, _fingerprint_context(followed_obj, followed_obj.filter_obj))
+
+    return download_queue
+
+
+def update(
+    names: List[str], download: Optional[bool] = False, not_ignore: bool = False, adaptive: bool = False
+) -> ControllerResult:
+    """
+    :param adaptive: only fetch subscriptions which are due according to their release time,
+        see `bgmi.lib.polling`. Ignored when ``names`` is given.
+    """
     logger.debug("updating bangumi info with args: download: %r", download)
     downloaded: List[Episode] = []
     result: Dict[str, Any] = {
         "status": "info",
         "message": "",
-        "data": {"updated": [], "downloaded": downloaded},
+        "data": {"updated": [], "downloaded": downloaded, "skipped": 0},
     }
 
     ignore = not bool(not_ignore)
     print_info("marking bangumi status ...")
-    now = int(time.time())
     failed = []
 
-    for follow in Followed.get_all_followed():
-        if follow["updated_time"] and int(follow["updated_time"] + 60 * 60 * 24) < now:
-            followed_obj = Followed.get(bangumi_name=follow["bangumi_name"])
-            followed_obj.status = STATUS_FOLLOWED
-            followed_obj.save()
-
-    for script in ScriptRunner().scripts:
-        obj = script.Model().obj
-        if obj.updated_time and int(obj.updated_time + 60 * 60 * 24) < now:
-            obj.status = STATUS_FOLLOWED
-            obj.save()
+    outdated = int(time.time()) - 60 * 60 * 24
+    with db.atomic():
+        Followed.mark_outdated(before=outdated)
+        Scripts.mark_outdated(
+            [script.bangumi_name for script in ScriptRunner().scripts if script.bangumi_name is not None],
+            before=outdated,
+        )
 
     print_info("updating subscriptions ...")
 
+    subscriptions = []
+    for followed_obj in Followed.get_subscriptions(names):
+        if followed_obj.bangumi_obj is None:
+            logger.error("Bangumi<{}> does not exists.", followed_obj.bangumi_name)
+            continue
+        if followed_obj.filter_obj is None:
+            followed_obj.filter_obj = Filter(bangumi_name=followed_obj.bangumi_name)
+        subscriptions.append(followed_obj)
+
+    now = time.time()
     if not names:
-        updated_bangumi_obj = Followed.get_all_followed()
-    else:
-        updated_bangumi_obj = []
-        for n in names:
-            try:
-                f = Followed.get(bangumi_name=n)
-                f = model_to_dict(f)
-                updated_bangumi_obj.append(f)
-            except DoesNotExist:
-                pass
+        # bangumi released just now or about to release go first
+        subscriptions.sort(key=lambda f: polling.priority(f, f.bangumi_obj.update_time, now))
+        if adaptive:
+            due = [f for f in subscriptions if polling.is_due(f, f.bangumi_obj.update_time, now)]
+            if len(due) != len(subscriptions):
+                print_info(f"{len(subscriptions) - len(due)} bangumi are not expected to release now, skipped")
+            subscriptions = due
 
     hook_runner = HookRunner()
     if download:
@@ -400,47 +559,76 @@ def update(names: List[str], download: Optional[bool] = False, not_ignore: bool
             ]
         )
 
-    for subscribe in updated_bangumi_obj:
-        download_queue = []
-        print_info(f"fetching {subscribe['bangumi_name']} ...")
-        try:
-            bangumi_obj = Bangumi.get(name=subscribe["bangumi_name"])
-        except Bangumi.DoesNotExist:
-            logger.error("Bangumi<{}> does not exists.", subscribe["bangumi_name"])
-            continue
-        try:
-            followed_obj = Followed.get(bangumi_name=subscribe["bangumi_name"])
-        except Followed.DoesNotExist:
-            logger.error("Bangumi<{}> is not followed.", subscribe["bangumi_name"])
-            continue
+    website.start_update()
+    if subscriptions:
+        session.warm_up(source_url(cfg.data_source))
+
+    # fetching and parsing happen in worker threads, while results are consumed
+    # in the original order on this thread, so all database writes stay serialized.
+    # all writes of this run are committed in one transaction,
+    # downloading happens after it because download service may be slow.
+    download_queue: List[Episode] = []
+    polled: List[Followed] = []
+    with ThreadPoolExecutor(max_workers=max(1, cfg.update_workers)) as executor, db.atomic():
+        futures = [
+            executor.submit(
+                _fetch_subscription,
+                followed_obj.bangumi_obj.keyword,
+                subtitle_list=followed_obj.filter_obj.subtitle_group_split,
+                since=_fetch_since(followed_obj) if ignore else None,
+                # fingerprint only describes new rows, can't be used when old rows are not ignored
+                fingerprint_context=_fingerprint_context(followed_obj, followed_obj.filter_obj) if ignore else None,
+                last_fingerprint=followed_obj.fingerprint,
+                info_known=bool(followed_obj.bangumi_obj.subtitle_group),
+            )
+            for followed_obj in subscriptions
+        ]
+        for followed_obj, future in zip(subscriptions, futures):
+            print_info(f"fetching {followed_obj.bangumi_name} ...")
+            try:
+                probe, fetched = future.result()
+            # a broken subscription (data source raises, or exits by `print_error`) shouldn't stop the others
+            except (Exception, SystemExit) as e:
+                print_warning(f"error {e!r} to fetch {followed_obj.bangumi_name}, skip")
+                continue
 
-        try:
-            episode, all_episode_data = website.get_maximum_episode(
-                bangumi=bangumi_obj, ignore_old_row=ignore, max_page=cfg.max_path
+            try:
+                # savepoint, only writes of the failed subscription are rolled back
+                with db.atomic():
+                    download_queue.extend(_save_fetch_result(followed_obj, probe, fetched, ignore, now, result))
+            except (Exception, SystemExit) as e:
+                print_warning(f"error {e!r} to update {followed_obj.bangumi_name}, skip")
+                continue
+            polled.append(followed_obj)
+
+        # every polled subscription has a new `last_polled`
+        if polled:
+            Followed.bulk_update(
+                polled,
+                fields=[
+                    Followed.episode,
+                    Followed.status,
+                    Followed.updated_time,
+                    Followed.fingerprint,
+                    Followed.release_history,
+                    Followed.last_polled,
+                ],
+                batch_size=100,
             )
-        except requests.exceptions.ConnectionError as e:
-            print_warning(f"error {e} to fetch {bangumi_obj.name}, skip")
-            continue
 
-        saved_episode = subscribe.get("episode") or 0
-        if episode > saved_episode:
-            episode_range = range(saved_episode + 1, episode + 1)
-            print_success(f"{subscribe['bangumi_name']} updated, episode: {episode:d}")
-            followed_obj.episode = episode
-            followed_obj.status = STATUS_UPDATED
-            followed_obj.updated_time = int(time.time())
-            followed_obj.save()
-            result["data"]["updated"].append({"bangumi": subscribe["bangumi_name"], "episode": episode})
+    # cookies (like login of data source) are changed by worker threads, saved when they are done
+    session.save_cookies()
+
+    if download and download_queue:
+        download_prepare(download_queue)
+        downloaded.extend(download_queue)
 
-            for i in episode_range:
-                for epi in all_episode_data:
-                    if epi.episode == i:
-                        download_queue.append(epi)
-                        break
+    if result["data"]["skipped"]:
+        print_info(f"{result['data']['skipped']} bangumi have no new torrent since last update, skipped")
 
-        if download:
-            download_prepare(download_queue)
-            downloaded.extend(download_queue)
+    logger.debug("episode parser cache: {}", parse_episode_stats())
+    logger.debug("rate limit of hosts: {}", session.rate_limit_stats())
+    logger.debug("mirrors of data sources: {}", session.mirror_stats())
 
     if downloaded:
         failed = [Episode.parse_obj(x) for x in Download.get_all_downloads(status=STATUS_NOT_DOWNLOAD)]
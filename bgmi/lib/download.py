@@ -1,3 +1,4 @@
+import functools
 import os
 import time
 import traceback
@@ -14,7 +15,12 @@ from bgmi.utils import bangumi_save_path, print_error, print_info
 from bgmi.website.base import Episode
 
 
+@functools.lru_cache
 def get_download_driver(delegate: str) -> BaseDownloadService:
+    """
+    driver is created once and reused, so a long-running process (``bgmi daemon``) keeps its connection.
+    It's dropped by ``download_prepare`` when it fails, next call creates a new one.
+    """
     try:
         return cast(
             BaseDownloadService,
@@ -27,7 +33,6 @@ def get_download_driver(delegate: str) -> BaseDownloadService:
 
 def download_prepare(data: List[Episode]) -> None:
     queue = save_to_bangumi_download_queue(data)
-    driver = get_download_driver(cfg.download_delegate)
     for download in queue:
         download.created_time = int(time.time())
         save_path = bangumi_save_path(download.name).joinpath(str(download.episode))
@@ -38,7 +43,7 @@ def download_prepare(data: List[Episode]) -> None:
         download.status = STATUS_DOWNLOADING
         download.save()
         try:
-            driver.add_download(url=download.download, save_path=str(save_path))
+            get_download_driver(cfg.download_delegate).add_download(url=download.download, save_path=str(save_path))
             print_info("Add torrent into the download queue, " f"the file will be saved at {save_path}")
         except Exception as e:
             if os.getenv("DEBUG"):  # pragma: no cover
@@ -46,6 +51,8 @@ def download_prepare(data: List[Episode]) -> None:
                 raise e
 
             print_error(f"Error when downloading {download.title}: {e}", stop=False)
+            # connection of driver may be broken, don't keep it for the life of process
+            get_download_driver.cache_clear()
             download.status = STATUS_NOT_DOWNLOAD
             download.save()
 
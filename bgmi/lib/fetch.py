@@ -2,7 +2,7 @@ from typing import Dict, Type
 
 from bgmi.config import cfg
 from bgmi.utils import print_error
-from bgmi.website import bangumi_moe, base, mikan, share_dmhy
+from bgmi.website import aio, bangumi_moe, base, mikan, share_dmhy
 
 DATA_SOURCE_MAP: Dict[str, Type[base.BaseWebsite]] = {
     "mikan_project": mikan.Mikanani,
@@ -10,7 +10,15 @@ DATA_SOURCE_MAP: Dict[str, Type[base.BaseWebsite]] = {
     "dmhy": share_dmhy.DmhySource,
 }
 
+# used by the web server, requests of them don't block event loop
+ASYNC_DATA_SOURCE_MAP: Dict[str, Type[aio.AsyncWebsite]] = {
+    "mikan_project": mikan.AsyncMikanani,
+    "bangumi_moe": bangumi_moe.AsyncBangumiMoe,
+    "dmhy": share_dmhy.AsyncDmhySource,
+}
+
 try:
     website = DATA_SOURCE_MAP[cfg.data_source]()
+    async_website = ASYNC_DATA_SOURCE_MAP[cfg.data_source]()
 except KeyError:
     print_error(f'date source "{cfg.data_source}" in config is wrong, please edit it manually')
@@ -9,7 +9,7 @@ from playhouse.shortcuts import model_to_dict
 
 from bgmi.config import cfg
 from bgmi.lib.constants import BANGUMI_UPDATE_TIME
-from bgmi.utils import episode_filter_regex
+from bgmi.utils import get_episode_filter
 from bgmi.website.model import Episode
 
 # bangumi status
@@ -151,6 +151,11 @@ class Followed(NeoDB):
     episode = IntegerField(null=True, default=0)
     status = IntegerField(null=True)
     updated_time = IntegerField(null=True)
+    # fingerprint of first result page when last updated, see `BaseWebsite.fetch_fingerprint`
+    fingerprint = TextField(null=True)
+    # json list of recent release time of new episodes, see `bgmi.lib.polling`
+    release_history = TextField(null=True)
+    last_polled = IntegerField(null=True)
 
     class Meta:
         database = db
@@ -179,6 +184,52 @@ class Followed(NeoDB):
 
         return list(d)
 
+    @classmethod
+    def get_subscriptions(cls, names: Optional[List[str]] = None) -> List["Followed"]:
+        """
+        load subscriptions with their ``Bangumi`` and ``Filter`` in a single query,
+        as attribute ``bangumi_obj`` and ``filter_obj``, ``None`` if related row doesn't exist.
+
+        without ``names``, return all not deleted subscriptions of updating bangumi,
+        most recently updated first. Otherwise, return subscriptions in the order of ``names``.
+        """
+        q = (
+            cls.select(cls, Bangumi, Filter)
+            .join(Bangumi, peewee.JOIN.LEFT_OUTER, on=(Bangumi.name == cls.bangumi_name), attr="bangumi_obj")
+            .switch(cls)
+            .join(Filter, peewee.JOIN.LEFT_OUTER, on=(Filter.bangumi_name == cls.bangumi_name), attr="filter_obj")
+        )
+
+        if names:
+            found = {f.bangumi_name: f for f in q.where(cls.bangumi_name.in_(names))}
+            rows = [found[n] for n in dict.fromkeys(names) if n in found]
+        else:
+            rows = list(
+                q.where((cls.status != STATUS_DELETED) & (Bangumi.status == STATUS_UPDATING)).order_by(
+                    cls.updated_time.desc()
+                )
+            )
+
+        for f in rows:
+            f.bangumi_obj = getattr(f, "bangumi_obj", None)
+            f.filter_obj = getattr(f, "filter_obj", None)
+        return rows
+
+    @classmethod
+    def mark_outdated(cls, before: int) -> int:
+        """mark subscriptions of updating bangumi not updated since ``before`` as followed"""
+        updating = Bangumi.select(Bangumi.name).where(Bangumi.status == STATUS_UPDATING)
+        return int(
+            cls.update(status=STATUS_FOLLOWED)
+            .where(
+                (cls.status == STATUS_UPDATED)
+                & (cls.updated_time > 0)
+                & (cls.updated_time < before)
+                & cls.bangumi_name.in_(updating)
+            )
+            .execute()
+        )
+
 
 class Download(NeoDB):
     name = TextField(null=False)
@@ -220,21 +271,7 @@ class Filter(NeoDB):
             return []
 
     def apply_on_episodes(self, result: List[Episode]) -> List[Episode]:
-        if self.include:
-            # pylint:disable=no-member
-            include_list = [s.strip().lower() for s in self.include.split(",")]
-            result = [e for e in result if e.contains_any_words(include_list)]
-
-        if cfg.enable_global_include_keywords:
-            include_list = [s.strip().lower() for s in cfg.global_include_keywords]
-            result = [e for e in result if e.contains_any_words(include_list)]
-
-        if self.exclude:
-            # pylint:disable=no-member
-            exclude_list = [s.strip().lower() for s in self.exclude.split(",")]
-            result = [e for e in result if not e.contains_any_words(exclude_list)]
-
-        return episode_filter_regex(data=result, regex=self.regex)
+        return get_episode_filter(self.include, self.exclude, self.regex).apply(result)
 
 
 class Subtitle(NeoDB):
@@ -262,6 +299,20 @@ class Scripts(NeoDB):
     status = IntegerField(default=0)
     updated_time = IntegerField(default=0)
 
+    @classmethod
+    def mark_outdated(cls, names: List[str], before: int) -> int:
+        """mark scripts in ``names`` not updated since ``before`` as followed"""
+        return int(
+            cls.update(status=STATUS_FOLLOWED)
+            .where(
+                cls.bangumi_name.in_(names)
+                & (cls.status != STATUS_FOLLOWED)
+                & (cls.updated_time > 0)
+                & (cls.updated_time < before)
+            )
+            .execute()
+        )
+
 
 def recreate_source_relatively_table() -> None:
     table_to_drop = [
@@ -0,0 +1,100 @@
+"""
+decide when a subscription should be polled, from the time its episodes were released before.
+
+Position in a week is measured as seconds since Monday 00:00 in the timezone of data sources (UTC+8),
+weekdays in their calendars are in it too.
+A subscription is "hot" from a little before its expected release until ``cfg.polling.hot_window`` after it,
+and polled every ``cfg.polling.hot_interval`` seconds, otherwise every ``cfg.polling.cold_interval`` seconds.
+"""
+
+import json
+import time
+from typing import List, Optional, Tuple
+
+from bgmi.config import cfg
+from bgmi.lib.models import Followed
+
+DAY = 24 * 60 * 60
+WEEK = 7 * DAY
+
+# releases are often a little earlier than last time
+_EARLY = 60 * 60
+# keep release time of recent episodes only, schedule of a bangumi may change
+_HISTORY_SIZE = 8
+
+# timezone of release time in bangumi calendars of all data sources
+SOURCE_UTC_OFFSET = 8 * 60 * 60
+
+_WEEKDAYS = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4, "Sat": 5, "Sun": 6}
+
+
+def week_offset(ts: float) -> int:
+    t = time.gmtime(ts + SOURCE_UTC_OFFSET)
+    return t.tm_wday * DAY + t.tm_hour * 3600 + t.tm_min * 60 + t.tm_sec
+
+
+def _distance(a: int, b: int) -> int:
+    d = abs(a - b) % WEEK
+    return min(d, WEEK - d)
+
+
+def release_history(followed_obj: Followed) -> List[int]:
+    if not followed_obj.release_history:
+        return []
+    try:
+        return [int(x) for x in json.loads(followed_obj.release_history)]
+    except (ValueError, TypeError):
+        return []
+
+
+def record_release(followed_obj: Followed, ts: int) -> None:
+    history = release_history(followed_obj)
+    history.append(ts)
+    followed_obj.release_history = json.dumps(history[-_HISTORY_SIZE:])
+
+
+def expected_release(followed_obj: Followed, update_time: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    :return: ``(start, end)`` of hot window as week offset, ``end`` may be larger than ``WEEK``.
+        ``None`` if nothing is known about its schedule.
+    """
+    history = [week_offset(ts) for ts in release_history(followed_obj)]
+    if history:
+        # circular median, the offset closest to all others
+        offset = min(history, key=lambda o: sum(_distance(o, x) for x in history))
+        return offset - _EARLY, offset + cfg.polling.hot_window
+
+    if update_time in _WEEKDAYS:
+        # only weekday is known, the whole day is treated as release time
+        offset = _WEEKDAYS[update_time] * DAY
+        return offset, offset + DAY + cfg.polling.hot_window
+
+    return None
+
+
+def is_hot(followed_obj: Followed, update_time: Optional[str], now: float) -> bool:
+    window = expected_release(followed_obj, update_time)
+    if window is None:
+        return True
+    start, end = window
+    return (week_offset(now) - start) % WEEK < end - start
+
+
+def is_due(followed_obj: Followed, update_time: Optional[str], now: float) -> bool:
+    if not followed_obj.last_polled:
+        return True
+    interval = cfg.polling.hot_interval if is_hot(followed_obj, update_time, now) else cfg.polling.cold_interval
+    # tolerance of a few minutes, scheduler won't wake up at exact time
+    return now - int(followed_obj.last_polled) >= interval - 5 * 60
+
+
+def priority(followed_obj: Followed, update_time: Optional[str], now: float) -> int:
+    """
+    smaller is earlier, bangumi released just now or about to release go first,
+    then other bangumi in order of distance to their release time.
+    """
+    window = expected_release(followed_obj, update_time)
+    if window is None:
+        return WEEK
+    start, _ = window
+    return _distance(week_offset(now), start + _EARLY)
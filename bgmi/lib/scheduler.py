@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from bgmi.config import IS_WINDOWS
+
+if IS_WINDOWS:
+    import msvcrt
+else:
+    import fcntl
+
+
+class AlreadyRunning(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, name: str, interval: int, func: Callable[[], Any]) -> None:
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = 0.0
+        self.last_run: Optional[float] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "interval": self.interval,
+            "next_run": self.next_run,
+            "last_run": self.last_run,
+            "last_duration": self.last_duration,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    """
+    run jobs periodically in current thread.
+
+    Jobs run one by one, so a slow run never overlaps with next one, and a run which is missed
+    (computer sleeping, previous job is too slow) is run only once.
+    Next run time of jobs is persisted in ``state_file``, so restarting daemon doesn't re-run all jobs.
+    """
+
+    def __init__(self, state_file: Path) -> None:
+        self.state_file = state_file
+        self.jobs: List[Job] = []
+        self.stopped = threading.Event()
+
+    def add_job(self, name: str, interval: int, func: Callable[[], Any]) -> None:
+        job = Job(name, interval, func)
+        job.next_run = load_state(self.state_file).get("jobs", {}).get(name, {}).get("next_run", 0.0)
+        # interval is shorter than last time, don't wait for old schedule
+        job.next_run = min(job.next_run, time.time() + interval)
+        self.jobs.append(job)
+
+    def run_pending(self) -> None:
+        for job in self.jobs:
+            if self.stopped.is_set():
+                return
+            if job.next_run > time.time():
+                continue
+
+            logger.info("running job {}", job.name)
+            start = time.time()
+            try:
+                job.func()
+                job.last_error = None
+            # data sources call `sys.exit` on network error, which shouldn't stop daemon
+            except (Exception, SystemExit) as e:
+                logger.exception("job {} failed", job.name)
+                job.last_error = repr(e)
+            end = time.time()
+
+            job.last_run = start
+            job.last_duration = end - start
+            job.next_run = end + job.interval
+            logger.info(
+                "job {} finished in {:.1f}s, next run at {}", job.name, job.last_duration, format_time(job.next_run)
+            )
+            self.save_state()
+
+    def run_forever(self) -> None:
+        self.save_state()
+        while not self.stopped.is_set():
+            self.run_pending()
+            if not self.jobs:
+                return
+            self.stopped.wait(max(0.0, min(job.next_run for job in self.jobs) - time.time()))
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def save_state(self) -> None:
+        state = {"pid": os.getpid(), "jobs": {job.name: job.state() for job in self.jobs}}
+        tmp = self.state_file.with_name(self.state_file.name + ".tmp")
+        tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        os.replace(tmp, self.state_file)
+
+
+def load_state(state_file: Path) -> Dict[str, Any]:
+    try:
+        return json.loads(state_file.read_text(encoding="utf-8"))  # type: ignore[no-any-return]
+    except (OSError, ValueError):
+        return {}
+
+
+def lock(lock_file: Path) -> IO[str]:
+    """
+    hold an exclusive lock on ``lock_file`` until returned file is closed or process exits,
+    raise ``AlreadyRunning`` if another process is holding it.
+    """
+    f = lock_file.open("a+", encoding="utf-8")
+    try:
+        if IS_WINDOWS:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)  # type: ignore[attr-defined]
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise AlreadyRunning(f"{lock_file} is locked by another process") from None
+    return f
+
+
+def is_locked(lock_file: Path) -> bool:
+    if not lock_file.exists():
+        return False
+    try:
+        lock(lock_file).close()
+    except AlreadyRunning:
+        return True
+    return False
+
+
+def format_time(ts: Optional[float]) -> str:
+    if not ts:
+        return "never"
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
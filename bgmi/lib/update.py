@@ -41,6 +41,9 @@ def update_database() -> None:
 
     if previous < semver.VersionInfo(major=4, minor=5, patch=1):
         exec_sql("ALTER TABLE download ADD COLUMN created_time INT(11);")
+        exec_sql("ALTER TABLE followed ADD COLUMN fingerprint TEXT;")
+        exec_sql("ALTER TABLE followed ADD COLUMN release_history TEXT;")
+        exec_sql("ALTER TABLE followed ADD COLUMN last_polled INT(11);")
 
     # all upgrade done, write current version
     old_version_file.write_text(__version__, encoding="utf8")
@@ -2,6 +2,7 @@ import datetime
 import itertools
 import os
 import platform
+import signal
 import sys
 from operator import itemgetter
 from typing import List, Mapping, Optional, Tuple
@@ -17,6 +18,7 @@ from tornado import template
 from bgmi import __version__
 from bgmi.config import BGMI_PATH, CONFIG_FILE_PATH, Config, cfg, write_default_config
 from bgmi.lib import controllers as ctl
+from bgmi.lib import scheduler
 from bgmi.lib.constants import BANGUMI_UPDATE_TIME, SPACIAL_APPEND_CHARS, SPACIAL_REMOVE_CHARS, SUPPORT_WEBSITE
 from bgmi.lib.download import download_prepare
 from bgmi.lib.fetch import website
@@ -460,11 +462,68 @@ def fetch(name: str, not_ignore: bool) -> None:
 @click.option(
     "--not-ignore", "not_ignore", is_flag=True, help="Do not ignore the old bangumi detail rows (3 month ago)"
 )
-def update(names: List[str], download: bool, not_ignore: bool) -> None:
+@click.option(
+    "--adaptive", is_flag=True, default=False, help="Only update bangumi which are expected to release new episode now"
+)
+def update(names: List[str], download: bool, not_ignore: bool, adaptive: bool) -> None:
     """
     name: optional bangumi name list you want to update
     """
-    ctl.update(names, download=download, not_ignore=not_ignore)
+    ctl.update(names, download=download, not_ignore=not_ignore, adaptive=adaptive)
+
+
+@cli.group("daemon", help="Keep running in background, update calendar and subscriptions periodically.")
+def daemon() -> None: ...
+
+
+@daemon.command("start", help="Start daemon in foreground, use it as a replacement of crontab job.")
+def daemon_start() -> None:
+    try:
+        lock_file = scheduler.lock(cfg.tmp_path.joinpath("daemon.lock"))
+    except scheduler.AlreadyRunning:
+        print_error("bgmi daemon is already running", stop=True)
+        return
+
+    def update_calendar() -> None:
+        ctl.cal(force_update=True, cover=ScriptRunner().get_download_cover())
+
+    def update_subscriptions() -> None:
+        ctl.update([], download=cfg.daemon.download, adaptive=cfg.polling.enable)
+
+    s = scheduler.Scheduler(cfg.tmp_path.joinpath("daemon.json"))
+    # calendar first, subscriptions of finished bangumi are skipped after it's updated
+    s.add_job("calendar", cfg.daemon.calendar_interval, update_calendar)
+    update_interval = cfg.daemon.update_interval
+    if cfg.polling.enable:
+        # each bangumi decides if it should be polled in this run
+        update_interval = min(update_interval, cfg.polling.hot_interval)
+    s.add_job("update", update_interval, update_subscriptions)
+
+    signal.signal(signal.SIGTERM, lambda *_: s.stop())
+    print_info(f"bgmi daemon started, pid {os.getpid()}")
+    try:
+        s.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        lock_file.close()
+    print_info("bgmi daemon stopped")
+
+
+@daemon.command("status", help="Show whether daemon is running and next run time of its jobs.")
+def daemon_status() -> None:
+    state = scheduler.load_state(cfg.tmp_path.joinpath("daemon.json"))
+    if scheduler.is_locked(cfg.tmp_path.joinpath("daemon.lock")):
+        print_success(f"bgmi daemon is running, pid {state.get('pid')}")
+    else:
+        print_warning("bgmi daemon is not running")
+
+    for name, job in state.get("jobs", {}).items():
+        next_run = scheduler.format_time(job["next_run"])
+        last_run = scheduler.format_time(job["last_run"])
+        print(f"{name}: next run {next_run}, last run {last_run}")
+        if job["last_error"]:
+            print(f"    last run failed: {job['last_error']}")
 
 
 @cli.command("gen")
@@ -0,0 +1,485 @@
+import atexit
+import contextlib
+import contextvars
+import copy
+import os
+import pathlib
+import pickle
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Union
+from urllib.parse import urlsplit
+
+import requests
+from loguru import logger
+from requests.adapters import HTTPAdapter, Retry
+from requests.structures import CaseInsensitiveDict
+
+from bgmi.config import Source, SourceNetwork, cfg
+from bgmi.session.cache import HTTPCache
+from bgmi.session.cassette import Cassette
+from bgmi.session.mirror import MirrorPool
+from bgmi.session.ratelimit import MAX_RETRY_AFTER, THROTTLED_STATUS, TokenBucket, retry_after
+from bgmi.session.singleflight import SingleFlight
+
+
+def source_url(source: Source) -> str:
+    """configured base url of a data source, always ends with ``/``"""
+    base_url: str = {
+        Source.Mikan: cfg.mikan_url,
+        Source.BangumiMoe: cfg.bangumi_moe_url,
+        Source.Dmhy: cfg.share_dmhy_url,
+    }[source]
+    return base_url.rstrip("/") + "/"
+
+
+def source_urls(source: Source) -> List[str]:
+    """configured base url and mirrors of a data source"""
+    setting: SourceNetwork = getattr(cfg.network, source.value)
+    return list(dict.fromkeys([source_url(source)] + [url.rstrip("/") + "/" for url in setting.mirrors]))
+
+
+def source_of_url(url: str) -> Optional[Source]:
+    host = urlsplit(url).netloc
+    for source in Source:
+        if any(urlsplit(base_url).netloc == host for base_url in source_urls(source)):
+            return source
+    return None
+
+
+def network_setting(url: str) -> SourceNetwork:
+    source = source_of_url(url)
+    if source is None:
+        return cfg.network.other
+    return getattr(cfg.network, source.value)  # type: ignore[no-any-return]
+
+
+def _cacheable(request: requests.PreparedRequest) -> bool:
+    # covers and web admin tarball would push pages of data sources out of cache
+    if request.url is None or source_of_url(request.url) is None:
+        return False
+    if request.method == "GET":
+        return True
+    # bangumi.moe use POST with json body for read-only api
+    return request.method == "POST" and request.headers.get("Content-Type") == "application/json"
+
+
+# responses kept by ``Session.reuse_responses``, ``None`` outside of it
+_reused: contextvars.ContextVar[Optional[Dict[str, requests.Response]]] = contextvars.ContextVar(
+    "reused_responses", default=None
+)
+
+
+def _body_bytes(body: Union[bytes, str, None]) -> Optional[bytes]:
+    if isinstance(body, str):
+        return body.encode("utf-8")
+    return body
+
+
+def _copy_response(r: requests.Response, request: requests.PreparedRequest) -> requests.Response:
+    """response shared with another caller, body is already read"""
+    c = copy.copy(r)
+    c.headers = CaseInsensitiveDict(r.headers)
+    c.cookies = r.cookies.copy()
+    c.history = list(r.history)
+    c.request = request
+    return c
+
+
+class SourceAdapter(HTTPAdapter):
+    """
+    connection pool of a data source, configured by its ``SourceNetwork``.
+
+    Requests without an explicit timeout use ``(connect_timeout, read_timeout)`` of the source,
+    connection errors and 5xx responses are retried with exponential backoff.
+    """
+
+    def __init__(self, setting: SourceNetwork) -> None:
+        self.timeout = (setting.connect_timeout, setting.read_timeout)
+        self.keep_alive = setting.keep_alive
+        super().__init__(
+            pool_maxsize=max(1, setting.pool_size),
+            max_retries=Retry(
+                total=max(0, setting.retries),
+                backoff_factor=setting.backoff_factor,
+                # 429 and 503 are retried by ``Session`` after slowing down requests to the host,
+                # urllib3 would retry them itself when they have a ``Retry-After`` header
+                status_forcelist=[500, 502, 504],
+                respect_retry_after_header=False,
+                # bangumi.moe use POST for read-only api
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"},
+                # last 5xx response is returned to caller instead of raising ``RetryError``
+                raise_on_status=False,
+            ),
+        )
+
+    def add_headers(self, request: requests.PreparedRequest, **kwargs: Any) -> None:
+        if not self.keep_alive:
+            request.headers["Connection"] = "close"
+
+    def send(  # type: ignore[override]
+        self, request: requests.PreparedRequest, timeout: Any = None, **kwargs: Any
+    ) -> requests.Response:
+        if timeout is None:
+            timeout = self.timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+
+def mount_source_adapters(s: requests.Session) -> None:
+    """mount a ``SourceAdapter`` on base url of each data source, other urls use ``cfg.network.other``"""
+    other = SourceAdapter(cfg.network.other)
+    s.mount("http://", other)
+    s.mount("https://", other)
+    for source in Source:
+        adapter = SourceAdapter(getattr(cfg.network, source.value))
+        for base_url in source_urls(source):
+            s.mount(base_url, adapter)
+
+
+class Session(requests.Session):
+    """
+    ``requests.Session`` shared by data sources, limits how many requests
+    are sent to one host at the same time so concurrent updating won't flood a website.
+
+    Responses are kept in ``cache`` (if any), and reused while they are fresh (``cache_ttl`` of the source),
+    after that they are revalidated with ``If-None-Match``/``If-Modified-Since``.
+
+    Concurrent identical requests (same method, url and body, like cached ones) are sent only once,
+    waiting callers get a copy of the response.
+
+    Requests to a data source with mirrors go to its fastest healthy mirror (see ``MirrorPool``),
+    and fail over to others.
+
+    With a ``Cassette``, responses from network are recorded in it, or served from it in replay mode.
+
+    Requests hitting network are limited by a ``TokenBucket`` of each host (``rate_limit`` of the source),
+    429/503 responses slow it down and are retried after ``Retry-After``.
+    """
+
+    def __init__(
+        self, max_connections_per_host: int, cache: Optional[HTTPCache] = None, cassette: Optional[Cassette] = None
+    ) -> None:
+        super().__init__()
+        self.cache = cache
+        self.cassette = cassette
+        self.max_connections_per_host = max(1, max_connections_per_host)
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+        self._rate_limiters: Dict[str, Optional[TokenBucket]] = {}
+        self._mirror_pools: Dict[Source, Optional[MirrorPool]] = {}
+        # identical requests sent at the same time
+        self.in_flight = SingleFlight()
+        self.cookies_file: Optional[pathlib.Path] = None
+        self._saved_cookies: Optional[bytes] = None
+        self._cookies_lock = threading.Lock()
+
+    def load_cookies(self, path: pathlib.Path) -> None:
+        """load cookies from ``path``, they are saved to it again by ``save_cookies``"""
+        self.cookies_file = path
+        if path.exists():
+            dump = path.read_bytes()
+            try:
+                self.cookies.update(pickle.loads(dump))
+                self._saved_cookies = dump
+            except (pickle.UnpicklingError, EOFError):
+                path.unlink()
+
+    def save_cookies(self) -> None:
+        """
+        write cookies to ``cookies_file`` if they changed since last saved,
+        file is replaced atomically so a crash won't leave a broken one.
+
+        Jar may be changed by any thread sending requests,
+        only call it when no request is in flight, like after an update run or at exit.
+        """
+        if self.cookies_file is None or not self.cookies_file.parent.is_dir():
+            return
+        with self._cookies_lock:
+            dump = pickle.dumps(self.cookies)
+            if dump == self._saved_cookies:
+                return
+            tmp = self.cookies_file.with_name(f"{self.cookies_file.name}.{os.getpid()}.tmp")
+            tmp.write_bytes(dump)
+            os.replace(tmp, self.cookies_file)
+            self._saved_cookies = dump
+
+    def host_slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.max_connections_per_host)
+                self._host_slots[host] = slot
+        return slot
+
+    def rate_limiter(self, url: str) -> Optional[TokenBucket]:
+        """``None`` if requests to host of ``url`` are not rate limited"""
+        host = urlsplit(url).netloc
+        with self._host_slots_lock:
+            if host not in self._rate_limiters:
+                setting = network_setting(url)
+                limiter = TokenBucket(setting.rate_limit, setting.burst) if setting.rate_limit > 0 else None
+                self._rate_limiters[host] = limiter
+            return self._rate_limiters[host]
+
+    def mirror_pool(self, url: str) -> Optional[MirrorPool]:
+        """mirrors of the source ``url`` belongs to, ``None`` if the source has no mirror"""
+        for source in Source:
+            if url.startswith(source_url(source)):
+                with self._host_slots_lock:
+                    if source not in self._mirror_pools:
+                        urls = source_urls(source)
+                        self._mirror_pools[source] = MirrorPool(urls) if len(urls) > 1 else None
+                    return self._mirror_pools[source]
+        return None
+
+    def mirror_stats(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        with self._host_slots_lock:
+            pools = list(self._mirror_pools.items())
+        return {source.value: pool.stats() for source, pool in pools if pool is not None}
+
+    def rate_limit_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._host_slots_lock:
+            limiters = list(self._rate_limiters.items())
+        return {host: limiter.stats() for host, limiter in limiters if limiter is not None}
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> requests.Response:  # type: ignore[override]
+        with self.host_slot(url):
+            return super().request(method, url, *args, **kwargs)
+
+    def warm_up(self, url: str) -> None:
+        """
+        open as many connections to host of ``url`` as it will be requested concurrently,
+        so they are ready in connection pool before fetching. Errors are ignored.
+
+        First request also picks a working mirror, no more connection is opened if it fails.
+        """
+
+        def head() -> bool:
+            try:
+                self.head(url)
+                return True
+            except requests.RequestException as e:
+                logger.debug("failed to warm up connection to {}: {!r}", url, e)
+                return False
+
+        if not head():
+            return
+
+        threads = [threading.Thread(target=head, daemon=True) for _ in range(self.max_connections_per_host - 1)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def _send_network(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        """send request to network, or record/replay it with ``cassette``"""
+        if self.cassette is None:
+            return self._send_mirrored(request, **kwargs)
+        if self.cassette.replay:
+            return self.cassette.play(request)
+
+        r = self._send_mirrored(request, **kwargs)
+        self.cassette.record(request, r)
+        return r
+
+    def _send_mirrored(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        """
+        send request to the best mirror of its source, another mirror is tried
+        if it can't be connected, times out or responses 5xx.
+        """
+        assert request.url is not None
+        pool = self.mirror_pool(request.url)
+        if pool is None:
+            return self._send_limited(request, **kwargs)
+
+        path = request.url[len(pool.primary) :]
+        tried: Set[str] = set()
+        while True:
+            mirror = pool.best(exclude=tried)
+            tried.add(mirror)
+            last = len(tried) == len(pool)
+
+            mirrored = request.copy()
+            mirrored.url = mirror + path
+            if mirror != pool.primary:
+                # cookie header was prepared for the configured url
+                mirrored.headers.pop("Cookie", None)
+                mirrored.prepare_cookies(self.cookies)
+            start = time.monotonic()
+            try:
+                r = self._send_limited(mirrored, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                pool.report(mirror, None)
+                if last:
+                    raise
+                logger.debug("mirror {} failed: {!r}, fail over to another mirror", mirror, e)
+                continue
+
+            if r.status_code >= 500:
+                pool.report(mirror, None)
+                if not last:
+                    logger.debug("mirror {} responses {}, fail over to another mirror", mirror, r.status_code)
+                    r.close()
+                    continue
+            else:
+                pool.report(mirror, time.monotonic() - start)
+            self._share_cookies(pool, r)
+            return r
+
+    def _share_cookies(self, pool: MirrorPool, r: requests.Response) -> None:
+        """
+        mirrors serve the same site, cookies set by one of them are set for all mirrors.
+        So login state (cookies of the configured url) is kept whichever mirror responses.
+        """
+        for response in [*r.history, r]:
+            for cookie in response.cookies:
+                for url in (m.url for m in pool.mirrors):
+                    host = urlsplit(url).hostname or ""
+                    if "." not in host:
+                        # cookie jar keeps cookies of a host like ``localhost`` as ``localhost.local``
+                        host += ".local"
+                    domain = "." + host if cookie.domain_initial_dot else host
+                    if domain != cookie.domain:
+                        mirrored = copy.copy(cookie)
+                        mirrored.domain = domain
+                        self.cookies.set_cookie(mirrored)
+
+    def _send_limited(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        """send request to network after waiting for rate limiter of the host"""
+        assert request.url is not None
+        limiter = self.rate_limiter(request.url)
+        setting = network_setting(request.url)
+        retries = max(0, setting.retries)
+
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            try:
+                r = super().send(request, **kwargs)
+            except requests.ConnectionError:
+                # connection dropped by an overloaded host
+                if limiter is not None:
+                    limiter.throttle()
+                raise
+
+            if r.status_code not in THROTTLED_STATUS:
+                if limiter is not None:
+                    limiter.success()
+                return r
+
+            delay = retry_after(r)
+            if delay is None:
+                delay = setting.backoff_factor * 2**attempt
+            if attempt >= retries or delay > MAX_RETRY_AFTER:
+                if limiter is not None:
+                    limiter.throttle(min(delay, MAX_RETRY_AFTER))
+                return r
+
+            logger.debug("{} responses {}, retry after {:.1f}s", request.url, r.status_code, delay)
+            r.close()
+            if limiter is not None:
+                # other requests to the host wait too
+                limiter.throttle(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    def send(self, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:  # type: ignore[override]
+        if kwargs.get("stream") or not _cacheable(request):
+            return self._send_network(request, **kwargs)
+
+        assert request.method is not None
+        assert request.url is not None
+        key = HTTPCache.key(request.method, request.url, _body_bytes(request.body))  # type: ignore[arg-type]
+        reused = _reused.get()
+        if reused is not None and "no-cache" not in request.headers.get("Cache-Control", ""):
+            kept = reused.get(key)
+            if kept is not None:
+                return _copy_response(kept, request)
+
+        r, shared = self.in_flight.do(key, lambda: self._send_cached(key, request, **kwargs))
+        if shared:
+            r = _copy_response(r, request)
+        if reused is not None and r.status_code == 200:
+            reused[key] = _copy_response(r, request)
+        return r
+
+    @staticmethod
+    @contextlib.contextmanager
+    def reuse_responses() -> Iterator[None]:
+        """
+        responses of data sources received in this context are returned again for same requests,
+        even if http cache is disabled. Like first page of a bangumi fetched by fingerprint probe
+        and again by the full fetch. Threads started by ``bgmi.website.base.fetch_all`` and
+        ``fetch_pages`` share responses of the context they are started in.
+        """
+        token = _reused.set({})
+        try:
+            yield
+        finally:
+            _reused.reset(token)
+
+    def _send_cached(self, key: str, request: requests.PreparedRequest, **kwargs: Any) -> requests.Response:
+        if self.cache is None:
+            return self._send_network(request, **kwargs)
+
+        assert request.url is not None
+        cached = self.cache.get(key)
+        if cached is not None:
+            no_cache = "no-cache" in request.headers.get("Cache-Control", "")
+            if not no_cache and cached.is_fresh(network_setting(request.url).cache_ttl):
+                return cached.to_response(request)
+            if cached.etag:
+                request.headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                request.headers["If-Modified-Since"] = cached.last_modified
+
+        r = self._send_network(request, **kwargs)
+
+        if cached is not None and r.status_code == 304:
+            self.cache.touch(key, cached, r)
+            return cached.to_response(request)
+
+        if r.status_code == 200 and "no-store" not in r.headers.get("Cache-Control", ""):
+            self.cache.set(key, r)
+
+        return r
+
+
+def _cassette_from_env() -> Optional[Cassette]:
+    replay = os.getenv("BGMI_HTTP_REPLAY")
+    if replay:
+        return Cassette(pathlib.Path(replay), replay=True)
+    record = os.getenv("BGMI_HTTP_RECORD")
+    if record:
+        return Cassette(pathlib.Path(record), replay=False)
+    return None
+
+
+_cassette = _cassette_from_env()
+
+session = Session(
+    max_connections_per_host=cfg.max_connections_per_host,
+    # all responses should be recorded, and replayed ones should not be mixed with cached ones
+    cache=(
+        HTTPCache(cfg.tmp_path.joinpath("http_cache"), cfg.network.cache_max_size)
+        if cfg.network.cache and _cassette is None
+        else None
+    ),
+    cassette=_cassette,
+)
+
+if cfg.proxy:
+    session.proxies = {"http": cfg.proxy, "https": cfg.proxy}
+
+mount_source_adapters(session)
+
+cookies_file = pathlib.Path(cfg.tmp_path).joinpath("mikan_cookies.txt")
+session.load_cookies(cookies_file)
+
+
+@atexit.register
+def save_cookies() -> None:
+    session.save_cookies()
@@ -0,0 +1,398 @@
+import asyncio
+import datetime
+import functools
+import http.client
+import weakref
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from loguru import logger
+from requests.cookies import MockRequest, MockResponse
+from requests.structures import CaseInsensitiveDict
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError, HTTPRequest, HTTPResponse
+from tornado.simple_httpclient import HTTPTimeoutError
+
+from bgmi.config import SourceNetwork, cfg
+from bgmi.session import Session, _body_bytes, _cacheable, _copy_response, _reused, network_setting, session
+from bgmi.session.cache import HTTPCache
+from bgmi.session.ratelimit import MAX_RETRY_AFTER, THROTTLED_STATUS, retry_after
+
+try:
+    import pycurl  # type: ignore[import-untyped]
+    from tornado.curl_httpclient import CurlAsyncHTTPClient
+except ImportError:
+    pycurl = None
+
+# ``CURLE_OPERATION_TIMEDOUT``
+_CURL_TIMEOUT = 28
+
+# retried with backoff like ``SourceAdapter``, 429 and 503 are retried after ``Retry-After``
+_RETRY_STATUS = (500, 502, 504)
+
+
+@functools.lru_cache
+def http2_available() -> bool:
+    """tornado's curl client is installed, and libcurl is built with HTTP/2"""
+    return pycurl is not None and bool(pycurl.version_info()[4] & pycurl.VERSION_HTTP2)
+
+
+def _prefer_http2(curl: Any) -> None:
+    # HTTP/2 for https (negotiated with ALPN), HTTP/1.1 for plain http
+    curl.setopt(pycurl.HTTP_VERSION, pycurl.CURL_HTTP_VERSION_2TLS)
+
+
+def _as_response(request: requests.PreparedRequest, response: HTTPResponse) -> requests.Response:
+    r = requests.Response()
+    r.status_code = response.code
+    r.reason = response.reason
+    assert request.url is not None
+    r.url = request.url
+    r.request = request
+    r.headers = CaseInsensitiveDict({name: ", ".join(response.headers.get_list(name)) for name in response.headers})
+    r.encoding = requests.utils.get_encoding_from_headers(r.headers)
+    r._content = response.body or b""  # pylint: disable=protected-access
+    r.elapsed = datetime.timedelta(seconds=response.request_time or 0)
+
+    message = http.client.HTTPMessage()
+    for name, value in response.headers.get_all():
+        message[name] = value
+    r.cookies.extract_cookies(MockResponse(message), MockRequest(request))  # type: ignore[arg-type]
+    return r
+
+
+class AsyncSession:
+    """
+    asyncio counterpart of ``Session``, requests are sent by tornado's ``AsyncHTTPClient``
+    without blocking event loop. Use ``async_session()`` to get the one of running loop.
+
+    It shares cookies, http cache, cassette, mirrors and rate limiters of hosts with the ``Session`` it wraps,
+    so pages fetched by the web server and cli are cached and limited together.
+    Connection errors and 5xx responses are retried like ``SourceAdapter`` does.
+
+    HTTP/2 is used when tornado's curl client is available (``pip install 'bgmi[http2]'``)
+    and libcurl supports it, otherwise HTTP/1.1 by tornado's simple client.
+    Simple client can't send requests through a proxy, so they are sent by the wrapped session
+    in a thread if ``proxy`` is configured.
+    """
+
+    def __init__(self, s: Session) -> None:
+        self.session = s
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        # identical requests sent at the same time
+        self._in_flight: Dict[str, "asyncio.Future[requests.Response]"] = {}
+
+    def _client(self) -> AsyncHTTPClient:
+        # clients are shared by all callers of an event loop
+        max_clients = max(10, cfg.update_workers * self.session.max_connections_per_host)
+        if pycurl is not None:
+            return CurlAsyncHTTPClient(max_clients=max_clients)
+        return AsyncHTTPClient(max_clients=max_clients)
+
+    def _proxy(self) -> Optional[str]:
+        return self.session.proxies.get("https") or self.session.proxies.get("http")
+
+    def host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(self.session.max_connections_per_host)
+            self._host_slots[host] = slot
+        return slot
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Any = None,
+        data: Any = None,
+        json: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        allow_redirects: bool = True,
+    ) -> requests.Response:
+        if self._proxy() is not None and pycurl is None:
+            return await asyncio.get_running_loop().run_in_executor(
+                None,
+                functools.partial(
+                    self.session.request,
+                    method,
+                    url,
+                    params=params,
+                    data=data,
+                    json=json,
+                    headers=headers,
+                    allow_redirects=allow_redirects,
+                ),
+            )
+
+        request = self.session.prepare_request(
+            requests.Request(method.upper(), url, params=params, data=data, json=json, headers=headers)
+        )
+        return await self.send(request, allow_redirects=allow_redirects)
+
+    async def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def send(self, request: requests.PreparedRequest, allow_redirects: bool = True) -> requests.Response:
+        history: List[requests.Response] = []
+        r = await self._send_one(request)
+        while allow_redirects and r.is_redirect:
+            if len(history) >= self.session.max_redirects:
+                raise requests.TooManyRedirects(f"Exceeded {self.session.max_redirects} redirects.", response=r)
+            history.append(r)
+            request = self._redirected(request, r)
+            r = await self._send_one(request)
+        r.history = history
+        return r
+
+    def _redirected(self, request: requests.PreparedRequest, r: requests.Response) -> requests.PreparedRequest:
+        """request following redirect response ``r``, like ``requests.Session.resolve_redirects``"""
+        redirected = request.copy()
+        redirected.url = urljoin(r.url, r.headers["Location"])
+        self.session.rebuild_method(redirected, r)
+        if r.status_code not in (307, 308):
+            for name in ("Content-Length", "Content-Type", "Transfer-Encoding"):
+                redirected.headers.pop(name, None)
+            redirected.body = None
+        # cookies may be set by the redirect response
+        redirected.headers.pop("Cookie", None)
+        redirected.prepare_cookies(self.session.cookies)
+        return redirected
+
+    async def _send_one(self, request: requests.PreparedRequest) -> requests.Response:
+        if not _cacheable(request):
+            return await self._send_network(request)
+
+        assert request.method is not None
+        assert request.url is not None
+        key = HTTPCache.key(request.method, request.url, _body_bytes(request.body))  # type: ignore[arg-type]
+        reused = _reused.get()
+        if reused is not None and "no-cache" not in request.headers.get("Cache-Control", ""):
+            kept = reused.get(key)
+            if kept is not None:
+                return _copy_response(kept, request)
+
+        running = self._in_flight.get(key)
+        if running is not None:
+            r = _copy_response(await asyncio.shield(running), request)
+        else:
+            future: "asyncio.Future[requests.Response]" = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            try:
+                r = await self._send_cached(key, request)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # waiting callers get it, don't warn about it if there is none
+                future.exception()
+                raise
+            else:
+                future.set_result(r)
+            finally:
+                del self._in_flight[key]
+
+        if reused is not None and r.status_code == 200:
+            reused[key] = _copy_response(r, request)
+        return r
+
+    async def _send_cached(self, key: str, request: requests.PreparedRequest) -> requests.Response:
+        cache = self.session.cache
+        if cache is None:
+            return await self._send_network(request)
+
+        assert request.url is not None
+        cached = cache.get(key)
+        if cached is not None:
+            no_cache = "no-cache" in request.headers.get("Cache-Control", "")
+            if not no_cache and cached.is_fresh(network_setting(request.url).cache_ttl):
+                return cached.to_response(request)
+            if cached.etag:
+                request.headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                request.headers["If-Modified-Since"] = cached.last_modified
+
+        r = await self._send_network(request)
+
+        if cached is not None and r.status_code == 304:
+            cache.touch(key, cached, r)
+            return cached.to_response(request)
+
+        if r.status_code == 200 and "no-store" not in r.headers.get("Cache-Control", ""):
+            cache.set(key, r)
+
+        return r
+
+    async def _send_network(self, request: requests.PreparedRequest) -> requests.Response:
+        cassette = self.session.cassette
+        if cassette is None:
+            return await self._send_mirrored(request)
+        if cassette.replay:
+            return cassette.play(request)
+
+        r = await self._send_mirrored(request)
+        cassette.record(request, r)
+        return r
+
+    async def _send_mirrored(self, request: requests.PreparedRequest) -> requests.Response:
+        """like ``Session._send_mirrored``, fail over to another mirror of the source"""
+        assert request.url is not None
+        pool = self.session.mirror_pool(request.url)
+        if pool is None:
+            return await self._send_limited(request)
+
+        path = request.url[len(pool.primary) :]
+        tried: Set[str] = set()
+        while True:
+            mirror = pool.best(exclude=tried)
+            tried.add(mirror)
+            last = len(tried) == len(pool)
+
+            mirrored = request.copy()
+            mirrored.url = mirror + path
+            if mirror != pool.primary:
+                mirrored.headers.pop("Cookie", None)
+                mirrored.prepare_cookies(self.session.cookies)
+            start = asyncio.get_running_loop().time()
+            try:
+                r = await self._send_limited(mirrored)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                pool.report(mirror, None)
+                if last:
+                    raise
+                logger.debug("mirror {} failed: {!r}, fail over to another mirror", mirror, e)
+                continue
+
+            if r.status_code >= 500:
+                pool.report(mirror, None)
+                if not last:
+                    logger.debug("mirror {} responses {}, fail over to another mirror", mirror, r.status_code)
+                    continue
+            else:
+                pool.report(mirror, asyncio.get_running_loop().time() - start)
+            self.session._share_cookies(pool, r)  # pylint: disable=protected-access
+            return r
+
+    async def _send_limited(self, request: requests.PreparedRequest) -> requests.Response:
+        """like ``Session._send_limited``, but waiting for rate limiter doesn't block event loop"""
+        assert request.url is not None
+        limiter = self.session.rate_limiter(request.url)
+        setting = network_setting(request.url)
+        retries = max(0, setting.retries)
+
+        attempt = 0
+        while True:
+            if limiter is not None:
+                wait = limiter.reserve()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            try:
+                r = await self._fetch(request, setting)
+            except requests.ConnectionError:
+                if limiter is not None:
+                    limiter.throttle()
+                raise
+
+            if r.status_code not in THROTTLED_STATUS:
+                if limiter is not None:
+                    limiter.success()
+                return r
+
+            delay = retry_after(r)
+            if delay is None:
+                delay = setting.backoff_factor * 2**attempt
+            if attempt >= retries or delay > MAX_RETRY_AFTER:
+                if limiter is not None:
+                    limiter.throttle(min(delay, MAX_RETRY_AFTER))
+                return r
+
+            logger.debug("{} responses {}, retry after {:.1f}s", request.url, r.status_code, delay)
+            if limiter is not None:
+                limiter.throttle(delay)
+            else:
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _fetch(self, request: requests.PreparedRequest, setting: SourceNetwork) -> requests.Response:
+        """send request with at most ``max_connections_per_host`` in flight to the host"""
+        assert request.url is not None
+        retries = max(0, setting.retries)
+        attempt = 0
+        while True:
+            try:
+                async with self.host_slot(request.url):
+                    r = await self._fetch_once(request, setting)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= retries:
+                    raise
+            else:
+                if r.status_code not in _RETRY_STATUS or attempt >= retries:
+                    return r
+            attempt += 1
+            await asyncio.sleep(setting.backoff_factor * 2 ** (attempt - 1))
+
+    async def _fetch_once(self, request: requests.PreparedRequest, setting: SourceNetwork) -> requests.Response:
+        assert request.url is not None
+        assert request.method is not None
+        headers = dict(request.headers)
+        # set by tornado for encodings it can decode
+        headers.pop("Accept-Encoding", None)
+        if not setting.keep_alive:
+            headers["Connection"] = "close"
+
+        kwargs: Dict[str, Any] = {}
+        proxy = self._proxy()
+        if proxy is not None:
+            url = urlsplit(proxy)
+            # curl takes scheme of proxy (like ``socks5://``) with its host
+            kwargs.update(
+                proxy_host=f"{url.scheme}://{url.hostname}",
+                proxy_port=url.port or 1080,
+                proxy_username=url.username,
+                proxy_password=url.password,
+            )
+        if http2_available():
+            kwargs.update(prepare_curl_callback=_prefer_http2)
+
+        tornado_request = HTTPRequest(
+            request.url,
+            method=request.method,
+            headers=headers,
+            body=_body_bytes(request.body),
+            follow_redirects=False,
+            decompress_response=True,
+            allow_nonstandard_methods=True,
+            connect_timeout=setting.connect_timeout,
+            request_timeout=setting.connect_timeout + setting.read_timeout,
+            **kwargs,
+        )
+        try:
+            response = await self._client().fetch(tornado_request, raise_error=False)
+        except HTTPClientError as e:
+            # tornado use 599 for timeout and closed connection
+            if isinstance(e, HTTPTimeoutError) or getattr(e, "errno", None) == _CURL_TIMEOUT:
+                raise requests.Timeout(str(e), request=request) from e
+            raise requests.ConnectionError(str(e), request=request) from e
+        except OSError as e:
+            raise requests.ConnectionError(e, request=request) from e
+
+        r = _as_response(request, response)
+        for cookie in r.cookies:
+            self.session.cookies.set_cookie(cookie)
+        return r
+
+
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncSession]" = weakref.WeakKeyDictionary()
+
+
+def async_session() -> AsyncSession:
+    """``AsyncSession`` of running event loop over the shared ``session``"""
+    loop = asyncio.get_running_loop()
+    s = _sessions.get(loop)
+    if s is None:
+        s = _sessions[loop] = AsyncSession(session)
+    return s
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# headers describing the raw transfer, cached body is already decoded
+_DROPPED_HEADERS = ("content-encoding", "content-length", "transfer-encoding")
+
+
+class CachedResponse:
+    def __init__(self, meta: Dict[str, Any], body: bytes) -> None:
+        self.meta = meta
+        self.body = body
+
+    @property
+    def stored_at(self) -> float:
+        return float(self.meta["stored_at"])
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.meta["headers"].get("etag")  # type: ignore[no-any-return]
+
+    @property
+    def last_modified(self) -> Optional[str]:
+        return self.meta["headers"].get("last-modified")  # type: ignore[no-any-return]
+
+    def is_fresh(self, ttl: int) -> bool:
+        return time.time() - self.stored_at < ttl
+
+    def to_response(self, request: requests.PreparedRequest) -> requests.Response:
+        r = requests.Response()
+        r.status_code = self.meta["status"]
+        r.reason = self.meta.get("reason", "OK")
+        r.url = self.meta["url"]
+        r.encoding = self.meta.get("encoding")
+        r.headers = CaseInsensitiveDict(self.meta["headers"])
+        r.request = request
+        r._content = self.body  # pylint: disable=protected-access
+        r.from_cache = True  # type: ignore[attr-defined]
+        return r
+
+
+class HTTPCache:
+    """
+    on-disk http response cache.
+
+    Every entry is stored as ``{key}.json`` (status, headers, time it was stored)
+    and ``{key}.body``, entries least recently used are removed when total size exceeds ``max_size``.
+    """
+
+    def __init__(self, path: Path, max_size: int) -> None:
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+
+    @staticmethod
+    def key(method: str, url: str, body: Optional[bytes]) -> str:
+        h = hashlib.sha256()
+        h.update(method.upper().encode())
+        h.update(b"\n")
+        h.update(url.encode())
+        h.update(b"\n")
+        h.update(body or b"")
+        return h.hexdigest()
+
+    def _meta_file(self, key: str) -> Path:
+        return self.path.joinpath(f"{key}.json")
+
+    def _body_file(self, key: str) -> Path:
+        return self.path.joinpath(f"{key}.body")
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        try:
+            meta = json.loads(self._meta_file(key).read_text(encoding="utf-8"))
+            body = self._body_file(key).read_bytes()
+        except (OSError, ValueError):
+            return None
+
+        now = time.time()
+        try:
+            os.utime(self._body_file(key), (now, now))
+        except OSError:
+            pass
+        return CachedResponse(meta, body)
+
+    def set(self, key: str, response: requests.Response) -> None:
+        body = response.content
+        if len(body) * 4 > self.max_size:
+            return
+
+        headers = {k.lower(): v for k, v in response.headers.items() if k.lower() not in _DROPPED_HEADERS}
+        meta = {
+            "url": response.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "encoding": response.encoding,
+            "headers": headers,
+            "stored_at": time.time(),
+        }
+        self._write(key, meta, body)
+
+    def touch(self, key: str, cached: CachedResponse, response: requests.Response) -> None:
+        """server returned ``304 Not Modified``, update validators and refresh stored time"""
+        for name in ("etag", "last-modified", "cache-control", "expires"):
+            if name in response.headers:
+                cached.meta["headers"][name] = response.headers[name]
+        cached.meta["stored_at"] = time.time()
+        self._write(key, cached.meta, cached.body)
+
+    def _write(self, key: str, meta: Dict[str, Any], body: bytes) -> None:
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            old_size = self._entry_size(key)
+            _atomic_write(self._body_file(key), body)
+            _atomic_write(self._meta_file(key), json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        except OSError:
+            return
+
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(body) - old_size
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def _entry_size(self, key: str) -> int:
+        try:
+            return self._body_file(key).stat().st_size
+        except OSError:
+            return 0
+
+    def _body_files(self) -> List[Tuple[os.stat_result, Path]]:
+        """stat of cached bodies, files removed meanwhile (by another process sharing the cache) are skipped"""
+        files = []
+        for f in self.path.glob("*.body"):
+            try:
+                files.append((f.stat(), f))
+            except OSError:
+                continue
+        return files
+
+    def _scan_size(self) -> int:
+        return sum(stat.st_size for stat, _ in self._body_files())
+
+    def _evict(self) -> None:
+        assert self._size is not None
+        # evict down to 90% of max size, so we don't need to scan directory on every write
+        target = self.max_size * 9 // 10
+        entries = sorted(self._body_files(), key=lambda x: x[0].st_mtime)
+        for stat, body_file in entries:
+            if self._size <= target:
+                break
+            try:
+                body_file.unlink()
+            except OSError:
+                continue
+            self._size -= stat.st_size
+            try:
+                body_file.with_suffix(".json").unlink()
+            except OSError:
+                pass
+
+
+def _atomic_write(path: Path, content: bytes) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+import requests
+
+from bgmi.session.cache import HTTPCache
+
+
+class Cassette:
+    """
+    http responses recorded in a directory (``BGMI_HTTP_RECORD``) and served from it
+    without network (``BGMI_HTTP_REPLAY``), so runs can be repeated offline with identical inputs.
+
+    Responses are stored like ``HTTPCache`` entries keyed by method, url and body, nothing is evicted.
+    A request sent more than once is recorded once, the last response wins.
+    """
+
+    def __init__(self, path: Path, replay: bool) -> None:
+        self.path = path
+        self.replay = replay
+        self._store = HTTPCache(path, max_size=sys.maxsize)
+
+    @staticmethod
+    def key(request: requests.PreparedRequest) -> str:
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        return HTTPCache.key(request.method or "GET", request.url or "", body)
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response) -> None:
+        self._store.set(self.key(request), response)
+
+    def play(self, request: requests.PreparedRequest) -> requests.Response:
+        recorded = self._store.get(self.key(request))
+        if recorded is None:
+            raise requests.ConnectionError(f"no recorded response of {request.method} {request.url} in {self.path}")
+        r = recorded.to_response(request)
+        r.from_cache = False  # type: ignore[attr-defined]
+        return r
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Callable, Collection, Dict, List, Optional
+
+
+class _Mirror:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        # moving average of response time, ``None`` if never succeeded
+        self.latency: Optional[float] = None
+        # moving average of failed requests, 0 to 1
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        # failures in a row, and time before which mirror is not used
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def score(self) -> float:
+        return (self.latency or 0) * (1 + 4 * self.error_rate)
+
+
+class MirrorPool:
+    """
+    base urls of a data source, the first one is the configured url.
+
+    Requests go to the mirror with lowest response time (weighted by error rate),
+    a mirror never used has no response time so every mirror is tried early.
+    A failed mirror is not used for a cooldown which doubles on each failure in a row,
+    if all mirrors are cooling down, the one recovering first is used.
+    """
+
+    # weight of latest request in moving averages
+    alpha = 0.3
+    cooldown = 30
+    max_cooldown = 600
+
+    def __init__(self, urls: List[str], clock: Callable[[], float] = time.monotonic) -> None:
+        self.mirrors = [_Mirror(url) for url in dict.fromkeys(urls)]
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.mirrors)
+
+    @property
+    def primary(self) -> str:
+        return self.mirrors[0].url
+
+    def best(self, exclude: Collection[str] = ()) -> str:
+        """best mirror not in ``exclude``"""
+        now = self.clock()
+        with self._lock:
+            candidates = [(i, m) for i, m in enumerate(self.mirrors) if m.url not in exclude]
+            _, mirror = min(
+                candidates,
+                key=lambda c: (c[1].retry_at > now, c[1].retry_at if c[1].retry_at > now else 0, c[1].score(), c[0]),
+            )
+            return mirror.url
+
+    def report(self, url: str, latency: Optional[float]) -> None:
+        """record result of a request to mirror ``url``, ``latency`` is ``None`` if it failed"""
+        with self._lock:
+            mirror = next(m for m in self.mirrors if m.url == url)
+            mirror.requests += 1
+            if latency is None:
+                mirror.errors += 1
+                mirror.failures += 1
+                mirror.error_rate += self.alpha * (1 - mirror.error_rate)
+                mirror.retry_at = self.clock() + min(self.max_cooldown, self.cooldown * 2 ** (mirror.failures - 1))
+                return
+
+            mirror.failures = 0
+            mirror.retry_at = 0
+            mirror.error_rate -= self.alpha * mirror.error_rate
+            if mirror.latency is None:
+                mirror.latency = latency
+            else:
+                mirror.latency += self.alpha * (latency - mirror.latency)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                m.url: {
+                    "latency": round(m.latency, 3) if m.latency is not None else -1,
+                    "error_rate": round(m.error_rate, 3),
+                    "requests": m.requests,
+                    "errors": m.errors,
+                }
+                for m in self.mirrors
+            }
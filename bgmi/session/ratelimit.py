@@ -0,0 +1,106 @@
+import email.utils
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+
+# responses telling client to slow down, request is retried after waiting
+THROTTLED_STATUS = (429, 503)
+
+# don't wait longer than this for a ``Retry-After``, response is returned to caller instead
+MAX_RETRY_AFTER = 120
+
+
+def retry_after(r: requests.Response) -> Optional[float]:
+    """seconds to wait in ``Retry-After`` header, it's either seconds or a http date"""
+    value = r.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class TokenBucket:
+    """
+    rate limiter of a host, ``burst`` requests can be sent at once,
+    then a request every ``1 / rate`` seconds.
+
+    Rate is halved when host responses 429/503 or drops connection,
+    and recovers by ``max_rate / 20`` after each successful request (AIMD).
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.max_rate = rate
+        self.min_rate = rate / 16
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        # theoretical arrival time of next request if requests were sent at ``rate``, see GCRA
+        self._next = 0.0
+        self._paused_until = 0.0
+
+        self.requests = 0
+        self.waits = 0
+        self.waited = 0.0
+        self.throttled = 0
+
+    def reserve(self) -> float:
+        """take the next slot to send a request, return seconds to wait before sending it"""
+        with self._lock:
+            now = self.clock()
+            interval = 1 / self.rate
+            tat = max(self._next, now)
+            # at most ``burst - 1`` requests ahead of schedule
+            start = max(tat - (self.burst - 1) * interval, now, self._paused_until)
+            self._next = max(tat, start) + interval
+            wait = start - now
+            self.requests += 1
+            if wait > 0:
+                self.waits += 1
+                self.waited += wait
+        return wait
+
+    def acquire(self) -> float:
+        """wait until a request can be sent, return seconds waited"""
+        wait = self.reserve()
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def throttle(self, pause: float = 0) -> None:
+        """host is overloaded, slow down and send nothing in next ``pause`` seconds"""
+        with self._lock:
+            self.throttled += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._paused_until = max(self._paused_until, self.clock() + pause)
+            # no burst after pause
+            self._next = max(self._next, self._paused_until + (self.burst - 1) / self.rate)
+
+    def success(self) -> None:
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "waits": self.waits,
+                "waited": round(self.waited, 3),
+                "throttled": self.throttled,
+                "rate": round(self.rate, 3),
+            }
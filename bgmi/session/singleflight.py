@@ -0,0 +1,64 @@
+import threading
+from typing import Any, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+_R = TypeVar("_R")
+
+
+class _Call(Generic[_R]):
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[_R] = None
+        self.error: Optional[BaseException] = None
+        self.thread = threading.get_ident()
+
+
+class SingleFlight:
+    """
+    concurrent calls with the same key are run only once,
+    callers arriving while it's running wait for it and get the same result (or exception).
+
+    Nothing is kept after the call finished, it's not a cache.
+    A call with the same key from inside ``func`` (like a redirect back to the same url) isn't coalesced.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call[Any]] = {}
+
+    def do(self, key: Hashable, func: Callable[[], _R]) -> Tuple[_R, bool]:
+        """
+        :return: result of ``func``, and whether it's shared from another caller,
+            a shared result should be copied before being modified.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            nested = call is not None and call.thread == threading.get_ident()
+            leader = call is None
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+
+        if nested:
+            # waiting for the call this thread is running would never return
+            return func(), False
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True  # type: ignore[return-value]
+
+        try:
+            call.result = func()
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -9,12 +9,11 @@ import subprocess
 import sys
 import tarfile
 import time
-import traceback
 from io import BytesIO
 from multiprocessing.pool import ThreadPool
 from pathlib import Path
 from shutil import move, rmtree
-from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
 
 import requests
 import semver
@@ -162,7 +161,7 @@ FRONTEND_NPM_URL = "https://registry.npmjs.com/bgmi-frontend/"
 
 @functools.lru_cache
 def npm_package_manifest() -> Dict[str, Any]:
-    r = session.get(FRONTEND_NPM_URL, timeout=60)
+    r = session.get(FRONTEND_NPM_URL)
     r.raise_for_status()
     return r.json()  # type: ignore
 
@@ -184,7 +183,7 @@ def check_update(mark: bool = True) -> None:
     def update() -> None:
         try:
             print_info("Checking update ...")
-            pypi = session.get("https://pypi.org/pypi/bgmi/json", timeout=60).json()
+            pypi = session.get("https://pypi.org/pypi/bgmi/json").json()
             version = pypi["info"]["version"]
 
             with open(os.path.join(BGMI_PATH, "latest"), "w", encoding="utf8") as f:
@@ -231,7 +230,47 @@ def check_update(mark: bool = True) -> None:
             pass
 
 
+# fast path patterns, see `_fast_parse_episode`
+_FAST_EPISODE_BRACKETS = re.compile(r"[【\[]E?(\d+)\s?(?:END)?[】\]]")
+_FAST_EPISODE_ZH = re.compile(r"第(\d{1,4})[話话集]")
+_FAST_EPISODE_DASH = re.compile(r" - (\d{2,})(?= |\[|$)")
+_DIGITS = re.compile(r"\d+")
+# numbers like `1080p`, `4K`, `x264]`, `MP4]`, none of patterns of general parser can match them
+_INERT_DIGITS = re.compile(r"(?<![\d~-])(?<![~-]\s)\d+[pPkK]|(?<=[A-DF-Za-z])\d+(?=[\]】]|$)")
+_ZH_EPISODE_UNIT = re.compile(r"[話话集]")
+
+
+def _fast_parse_episode(episode_title: str) -> Optional[int]:
+    """
+    parse common formats ``[07]``, ``第07话`` and `` - 07 ``, return ``None`` if title is not one of them.
+
+    Every pattern of ``anime_episode_parser`` needs a number or one of ``話话集``,
+    when title contains only one number (besides inert ones), range patterns can't match
+    and the result of general parser is that number.
+    """
+    if len(_DIGITS.findall(episode_title)) - len(_INERT_DIGITS.findall(episode_title)) != 1:
+        return None
+
+    units = len(_ZH_EPISODE_UNIT.findall(episode_title))
+    if units == 0:
+        m = _FAST_EPISODE_BRACKETS.search(episode_title) or _FAST_EPISODE_DASH.search(episode_title)
+    elif units == 1:
+        m = _FAST_EPISODE_ZH.search(episode_title)
+    else:
+        return None
+
+    if m is None:
+        return None
+    return int(m.group(1))
+
+
+@functools.lru_cache(maxsize=8192)
 def parse_episode(episode_title: str) -> int:
+    """same titles are returned by data sources again and again, so results are cached"""
+    e = _fast_parse_episode(episode_title)
+    if e is not None:
+        return e
+
     s, c = _parse_episode(episode_title)
     if c != 1:
         return 0
@@ -239,6 +278,57 @@ def parse_episode(episode_title: str) -> int:
     return s or 0
 
 
+def parse_episodes(episode_titles: Iterable[str]) -> List[int]:
+    """parse all titles in a result page, repeated titles are parsed only once"""
+    parsed: Dict[str, int] = {}
+    result = []
+    for title in episode_titles:
+        e = parsed.get(title)
+        if e is None:
+            e = parsed[title] = parse_episode(title)
+        result.append(e)
+    return result
+
+
+def parse_episode_stats() -> Dict[str, Any]:
+    info = parse_episode.cache_info()
+    total = info.hits + info.misses
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "hit_rate": info.hits / total if total else 0.0,
+    }
+
+
+# `2024/01/03 22:00` of mikan and dmhy, `2024-01-03T22:00:00.000Z` of bangumi.moe and mikan rss
+_TIME_PATTERN = re.compile(r"(\d{4})[/-](\d{1,2})[/-](\d{1,2})[ T](\d{1,2}):(\d{1,2})(?::(\d{1,2}))?")
+
+
+@functools.lru_cache(maxsize=4096)
+def _local_hour_timestamp(year: int, month: int, day: int, hour: int) -> int:
+    return int(time.mktime((year, month, day, hour, 0, 0, 0, 0, -1)))
+
+
+def parse_time(time_string: str) -> int:
+    """
+    parse release time of data sources as local time, same as
+    ``time.mktime(time.strptime(...))`` but much faster.
+    Rest of string after seconds (fraction, timezone) is ignored like before.
+
+    ``mktime`` is only called once for each hour, UTC offset doesn't change within an hour.
+    """
+    m = _TIME_PATTERN.match(time_string)
+    if m is None:
+        raise ValueError(f"unexpected time format {time_string!r}")
+
+    year, month, day, hour, minute, second = map(int, m.groups("0"))
+    if not (1 <= month <= 12 and 1 <= day <= 31 and hour < 24 and minute < 60 and second < 62):
+        raise ValueError(f"unexpected time {time_string!r}")
+
+    return _local_hour_timestamp(year, month, day, hour) + minute * 60 + second
+
+
 def normalize_path(url: str) -> str:
     """
     normalize link to path
@@ -287,7 +377,7 @@ def get_web_admin(method: str) -> None:
         print_warning("failed to download web admin")
         return
 
-    tar = session.get(tar_url, timeout=60)
+    tar = session.get(tar_url)
     tar.raise_for_status()
     admin_zip = BytesIO(tar.content)
     with gzip.GzipFile(fileobj=admin_zip) as f:
@@ -332,7 +422,7 @@ def download_file(url: str) -> Optional[Response]:
     logger.debug("downloading {}", url)
     if url.startswith("https://") or url.startswith("http://"):
         print_info(f"Download: {url}")
-        return session.get(url, timeout=60)
+        return session.get(url)
     return None
 
 
@@ -351,24 +441,135 @@ def download_cover(cover_url_list: List[str]) -> None:
             f.write(r.content)
 
 
-def episode_filter_regex(data: List[Episode], regex: Optional[str] = None) -> List[Episode]:
+def _split_keywords(keywords: Optional[str]) -> Optional[Tuple[str, ...]]:
+    if not keywords:
+        return None
+    return tuple(s.strip().lower() for s in keywords.split(","))
+
+
+def _global_keywords() -> Tuple[Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]:
+    include = None
+    if cfg.enable_global_include_keywords:
+        include = tuple(s.strip().lower() for s in cfg.global_include_keywords)
+    exclude = None
+    if cfg.enable_global_filters:
+        exclude = tuple(s.strip().lower() for s in cfg.global_filters)
+    return include, exclude
+
+
+def _compile_keywords(keywords: Tuple[str, ...]) -> "re.Pattern[str]":
+    """match any of lowercased ``keywords`` in one scan, no keyword never matches"""
+    if not keywords:
+        return re.compile(r"(?!)")
+    return re.compile("|".join(re.escape(k) for k in dict.fromkeys(keywords)))
+
+
+class EpisodeFilter:
     """
+    include/exclude keywords and regex compiled once, applied to episodes in one pass.
+    Keywords are matched against lowercased title, regex against original title.
 
-    :param data: list of bangumi dict
-    :param regex: regex
+    Get instance with :func:`compile_episode_filter`, which is cached.
     """
-    if regex:
-        try:
-            match = re.compile(regex)
-            data = [s for s in data if match.findall(s.title)]
-        except re.error as e:
+
+    def __init__(
+        self,
+        include: Optional[Tuple[str, ...]] = None,
+        exclude: Optional[Tuple[str, ...]] = None,
+        regex: Optional[str] = None,
+        global_include: Optional[Tuple[str, ...]] = None,
+        global_exclude: Optional[Tuple[str, ...]] = None,
+    ):
+        # title should contain any keyword of every group
+        self.includes = tuple(_compile_keywords(k) for k in (include, global_include) if k is not None)
+        self.exclude: Optional[re.Pattern[str]] = None
+        if exclude is not None or global_exclude is not None:
+            self.exclude = _compile_keywords((exclude or ()) + (global_exclude or ()))
+
+        self.regex: Optional[re.Pattern[str]] = None
+        self.regex_source = regex
+        self.regex_error: Optional[re.error] = None
+        if regex:
+            try:
+                self.regex = re.compile(regex)
+            except re.error as e:
+                self.regex_error = e
+
+    def match(self, episode: Episode) -> bool:
+        title = episode.title.lower()
+        if self.exclude is not None and self.exclude.search(title):
+            return False
+        for include in self.includes:
+            if include.search(title) is None:
+                return False
+        if self.regex is not None and self.regex.search(episode.title) is None:
+            return False
+        return True
+
+    def apply(self, episodes: List[Episode]) -> List[Episode]:
+        if self.regex_error is not None:
             if os.getenv("DEBUG"):  # pragma: no cover
-                traceback.print_exc()
-                raise e
-            print_warning(f"can't compile regex {regex}, skipping filter by regex")
+                raise self.regex_error
+            print_warning(f"can't compile regex {self.regex_source}, skipping filter by regex")
 
-    if cfg.enable_global_filters:
-        exclude_keywords = [t.strip().lower() for t in cfg.global_filters]
-        data = [x for x in data if not x.contains_any_words(exclude_keywords)]
+        return [e for e in episodes if self.match(e)]
+
+
+@functools.lru_cache(maxsize=512)
+def compile_episode_filter(
+    include: Optional[str] = None,
+    exclude: Optional[str] = None,
+    regex: Optional[str] = None,
+    global_include: Optional[Tuple[str, ...]] = None,
+    global_exclude: Optional[Tuple[str, ...]] = None,
+) -> EpisodeFilter:
+    """
+    :param include: comma separated keywords, as ``Filter.include``
+    :param exclude: comma separated keywords, as ``Filter.exclude``
+    :param regex: regex matched against original title
+    :param global_include: lowercased keywords, ``None`` if disabled
+    :param global_exclude: lowercased keywords, ``None`` if disabled
+
+    Arguments are cache key, so a filter is re-compiled after its row or config changed.
+    """
+    return EpisodeFilter(_split_keywords(include), _split_keywords(exclude), regex, global_include, global_exclude)
+
+
+def get_episode_filter(
+    include: Optional[str] = None, exclude: Optional[str] = None, regex: Optional[str] = None
+) -> EpisodeFilter:
+    """compiled filter with global include keywords and filters in config"""
+    return compile_episode_filter(include, exclude, regex, *_global_keywords())
 
-    return data
+
+def release_preference_key() -> Optional[Callable[[Episode], Tuple[int, int, int]]]:
+    """
+    rank releases of same episode by ``cfg.release_preference``,
+    to be used as ``key`` of ``Episode.remove_duplicated_bangumi``.
+    Return ``None`` if there is no preference.
+    """
+    preference = cfg.release_preference
+    if not (preference.subtitle_groups or preference.keywords or preference.newest):
+        return None
+
+    groups = {group: -index for index, group in enumerate(preference.subtitle_groups)}
+    keywords = [k.strip().lower() for k in preference.keywords]
+    newest = preference.newest
+
+    def key(episode: Episode) -> Tuple[int, int, int]:
+        title = episode.title.lower()
+        # not preferred ones rank after all preferred ones
+        keyword = next((-index for index, k in enumerate(keywords) if k in title), -len(keywords))
+        return groups.get(episode.subtitle_group or "", -len(groups)), keyword, episode.time if newest else 0
+
+    return key
+
+
+def episode_filter_regex(data: List[Episode], regex: Optional[str] = None) -> List[Episode]:
+    """
+
+    :param data: list of bangumi dict
+    :param regex: regex
+    """
+    _, global_exclude = _global_keywords()
+    return compile_episode_filter(regex=regex, global_exclude=global_exclude).apply(data)
@@ -0,0 +1,124 @@
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Iterable, List, Optional, Tuple, TypeVar
+
+from bgmi.config import cfg
+from bgmi.utils import parse_episode, parse_episodes
+from bgmi.website.base import episodes_fingerprint
+from bgmi.website.model import Episode, WebsiteBangumi
+
+_A = TypeVar("_A")
+_R = TypeVar("_R")
+
+
+async def fetch_all(func: Callable[[_A], Awaitable[_R]], args: Iterable[_A]) -> List[_R]:
+    """
+    ``bgmi.website.base.fetch_all`` for coroutines, requests are still limited
+    by ``AsyncSession.host_slot`` for each host.
+    """
+    return list(await asyncio.gather(*(func(arg) for arg in args)))
+
+
+async def fetch_pages(
+    fetch_page: Callable[[int], Awaitable[_R]],
+    max_page: int,
+    stop: Optional[Callable[[_R], bool]] = None,
+    page_count: Optional[Callable[[_R], Optional[int]]] = None,
+) -> List[_R]:
+    """``bgmi.website.base.fetch_pages`` for coroutines"""
+    result: List[_R] = []
+    if max_page < 1:
+        return result
+
+    page = await fetch_page(1)
+    result.append(page)
+    if stop is not None and stop(page):
+        return result
+
+    if page_count is not None:
+        total = page_count(page)
+        if total is not None:
+            max_page = min(max_page, total)
+
+    window = max(1, cfg.max_connections_per_host)
+    pending: Deque["asyncio.Future[_R]"] = deque()
+    next_page = 2
+    try:
+        while pending or next_page <= max_page:
+            while next_page <= max_page and len(pending) < window:
+                pending.append(asyncio.ensure_future(fetch_page(next_page)))
+                next_page += 1
+
+            page = await pending.popleft()
+            result.append(page)
+            if stop is not None and stop(page):
+                break
+    finally:
+        for future in pending:
+            future.cancel()
+
+    return result
+
+
+class AsyncWebsite:
+    """
+    asyncio variant of network part of ``BaseWebsite``, for code running in an event loop like the web server.
+    Requests are sent by ``bgmi.session.aio.AsyncSession`` so they don't block the loop,
+    database is still written by the sync website.
+
+    Methods work like ones with the same name in ``BaseWebsite``, see it for details.
+    """
+
+    parse_episode = staticmethod(parse_episode)
+    parse_episodes = staticmethod(parse_episodes)
+
+    async def fetch_followed_episodes(
+        self,
+        keyword: str,
+        subtitle_list: Optional[List[str]] = None,
+        max_page: int = cfg.max_path,
+        since: Optional[int] = None,
+        info_known: bool = False,
+    ) -> Tuple[Optional[WebsiteBangumi], List[Episode]]:
+        info = await self.fetch_single_bangumi(
+            keyword, subtitle_list=subtitle_list, max_page=max_page, info_known=info_known
+        )
+        if info is not None:
+            return info, info.episodes
+
+        return None, await self.fetch_episode_of_bangumi(
+            bangumi_id=keyword, max_page=max_page, subtitle_list=subtitle_list, since=since
+        )
+
+    async def fetch_fingerprint(self, keyword: str, subtitle_list: Optional[List[str]] = None) -> str:
+        episodes = await self.fetch_episode_of_bangumi(bangumi_id=keyword, max_page=1, subtitle_list=subtitle_list)
+        return episodes_fingerprint(episodes)
+
+    async def search_by_keyword(self, keyword: str, count: int) -> List[Episode]:  # pragma: no cover
+        raise NotImplementedError
+
+    async def search_by_tag(
+        self, tag: str, subtitle: Optional[str] = None, count: Optional[int] = None
+    ) -> List[Episode]:  # pragma: no cover
+        raise NotImplementedError
+
+    async def fetch_bangumi_calendar(self) -> List[WebsiteBangumi]:  # pragma: no cover
+        raise NotImplementedError
+
+    async def fetch_episode_of_bangumi(
+        self,
+        bangumi_id: str,
+        max_page: int,
+        subtitle_list: Optional[List[str]] = None,
+        since: Optional[int] = None,
+    ) -> List[Episode]:  # pragma: no cover
+        raise NotImplementedError
+
+    async def fetch_single_bangumi(
+        self,
+        bangumi_id: str,
+        subtitle_list: Optional[List[str]] = None,
+        max_page: int = cfg.max_path,
+        info_known: bool = False,
+    ) -> Optional[WebsiteBangumi]:
+        return None
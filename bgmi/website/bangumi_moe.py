@@ -1,6 +1,5 @@
-import datetime
+import asyncio
 import os
-import time
 from typing import Any, Dict, List, Optional, Tuple, TypedDict
 
 import requests
@@ -8,8 +7,11 @@ import requests
 from bgmi.config import cfg
 from bgmi.lib.constants import BANGUMI_UPDATE_TIME
 from bgmi.session import session
-from bgmi.utils import bug_report, print_error, print_info, print_warning
-from bgmi.website.base import BaseWebsite
+from bgmi.session.aio import async_session
+from bgmi.utils import bug_report, parse_episodes, parse_time, print_error, print_info, print_warning
+from bgmi.website import aio
+from bgmi.website.aio import AsyncWebsite
+from bgmi.website.base import BaseWebsite, fetch_all, fetch_pages
 from bgmi.website.model import Episode, SubtitleGroup, WebsiteBangumi
 
 # tag of bangumi on bangumi.moe
@@ -32,19 +34,34 @@ def get_response(url, method="GET", **kwargs):
     if os.environ.get("DEBUG"):  # pragma: no cover
         print_info(f"Request URL: {url}")
     try:
-        r = session.request(method.lower(), url, timeout=60, **kwargs)
-        if os.environ.get("DEBUG"):  # pragma: no cover
-            print(r.text)
-        r.raise_for_status()
-        return r.json()
+        return _json(session.request(method.lower(), url, **kwargs))
     except requests.ConnectionError:
         print_error("error: failed to establish a new connection")
+    raise ValueError
+
+
+async def async_get_response(url, method="GET", **kwargs):
+    if os.environ.get("DEBUG"):  # pragma: no cover
+        print_info(f"Request URL: {url}")
+    try:
+        return _json(await async_session().request(method, url, **kwargs))
+    except requests.ConnectionError:
+        print_error("error: failed to establish a new connection")
+    raise ValueError
+
+
+def _json(r: requests.Response):
+    if os.environ.get("DEBUG"):  # pragma: no cover
+        print(r.text)
+    r.raise_for_status()
+    try:
+        return r.json()
     except ValueError:
         print_error(
             "error: server returned data maybe not be json,"
             " please create a issue at https://github.com/BGmi/BGmi/issues"
         )
-    raise ValueError
+        raise
 
 
 _AVAILABLE_LANG = ("zh_cn", "zh_tw", "en", "ja")
@@ -78,8 +95,25 @@ def parser_bangumi(data: List[BangumiData]):
     """match weekly bangumi list from data"""
     ids = [b["tag_id"] for b in data]
     subtitle = get_response(TEAM_URL, "POST", json={"tag_ids": ids})
-    name = process_name(get_response(NAME_URL, "POST", json={"_ids": ids}))
+    name = get_response(NAME_URL, "POST", json={"_ids": ids})
+    return weekly_bangumi(data, subtitle, name)
 
+
+async def async_parser_bangumi(data: List[BangumiData]):
+    ids = [b["tag_id"] for b in data]
+    subtitle, name = await asyncio.gather(
+        async_get_response(TEAM_URL, "POST", json={"tag_ids": ids}),
+        async_get_response(NAME_URL, "POST", json={"_ids": ids}),
+    )
+    return weekly_bangumi(data, subtitle, name)
+
+
+def weekly_bangumi(data: List[BangumiData], subtitle, name):
+    """
+    :param subtitle: subtitle groups of bangumi in ``data``
+    :param name: tags of bangumi in ``data``
+    """
+    name = process_name(name)
     weekly_list = []
     bangumi_update_time_known = BANGUMI_UPDATE_TIME[:-1]
     for bangumi_item in data:
@@ -103,48 +137,152 @@ def parser_bangumi(data: List[BangumiData]):
     return weekly_list
 
 
+def search_pages(url: str, query: Dict[str, Any], count: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    fetch torrents in first ``count`` pages of search result concurrently,
+    ``None`` if any page has unexpected response.
+    """
+    pages = fetch_pages(
+        lambda page: get_response(url, "POST", json={**query, "p": page}),
+        count,
+        # torrents in response of bad page is empty or missing
+        stop=lambda data: not data.get("torrents"),
+        page_count=lambda data: data.get("page_count"),
+    )
+    return _search_rows(pages)
+
+
+async def async_search_pages(url: str, query: Dict[str, Any], count: int) -> Optional[List[Dict[str, Any]]]:
+    pages = await aio.fetch_pages(
+        lambda page: async_get_response(url, "POST", json={**query, "p": page}),
+        count,
+        stop=lambda data: not data.get("torrents"),
+        page_count=lambda data: data.get("page_count"),
+    )
+    return _search_rows(pages)
+
+
+def _search_rows(pages: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    rows = []
+    for data in pages:
+        if "torrents" not in data:
+            print_warning("No torrents in response data, please re-run")
+            return None
+        rows.extend(data["torrents"])
+    return rows
+
+
+def parse_torrents(torrents: List[Dict[str, Any]]) -> List[Episode]:
+    ret = []
+    episodes = parse_episodes([bangumi["title"] for bangumi in torrents])
+    for bangumi, episode in zip(torrents, episodes):
+        ret.append(
+            Episode.trusted(
+                download=TORRENT_URL + bangumi["_id"] + "/download.torrent",
+                subtitle_group=bangumi["team_id"],
+                title=bangumi["title"],
+                episode=episode,
+                time=parse_time(bangumi["publish_time"]),
+            )
+        )
+
+    return ret
+
+
+def process_search_result(keyword, rows) -> list:
+    result = []
+    episodes = parse_episodes([info["title"] for info in rows])
+    for info, episode in zip(rows, episodes):
+        result.append(
+            Episode.trusted(
+                download=TORRENT_URL + info["_id"] + "/download.torrent",
+                name=keyword,
+                subtitle_group=info["team_id"],
+                title=info["title"],
+                episode=episode,
+                time=parse_time(info["publish_time"]),
+            )
+        )
+
+    # Avoid bangumi collection.
+    # It's ok but it will waste your traffic and bandwidth.
+    result = result[::-1]
+
+    return result
+
+
+def _episode_query(bangumi_id: str, page: int) -> Dict[str, Any]:
+    return {"tag_id": [bangumi_id, BANGUMI_TAG], "p": page}
+
+
+def _is_old(page: Optional[List[Episode]], since: Optional[int]) -> bool:
+    return page is not None and since is not None and all(e.time < since for e in page)
+
+
+def _tag_query(name: str) -> Dict[str, Any]:
+    return {"name": name, "keywords": True, "multi": False}
+
+
+def _matched_tag(data, query: str) -> Tuple[str, str]:
+    """id and name of tag matched by ``query``"""
+    if not data["success"] or not data["found"]:
+        raise ValueError("Search tag failed, keyword: " + query)
+    tag: dict = data["tag"]
+
+    tag_id = tag["_id"]
+    name = tag["name"]
+
+    return (tag_id, name)
+
+
+def _print_matched(anime: Tuple[str, str], subtitle: Optional[Tuple[str, str]]) -> List[str]:
+    """print matched tags, return tag ids to search"""
+    anime_id, anime_name = anime
+    print_info(f"Matched anime: {anime_name} ({anime_id})")
+
+    tag_id = [anime_id, BANGUMI_TAG]
+    if subtitle is not None:
+        subtitle_id, subtitle_name = subtitle
+        print_info(f"Matched subtitle: {subtitle_name} ({subtitle_id})")
+        tag_id.append(subtitle_id)
+    return tag_id
+
+
 class BangumiMoe(BaseWebsite):
     def fetch_episode_of_bangumi(
         self,
         bangumi_id: str,
         max_page: int,
         subtitle_list: Optional[List[str]] = None,
+        since: Optional[int] = None,
     ) -> List[Episode]:
-        response_data = []
         ret = []
         if subtitle_list:
-            for subtitle_id in subtitle_list:
-                data: Dict[str, Any] = {"tag_id": [bangumi_id, subtitle_id, BANGUMI_TAG]}
-                response = get_response(DETAIL_URL, "POST", json=data)
-                response_data.extend(response["torrents"])
+            responses = fetch_all(
+                lambda subtitle_id: get_response(
+                    DETAIL_URL, "POST", json={"tag_id": [bangumi_id, subtitle_id, BANGUMI_TAG]}
+                ),
+                subtitle_list,
+            )
+            for response in responses:
+                ret.extend(parse_torrents(response["torrents"]))
         else:
-            for i in range(max_page):
+
+            def fetch_page(page: int) -> Optional[List[Episode]]:
                 if max_page > 1:
-                    print_info(f"Fetch page {i + 1} ...")
-                data = {
-                    "tag_id": [bangumi_id, BANGUMI_TAG],
-                    "p": i + 1,
-                }
-                response = get_response(DETAIL_URL, "POST", json=data)
-                if response:
-                    response_data.extend(response["torrents"])
-        for index, bangumi in enumerate(response_data):
-            ret.append(
-                Episode(
-                    download=TORRENT_URL + bangumi["_id"] + "/download.torrent",
-                    subtitle_group=bangumi["team_id"],
-                    title=bangumi["title"],
-                    episode=self.parse_episode(bangumi["title"]),
-                    time=int(
-                        datetime.datetime.strptime(
-                            bangumi["publish_time"].split(".")[0], "%Y-%m-%dT%H:%M:%S"
-                        ).timestamp()
-                    ),
-                )
-            )
+                    print_info(f"Fetch page {page} ...")
+                response = get_response(DETAIL_URL, "POST", json=_episode_query(bangumi_id, page))
+                if not response:
+                    return None
+                return parse_torrents(response["torrents"])
+
+            for page in fetch_pages(fetch_page, max_page, stop=lambda page: _is_old(page, since)):
+                if page is not None:
+                    ret.extend(page)
 
-            if os.environ.get("DEBUG"):
-                print(ret[index].download)
+        if os.environ.get("DEBUG"):
+            for episode in ret:
+                print(episode.download)
 
         return ret
 
@@ -155,91 +293,100 @@ class BangumiMoe(BaseWebsite):
         bangumi_result = parser_bangumi(response)
         return [WebsiteBangumi(**x) for x in bangumi_result]
 
-    def process_search_result(self, keyword, rows) -> list:
-        result = []
-        for info in rows:
-            result.append(
-                Episode(
-                    download=TORRENT_URL + info["_id"] + "/download.torrent",
-                    name=keyword,
-                    subtitle_group=info["team_id"],
-                    title=info["title"],
-                    episode=self.parse_episode(info["title"]),
-                    time=int(
-                        time.mktime(
-                            datetime.datetime.strptime(
-                                info["publish_time"].split(".")[0], "%Y-%m-%dT%H:%M:%S"
-                            ).timetuple()
-                        )
-                    ),
-                )
-            )
-
-        # Avoid bangumi collection.
-        # It's ok but it will waste your traffic and bandwidth.
-        result = result[::-1]
-
-        return result
-
     def search_by_tag(self, tag: str, subtitle: Optional[str] = None, count: Optional[int] = None) -> List[Episode]:
         def query_tag(query: str) -> Tuple[str, str]:
-            data = get_response(SEARCH_TAG_URL, "POST", json={"name": query, "keywords": True, "multi": False})
+            return _matched_tag(get_response(SEARCH_TAG_URL, "POST", json=_tag_query(query)), query)
 
-            if not data["success"] or not data["found"]:
-                raise ValueError("Search tag failed, keyword: " + query)
-            tag: dict = data["tag"]
+        if not count:
+            count = 3
 
-            tag_id = tag["_id"]
-            name = tag["name"]
+        anime = query_tag(tag)
+        tag_id = _print_matched(anime, query_tag(subtitle) if subtitle else None)
 
-            return (tag_id, name)
+        rows = search_pages(DETAIL_URL, {"tag_id": tag_id}, count)
+        if rows is None:
+            return []
 
+        return process_search_result(anime[1], rows)
+
+    def search_by_keyword(self, keyword: str, count: Optional[int] = None) -> list:
         if not count:
             count = 3
 
-        anime_id, anime_name = query_tag(tag)
+        rows = search_pages(SEARCH_URL, {"query": keyword}, count)
+        if rows is None:
+            return []
 
-        print_info(f"Matched anime: {anime_name} ({anime_id})")
+        result = process_search_result(keyword, rows)
+        return result
 
-        subtitle_id = None
-        if subtitle:
-            subtitle_id, subtitle_name = query_tag(subtitle)
 
-            print_info(f"Matched subtitle: {subtitle_name} ({subtitle_id})")
+class AsyncBangumiMoe(AsyncWebsite):
+    async def fetch_episode_of_bangumi(
+        self,
+        bangumi_id: str,
+        max_page: int,
+        subtitle_list: Optional[List[str]] = None,
+        since: Optional[int] = None,
+    ) -> List[Episode]:
+        ret = []
+        if subtitle_list:
+            responses = await aio.fetch_all(
+                lambda subtitle_id: async_get_response(
+                    DETAIL_URL, "POST", json={"tag_id": [bangumi_id, subtitle_id, BANGUMI_TAG]}
+                ),
+                subtitle_list,
+            )
+            for response in responses:
+                ret.extend(parse_torrents(response["torrents"]))
+        else:
 
-        tag_id = [anime_id, BANGUMI_TAG]
-        if subtitle_id:
-            tag_id.append(subtitle_id)
+            async def fetch_page(page: int) -> Optional[List[Episode]]:
+                response = await async_get_response(DETAIL_URL, "POST", json=_episode_query(bangumi_id, page))
+                if not response:
+                    return None
+                return parse_torrents(response["torrents"])
 
-        rows = []
+            for page in await aio.fetch_pages(fetch_page, max_page, stop=lambda page: _is_old(page, since)):
+                if page is not None:
+                    ret.extend(page)
 
-        for i in range(count):
-            data = get_response(DETAIL_URL, "POST", json={"tag_id": tag_id, "p": i + 1})
-            if "torrents" not in data:
-                print_warning("No torrents in response data, please re-run")
-                return []
-            rows.extend(data["torrents"])
+        return ret
 
-            if "page_count" in data:
-                page_count = data["page_count"]
-                if page_count - 1 == i:
-                    break
+    async def fetch_bangumi_calendar(self) -> List[WebsiteBangumi]:
+        response = await async_get_response(FETCH_URL)
+        if not response:
+            return []
+        bangumi_result = await async_parser_bangumi(response)
+        return [WebsiteBangumi(**x) for x in bangumi_result]
 
-        result = self.process_search_result(anime_name, rows)
-        return result
+    async def search_by_tag(
+        self, tag: str, subtitle: Optional[str] = None, count: Optional[int] = None
+    ) -> List[Episode]:
+        async def query_tag(query: str) -> Tuple[str, str]:
+            return _matched_tag(await async_get_response(SEARCH_TAG_URL, "POST", json=_tag_query(query)), query)
 
-    def search_by_keyword(self, keyword: str, count: Optional[int] = None) -> list:
         if not count:
             count = 3
 
-        rows = []
+        if subtitle:
+            anime, matched_subtitle = await asyncio.gather(query_tag(tag), query_tag(subtitle))
+        else:
+            anime, matched_subtitle = await query_tag(tag), None
+        tag_id = _print_matched(anime, matched_subtitle)
 
-        for i in range(count):
-            data = get_response(SEARCH_URL, "POST", json={"query": keyword, "p": i + 1})
-            if "torrents" not in data:
-                print_warning("No torrents in response data, please re-run")
-                return []
-            rows.extend(data["torrents"])
+        rows = await async_search_pages(DETAIL_URL, {"tag_id": tag_id}, count)
+        if rows is None:
+            return []
 
-        result = self.process_search_result(keyword, rows)
-        return result
+        return process_search_result(anime[1], rows)
+
+    async def search_by_keyword(self, keyword: str, count: Optional[int] = None) -> list:
+        if not count:
+            count = 3
+
+        rows = await async_search_pages(SEARCH_URL, {"query": keyword}, count)
+        if rows is None:
+            return []
+
+        return process_search_result(keyword, rows)
@@ -1,18 +1,155 @@
+import contextvars
+import copy
+import functools
+import hashlib
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from itertools import chain
-from typing import Any, Dict, List, Optional, Tuple, TypeVar
+from typing import Any, Callable, Deque, Dict, Hashable, Iterable, List, Optional, Tuple, TypeVar
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+from loguru import logger
 
 from bgmi.config import cfg
 from bgmi.lib.models import STATUS_FOLLOWED, STATUS_UPDATED, STATUS_UPDATING, Bangumi, Filter, Subtitle
-from bgmi.utils import parse_episode
+from bgmi.session.singleflight import SingleFlight
+from bgmi.utils import parse_episode, parse_episodes
 from bgmi.website.model import Episode, WebsiteBangumi
 
 T = TypeVar("T", bound=dict)
+_A = TypeVar("_A")
+_R = TypeVar("_R")
+
+
+def old_row_cutoff() -> int:
+    """rows published before this timestamp are ignored when updating"""
+    return int(time.time()) - 3600 * 24 * 30 * 3  # three month
+
+
+def episodes_fingerprint(episodes: List[Episode]) -> str:
+    """publish time of newest episode and hash of all episodes in a result page"""
+    h = hashlib.sha1()
+    for episode in episodes:
+        h.update(episode.title.encode("utf-8"))
+        h.update(episode.download.encode("utf-8"))
+    newest = max((episode.time for episode in episodes), default=0)
+    return f"{newest}-{h.hexdigest()}"
+
+
+@functools.lru_cache
+def _html_parser(name: str) -> str:
+    if name:
+        if builder_registry.lookup(name) is not None:
+            return name
+        logger.warning("html parser {} is not available, fallback to default parser", name)
+
+    # lxml is several times faster than python builtin parser
+    if builder_registry.lookup("lxml") is not None:
+        return "lxml"
+    return "html.parser"
+
+
+def make_soup(markup: Any) -> BeautifulSoup:
+    """
+    parse html with ``cfg.html_parser``, or lxml if installed.
+    Parsing is the main cost of scraping, a document should be parsed only once.
+    """
+    return BeautifulSoup(markup, _html_parser(cfg.html_parser))
+
+
+@functools.lru_cache(maxsize=None)
+def _fan_out_executor() -> ThreadPoolExecutor:
+    # shared by all subscriptions updated at the same time,
+    # requests are still limited by ``Session.host_slot`` for each host
+    return ThreadPoolExecutor(
+        max_workers=max(1, cfg.update_workers) * max(1, cfg.max_connections_per_host),
+        thread_name_prefix="bgmi-fetch",
+    )
+
+
+def fetch_all(func: Callable[[_A], _R], args: Iterable[_A]) -> List[_R]:
+    """
+    call ``func`` with each of ``args`` concurrently, results are in the order of ``args``.
+    Exception of the first failed call is raised.
+    """
+    args = list(args)
+    if len(args) <= 1:
+        return [func(arg) for arg in args]
+    executor = _fan_out_executor()
+    futures = [executor.submit(contextvars.copy_context().run, func, arg) for arg in args]
+    return [future.result() for future in futures]
+
+
+def fetch_pages(
+    fetch_page: Callable[[int], _R],
+    max_page: int,
+    stop: Optional[Callable[[_R], bool]] = None,
+    page_count: Optional[Callable[[_R], Optional[int]]] = None,
+) -> List[_R]:
+    """
+    fetch page ``1..max_page``, return results in page order.
+
+    First page is fetched alone, most of the time it's the only page needed.
+    Following pages are fetched with at most ``max_connections_per_host`` in flight,
+    and no more page is requested after ``stop(page)`` returns ``True``,
+    that page is the last one in result.
+
+    :param page_count: get total page count from first page, pages after it are not requested
+    """
+    result: List[_R] = []
+    if max_page < 1:
+        return result
+
+    page = fetch_page(1)
+    result.append(page)
+    if stop is not None and stop(page):
+        return result
+
+    if page_count is not None:
+        total = page_count(page)
+        if total is not None:
+            max_page = min(max_page, total)
+
+    executor = _fan_out_executor()
+    window = max(1, cfg.max_connections_per_host)
+    pending: Deque[Future] = deque()
+    next_page = 2
+    try:
+        while pending or next_page <= max_page:
+            while next_page <= max_page and len(pending) < window:
+                pending.append(executor.submit(contextvars.copy_context().run, fetch_page, next_page))
+                next_page += 1
+
+            page = pending.popleft().result()
+            result.append(page)
+            if stop is not None and stop(page):
+                break
+    finally:
+        for future in pending:
+            future.cancel()
+
+    return result
+
+
+_in_flight = SingleFlight()
+
+
+def single_flight(key: Hashable, func: Callable[[], _R]) -> _R:
+    """
+    call ``func``, or wait for the running call with same ``key`` (like the same search from web api
+    and cli at the same time) and get a deep copy of its result.
+    """
+    result, shared = _in_flight.do(key, func)
+    if shared:
+        return copy.deepcopy(result)
+    return result
 
 
 class BaseWebsite:
     parse_episode = staticmethod(parse_episode)
+    parse_episodes = staticmethod(parse_episodes)
 
     @staticmethod
     def save_bangumi(data: WebsiteBangumi) -> None:
@@ -49,7 +186,19 @@ class BaseWebsite:
                 ).on_conflict_replace()
             ).execute()
 
+    def start_update(self) -> None:
+        """
+        called at the start of each update run, before any subscription is fetched.
+
+        SubClass may reset state trusted during a run (like login) here,
+        process of web server or scheduler runs many updates.
+        """
+
     def fetch(self, group_by_weekday: bool = True) -> Any:
+        """fetch bangumi calendar and save it, concurrent calls of same website share one fetch"""
+        return single_flight((type(self), "fetch", group_by_weekday), lambda: self._fetch(group_by_weekday))
+
+    def _fetch(self, group_by_weekday: bool) -> Any:
         bangumi_result = self.fetch_bangumi_calendar()
         if not bangumi_result:
             print("can't fetch anything from website")
@@ -89,30 +238,84 @@ class BaseWebsite:
         bangumi: Bangumi,
         ignore_old_row: bool = True,
         max_page: int = cfg.max_path,
+        since: Optional[int] = None,
     ) -> Tuple[int, List[Episode]]:
+        """
+        :param since: stop fetching more pages when a page only contains torrents older than it,
+            default to the time before which rows are ignored if ``ignore_old_row``
+        """
         followed_filter_obj, _ = Filter.get_or_create(bangumi_name=bangumi.name)
 
-        info = self.fetch_single_bangumi(
+        if since is None and ignore_old_row:
+            since = old_row_cutoff()
+
+        info, episodes = self.fetch_followed_episodes(
             bangumi.keyword,
             subtitle_list=followed_filter_obj.subtitle_group_split,
             max_page=max_page,
+            since=since,
+            info_known=bool(bangumi.subtitle_group),
         )
         if info is not None:
             self.save_bangumi(info)
-            data = followed_filter_obj.apply_on_episodes(info.episodes)
-        else:
-            data = self.fetch_episode_of_bangumi(
-                bangumi_id=bangumi.keyword,
-                max_page=max_page,
-                subtitle_list=followed_filter_obj.subtitle_group_split,
-            )
-            data = followed_filter_obj.apply_on_episodes(data)
+
+        return self.select_maximum_episode(bangumi, followed_filter_obj, episodes, ignore_old_row=ignore_old_row)
+
+    def fetch_followed_episodes(
+        self,
+        keyword: str,
+        subtitle_list: Optional[List[str]] = None,
+        max_page: int = cfg.max_path,
+        since: Optional[int] = None,
+        info_known: bool = False,
+    ) -> Tuple[Optional[WebsiteBangumi], List[Episode]]:
+        """
+        network part of ``get_maximum_episode``, doesn't touch database
+        so it's safe to be called from worker threads.
+
+        :param keyword: bangumi['keyword']
+        :param subtitle_list: list of subtitle group
+        :param max_page: how many page to crawl
+        :param since: stop crawling when a page only contains torrents published before it
+        :param info_known: bangumi info (with subtitle groups) is already saved in database
+        :return: bangumi info (should be saved by caller) if website returns it, and all episodes
+        """
+        info = self.fetch_single_bangumi(keyword, subtitle_list=subtitle_list, max_page=max_page, info_known=info_known)
+        if info is not None:
+            return info, info.episodes
+
+        return None, self.fetch_episode_of_bangumi(
+            bangumi_id=keyword, max_page=max_page, subtitle_list=subtitle_list, since=since
+        )
+
+    def fetch_fingerprint(self, keyword: str, subtitle_list: Optional[List[str]] = None) -> str:
+        """
+        cheap probe telling if there may be new episodes of a bangumi,
+        result should change when a new torrent is published.
+
+        default implementation fetch only first page of ``fetch_episode_of_bangumi``.
+
+        :param keyword: bangumi['keyword']
+        :param subtitle_list: list of subtitle group
+        """
+        episodes = self.fetch_episode_of_bangumi(bangumi_id=keyword, max_page=1, subtitle_list=subtitle_list)
+        return episodes_fingerprint(episodes)
+
+    @staticmethod
+    def select_maximum_episode(
+        bangumi: Bangumi,
+        followed_filter_obj: Filter,
+        episodes: List[Episode],
+        ignore_old_row: bool = True,
+    ) -> Tuple[int, List[Episode]]:
+        data = followed_filter_obj.apply_on_episodes(episodes)
 
         for episode in data:
             episode.name = bangumi.name
 
         if ignore_old_row:
-            data = [row for row in data if row.time > int(time.time()) - 3600 * 24 * 30 * 3]  # three month
+            cutoff = old_row_cutoff()
+            data = [row for row in data if row.time > cutoff]
 
         if data:
             b = max(data, key=lambda _i: _i.episode)
@@ -173,7 +376,11 @@ class BaseWebsite:
         raise NotImplementedError
 
     def fetch_episode_of_bangumi(
-        self, bangumi_id: str, max_page: int, subtitle_list: Optional[List[str]] = None
+        self,
+        bangumi_id: str,
+        max_page: int,
+        subtitle_list: Optional[List[str]] = None,
+        since: Optional[int] = None,
     ) -> List[Episode]:  # pragma: no cover
         """
         get all episode by bangumi id
@@ -181,6 +388,8 @@ class BaseWebsite:
         :param bangumi_id: bangumi_id
         :param subtitle_list: list of subtitle group
         :param max_page: how many page to crawl
+        :param since: timestamp, website with pagination should stop crawling
+            as soon as a page only contains torrents published before it
         :return: list of bangumi
         """
         raise NotImplementedError
@@ -190,6 +399,7 @@ class BaseWebsite:
         bangumi_id: str,
         subtitle_list: Optional[List[str]] = None,
         max_page: int = cfg.max_path,
+        info_known: bool = False,
     ) -> Optional[WebsiteBangumi]:
         """
         fetch bangumi info when updating, return ``None``
@@ -200,5 +410,6 @@ class BaseWebsite:
         :param bangumi_id: bangumi_id, bangumi['keyword']
         :param subtitle_list: list of subtitle group
         :param max_page: how many page to crawl
+        :param info_known: bangumi info is already saved, website may skip fetching it again
         """
         return None
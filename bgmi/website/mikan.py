@@ -1,19 +1,25 @@
-import datetime
+import asyncio
+import io
 import os
+import threading
 import time
-from collections import defaultdict
-from typing import List, Optional
+from http.cookiejar import Cookie
+from typing import List, Optional, Tuple
 from xml.etree import ElementTree
 
 import bs4
 import yarl
-from bs4 import BeautifulSoup
 from strsimpy.normalized_levenshtein import NormalizedLevenshtein
 
 from bgmi.config import cfg
 from bgmi.session import session as requests
-from bgmi.utils import parse_episode, print_info
-from bgmi.website.base import BaseWebsite
+from bgmi.session.aio import async_session
+from bgmi.session.singleflight import SingleFlight
+from bgmi.utils import parse_episodes as parse_episode_titles
+from bgmi.utils import parse_time, print_info
+from bgmi.website import aio
+from bgmi.website.aio import AsyncWebsite
+from bgmi.website.base import BaseWebsite, episodes_fingerprint, fetch_all, make_soup
 from bgmi.website.model import Episode, SubtitleGroup, WebsiteBangumi
 
 server_root = f"{cfg.mikan_url.rstrip('/')}/"
@@ -24,6 +30,9 @@ _COVER_URL = server_root[:-1]
 # Example: /Home/ExpandEpisodeTable?bangumiId=2242&subtitleGroupId=34&take=65
 bangumi_episode_expand_api = f"{server_root}Home/ExpandEpisodeTable"
 
+# Example: /RSS/Bangumi?bangumiId=2242&subgroupid=34
+bangumi_rss_url = f"{server_root}RSS/Bangumi"
+
 _CN_WEEK = {
     "星期日": "Sun",
     "星期一": "Mon",
@@ -51,8 +60,12 @@ def get_weekly_bangumi():
     """
     network
     """
-    r = get_text(server_root)
-    soup = bs4.BeautifulSoup(r, "html.parser")
+    return parse_weekly_bangumi(get_text(server_root))
+
+
+def parse_weekly_bangumi(content):
+    """update time and container of bangumi for each day in home page"""
+    soup = make_soup(content)
     for day_of_week in [x for x in range(0, 9) if x != 7]:
         d = soup.find("div", attrs={"class": "sk-bangumi", "data-dayofweek": str(day_of_week)})
         if d:
@@ -62,9 +75,54 @@ def get_weekly_bangumi():
                 pass
 
 
+def _as_soup(content) -> bs4.BeautifulSoup:
+    if isinstance(content, bs4.BeautifulSoup):
+        return content
+    return make_soup(content)
+
+
 def parse_episodes(content, bangumi_id, subtitle_list=None) -> List[Episode]:
-    result = []
-    soup = BeautifulSoup(content, "html.parser")
+    """
+    :param content: html of bangumi page, or the ``BeautifulSoup`` of it which is shared with other extractors
+    """
+    tables, expand_ids = _episode_tables(content, subtitle_list)
+    expanded = dict(zip(expand_ids, fetch_all(lambda subtitle_id: get_expanded(bangumi_id, subtitle_id), expand_ids)))
+    return _parse_episode_tables(tables, expanded)
+
+
+async def async_parse_episodes(content, bangumi_id, subtitle_list=None) -> List[Episode]:
+    tables, expand_ids = _episode_tables(content, subtitle_list)
+    expanded = dict(
+        zip(
+            expand_ids,
+            await aio.fetch_all(lambda subtitle_id: async_get_expanded(bangumi_id, subtitle_id), expand_ids),
+        )
+    )
+    return _parse_episode_tables(tables, expanded)
+
+
+def _expand_params(bangumi_id, subtitle_id):
+    return {"bangumiId": bangumi_id, "subtitleGroupId": subtitle_id, "take": 200}
+
+
+def get_expanded(bangumi_id, subtitle_id):
+    """all episodes of a subtitle group, bangumi page only contains latest ones of it"""
+    return make_soup(
+        requests.get(bangumi_episode_expand_api, params=_expand_params(bangumi_id, subtitle_id)).text
+    ).find("table")
+
+
+async def async_get_expanded(bangumi_id, subtitle_id):
+    r = await async_session().get(bangumi_episode_expand_api, params=_expand_params(bangumi_id, subtitle_id))
+    return make_soup(r.text).find("table")
+
+
+def _episode_tables(content, subtitle_list=None) -> Tuple[dict, List[str]]:
+    """
+    episode table of each subtitle group in bangumi page,
+    and subtitle groups with more episodes to be fetched by ``get_expanded``
+    """
+    soup = _as_soup(content)
     container = soup.find("div", class_="central-container")  # type:bs4.Tag
     episode_container_list = {}
     expand_subtitle_map = {}
@@ -84,36 +142,102 @@ def parse_episodes(content, bangumi_id, subtitle_list=None) -> List[Episode]:
             if subtitle_id:
                 episode_container_list[tag.attrs.get("id", None)] = tag.find_next_sibling("table")
 
+    expand_ids = [subtitle_id for subtitle_id in episode_container_list if subtitle_id in expand_subtitle_map]
+    return episode_container_list, expand_ids
+
+
+def _parse_episode_tables(episode_container_list, expanded) -> List[Episode]:
+    result = []
     for subtitle_id, container in episode_container_list.items():
-        _container = container
-        if subtitle_id in expand_subtitle_map:
-            expand_r = requests.get(
-                bangumi_episode_expand_api,
-                params={
-                    "bangumiId": bangumi_id,
-                    "subtitleGroupId": subtitle_id,
-                    "take": 200,
-                },
-            ).text
-            expand_soup = BeautifulSoup(expand_r, "html.parser")
-            _container = expand_soup.find("table")
-
-        for tr in _container.find_all("tr")[1:]:
-            title = tr.find("a", class_="magnet-link-wrap").text
-            time_string = tr.find_all("td")[2].string
+        _container = expanded.get(subtitle_id, container)
+
+        tr_list = _container.find_all("tr")[1:]
+        titles = [tr.find("a", class_="magnet-link-wrap").text for tr in tr_list]
+        for tr, title, episode in zip(tr_list, titles, parse_episode_titles(titles)):
+            time_string = tr.find_all("td", limit=3)[2].string
             result.append(
-                Episode(
+                Episode.trusted(
                     download=tr.find("a", class_="magnet-link").attrs["data-clipboard-text"],
                     subtitle_group=str(subtitle_id),
                     title=title,
-                    episode=parse_episode(title),
-                    time=int(time.mktime(time.strptime(time_string, "%Y/%m/%d %H:%M"))),
+                    episode=episode,
+                    time=parse_time(time_string),
                 )
             )
 
     return result
 
 
+def parse_rss_episodes(content: bytes, name: str = "", subtitle_group: Optional[str] = None) -> List[Episode]:
+    """
+    parse episodes from mikan rss feed with a streaming parser,
+    every ``<item>`` is released as soon as it's parsed.
+    """
+    items = []
+    for _, item in ElementTree.iterparse(io.BytesIO(content), events=("end",)):
+        if item.tag != "item":
+            continue
+
+        enclosure_el = item.find("enclosure")
+        link = enclosure_el.attrib.get("url") if enclosure_el is not None else None
+        title = item.findtext("title")
+        pub_date = item.findtext("{*}torrent/{*}pubDate")
+        item.clear()
+
+        if link and title and pub_date:
+            items.append((link, title, pub_date.split(".")[0]))
+
+    result = []
+    episodes = parse_episode_titles([title for _, title, _ in items])
+    for (link, title, pub_date), episode in zip(items, episodes):
+        result.append(
+            Episode.trusted(
+                download=str(yarl.URL(link).with_query({"dn": title})),
+                name=name,
+                title=title,
+                subtitle_group=subtitle_group,
+                episode=episode,
+                time=parse_time(pub_date),
+            )
+        )
+
+    return result
+
+
+def fetch_rss_episodes(bangumi_id, subtitle_list=None) -> List[Episode]:
+    """
+    network
+
+    fetch episodes from rss feed of each subtitle group in ``subtitle_list``,
+    or rss feed of whole bangumi if ``subtitle_list`` is empty.
+    """
+    if not subtitle_list:
+        return parse_rss_episodes(get_content(bangumi_rss_url, params={"bangumiId": bangumi_id}))
+
+    pages = fetch_all(
+        lambda subtitle_id: parse_rss_episodes(
+            get_content(bangumi_rss_url, params={"bangumiId": bangumi_id, "subgroupid": subtitle_id}),
+            subtitle_group=str(subtitle_id),
+        ),
+        subtitle_list,
+    )
+    return [episode for page in pages for episode in page]
+
+
+async def async_fetch_rss_episodes(bangumi_id, subtitle_list=None) -> List[Episode]:
+    if not subtitle_list:
+        return parse_rss_episodes(await async_get_content(bangumi_rss_url, params={"bangumiId": bangumi_id}))
+
+    async def fetch_feed(subtitle_id):
+        return parse_rss_episodes(
+            await async_get_content(bangumi_rss_url, params={"bangumiId": bangumi_id, "subgroupid": subtitle_id}),
+            subtitle_group=str(subtitle_id),
+        )
+
+    pages = await aio.fetch_all(fetch_feed, subtitle_list)
+    return [episode for page in pages for episode in page]
+
+
 def parser_day_bangumi(soup) -> List[WebsiteBangumi]:
     """
 
@@ -134,8 +258,9 @@ def parser_day_bangumi(soup) -> List[WebsiteBangumi]:
 
 
 def mikan_login():
-    r = requests.get(login_url)
-    soup = BeautifulSoup(r.text, "html.parser")
+    # login page may be in http cache, its token is only valid with the antiforgery cookie sent with it
+    r = requests.get(login_url, headers={"Cache-Control": "no-cache"})
+    soup = make_soup(r.text)
     token = soup.find("input", attrs={"name": "__RequestVerificationToken"})["value"]
 
     if os.environ.get("DEBUG", False):  # pragma: no cover
@@ -146,6 +271,7 @@ def mikan_login():
         data={
             "UserName": cfg.mikan_username,
             "Password": cfg.mikan_password,
+            "RememberMe": "true",
             "__RequestVerificationToken": token,
         },
         headers={"Referer": server_root},
@@ -156,6 +282,90 @@ def mikan_login():
         raise ValueError("mikan login failed with wrong username or password")
 
 
+# cookie set by mikan after login
+_AUTH_COOKIE = ".AspNetCore.Identity.Application"
+
+
+def _is_logged_in_page(r) -> bool:
+    # pages other than html can't tell, "退出" is the logout link
+    return not r.headers.get("content-type", "").startswith("text/html") or "退出" in r.text
+
+
+class LoginState:
+    """
+    login state of mikan.
+
+    Session is probed with a page fetched in this run, after that pages are trusted to be fetched
+    with login for ``ttl`` seconds or until auth cookie expires. So each page is downloaded once,
+    and login only happens when there is no valid auth cookie or server rejects it.
+    Callers arriving while session is probed wait for the probe, not for each other.
+    """
+
+    # server may drop a session any time, long running process (web server) probes it again after this
+    ttl = 60 * 60
+
+    def __init__(self) -> None:
+        self.verified_at: Optional[float] = None
+        # expiry of auth cookie when session is verified, ``None`` for session cookie
+        self.expires: Optional[int] = None
+        self._lock = threading.Lock()
+        self._probe = SingleFlight()
+
+    @staticmethod
+    def auth_cookies() -> List[Cookie]:
+        # cookies set by a mirror are also set for ``server_root`` by session
+        host = yarl.URL(server_root).host or ""
+        return [c for c in requests.cookies if c.name.startswith(_AUTH_COOKIE) and host.endswith(c.domain.lstrip("."))]
+
+    def reset(self) -> None:
+        """probe session again with next page, should be called before each run"""
+        with self._lock:
+            self.verified_at = None
+            self.expires = None
+
+    def is_valid(self) -> bool:
+        now = time.time()
+        with self._lock:
+            if self.verified_at is None or now - self.verified_at >= self.ttl:
+                return False
+            return self.expires is None or now < self.expires
+
+    def get_text(self, url, params=None) -> str:
+        if self.is_valid():
+            return requests.get(url, params=params).text
+
+        text, shared = self._probe.do("probe", lambda: self._verify(url, params))
+        if shared:
+            # session is verified with page of another caller
+            return requests.get(url, params=params).text
+        return text
+
+    def _verify(self, url, params) -> str:
+        """fetch page with a verified session, login if needed"""
+        now = int(time.time())
+        if not any(not c.is_expired(now) for c in self.auth_cookies()):
+            mikan_login()
+            r = requests.get(url, params=params, headers={"Cache-Control": "no-cache"})
+        else:
+            # page in http cache may be fetched before session expired
+            r = requests.get(url, params=params, headers={"Cache-Control": "no-cache"})
+            if not _is_logged_in_page(r):
+                # session expired on server
+                mikan_login()
+                r = requests.get(url, params=params, headers={"Cache-Control": "no-cache"})
+
+        if not _is_logged_in_page(r):
+            raise ValueError("mikan login failed")
+
+        with self._lock:
+            self.verified_at = time.time()
+            self.expires = min((c.expires for c in self.auth_cookies() if c.expires), default=None)
+        return r.text
+
+
+login_state = LoginState()
+
+
 def get_text(url, params=None):
     if os.environ.get("DEBUG", False):  # pragma: no cover
         print(url, params)
@@ -163,218 +373,292 @@ def get_text(url, params=None):
     if not cfg.mikan_username or not cfg.mikan_password:
         return requests.get(url, params=params).text
 
-    for _ in range(2):
-        r = requests.get(url, params=params)
-        if r.headers.get("content-type").startswith("text/html"):
-            if "退出" in r.text:
-                return r.text
-            else:
-                mikan_login()
+    return login_state.get_text(url, params=params)
+
+
+def get_content(url, params=None) -> bytes:
+    """rss feeds don't require login, and are parsed from raw bytes"""
+    if os.environ.get("DEBUG", False):  # pragma: no cover
+        print(url, params)
+
+    return requests.get(url, params=params).content
+
+
+async def async_get_text(url, params=None) -> str:
+    if os.environ.get("DEBUG", False):  # pragma: no cover
+        print(url, params)
+
+    if not cfg.mikan_username or not cfg.mikan_password or login_state.is_valid():
+        return (await async_session().get(url, params=params)).text
+
+    # session is probed (and login) at most once in ``LoginState.ttl``, by the blocking session in a thread
+    return await asyncio.get_running_loop().run_in_executor(None, login_state.get_text, url, params)
+
+
+async def async_get_content(url, params=None) -> bytes:
+    if os.environ.get("DEBUG", False):  # pragma: no cover
+        print(url, params)
+
+    return (await async_session().get(url, params=params)).content
+
+
+def parse_bangumi_details_page(r):
+    """
+    :param r: html of bangumi page, or the ``BeautifulSoup`` of it which is shared with other extractors
+    """
+    soup = _as_soup(r)
+
+    # info
+    bangumi_info = {"status": 0}
+    left_container = soup.select_one("div.pull-left.leftbar-container")
+    title = left_container.find("p", class_="bangumi-title")
+    day = title.find_next_sibling("p", class_="bangumi-info")
+    bangumi_info["name"] = title.text
+    bangumi_info["update_time"] = _CN_WEEK[day.text[-3:]]
+
+    # episodes are extracted by `parse_episodes` from the same soup
+    nr = []
+    dv = soup.find("div", class_="leftbar-nav")
+    li_list = dv.ul.find_all("li")
+    for li in li_list:
+        a = li.find("a")
+        subtitle = {
+            "id": a.attrs["data-anchor"][1:],
+            "name": a.text,
+        }
+        nr.append(subtitle)
+
+    bangumi_info["subtitle_group"] = [SubtitleGroup(**x) for x in nr]
+    return bangumi_info
+
+
+def _single_bangumi(info, bangumi_id, episodes) -> WebsiteBangumi:
+    return WebsiteBangumi.trusted(
+        name=info["name"],
+        keyword=bangumi_id,
+        status=info["status"],
+        update_time=info["update_time"],
+        subtitle_group=info["subtitle_group"],
+        episodes=episodes,
+    )
+
+
+def parse_search_anime(content):
+    """name and link of first anime in search result page"""
+    s = make_soup(content)
+    animate = s.find_all("div", attrs={"class": "an-info-group"})[0]
+    animate_name = animate.text.strip()
+    animate_link = animate.parent.parent.attrs["href"]
+    animate_id = animate_link.split("/")[-1]
+    print_info(f"Matched animate: {animate_name} ({animate_id})")
+    return animate_name, animate_link.lstrip("/")
+
+
+def parse_subgroup_rss(content, subtitle: Optional[str] = None):
+    """
+    rss url and name of subtitle group best matching ``subtitle`` in bangumi page,
+    or the first one if ``subtitle`` is empty, ``None`` if there is no subtitle group
+    """
+    s = make_soup(content)
+
+    lowest_distance = 1.0
+    best_sim_match_group = None
+
+    normalized_levenshtein = NormalizedLevenshtein()
+
+    subgroup_list = s.find_all("div", attrs={"class": "subgroup-text"})
+    for subgroup in subgroup_list:
+        subgroup_names = []
+        subgroup_links = []
+        sub_info = {}
+
+        for href_ele in subgroup.find_all("a", href=True):
+            link = href_ele["href"]
+
+            subgroup_link_prefix = "/Home/PublishGroup/"
+            rss_link_prefix = "/RSS/Bangumi"
+            if link:
+                if link.startswith(subgroup_link_prefix):
+                    subgroup_names.append(href_ele.text)
+                    subgroup_links.append(link[len(subgroup_link_prefix) :])
+
+                if link.startswith(rss_link_prefix):
+                    req: str = link[len(rss_link_prefix) + 1 :]
+                    for r in req.split("&"):
+                        key, val = r.split("=", maxsplit=1)
+                        sub_info[key] = val
+        if not subgroup_names:
+            continue
+
+        if subtitle:
+            cmp_text = " ".join(subgroup_names)
+            sim_distance = normalized_levenshtein.distance(cmp_text, subtitle)
+            if sim_distance < lowest_distance:
+                lowest_distance = sim_distance
+                best_sim_match_group = (subgroup, subgroup_names, subgroup_links, sub_info)
         else:
-            return r.text
+            best_sim_match_group = (subgroup, subgroup_names, subgroup_links, sub_info)
+            break
+
+    if not best_sim_match_group:
+        return None
+    subgroup, subgroup_names, subgroup_links, sub_info = best_sim_match_group
+    bangumiId, subgroupid = sub_info["bangumiId"], sub_info["subgroupid"]
+    rss_url = f"{server_root}RSS/Bangumi?bangumiId={bangumiId}&subgroupid={subgroupid}"
+
+    subtitle_group = " ".join(subgroup_names)
+    if subtitle:
+        print_info(f"Matched subtitle: {subtitle_group} ({subgroupid})")
+    else:
+        print_info(f"Use first subtitle: {subtitle_group} ({subgroupid})")
 
-    raise ValueError("mikan login failed")
+    return rss_url, subtitle_group
+
+
+def parse_search_result(content, keyword) -> List[Episode]:
+    result = []
+    s = make_soup(content)
+    td_list = s.find_all("tr", attrs={"class": "js-search-results-row"})
+    titles = [tr.find("a", class_="magnet-link-wrap").text for tr in td_list]
+    for tr, title, episode in zip(td_list, titles, parse_episode_titles(titles)):
+        time_string = tr.find_all("td")[2].string
+        u = yarl.URL(tr.find("a", class_="magnet-link").attrs.get("data-clipboard-text", ""))
+        result.append(
+            Episode.trusted(
+                **{
+                    "download": str(u.update_query({"dn": title})),
+                    "name": keyword,
+                    "title": title,
+                    "episode": episode,
+                    "time": parse_time(time_string),
+                }
+            )
+        )
+    return result
+
+
+def _calendar(weekly_bangumi) -> List[WebsiteBangumi]:
+    bangumi_list = []
+    for update_time, day in weekly_bangumi:
+        for obj in parser_day_bangumi(day):
+            obj.update_time = update_time
+            obj.cover = obj.cover.split("?")[0]
+            bangumi_list.append(obj)
+    return bangumi_list
 
 
 class Mikanani(BaseWebsite):
-    def parse_bangumi_details_page(self, r):
-        subtitle_groups = defaultdict(dict)
-
-        soup = BeautifulSoup(r, "html.parser")
-
-        # info
-        bangumi_info = {"status": 0}
-        left_container = soup.select_one("div.pull-left.leftbar-container")
-        title = left_container.find("p", class_="bangumi-title")
-        day = title.find_next_sibling("p", class_="bangumi-info")
-        bangumi_info["name"] = title.text
-        bangumi_info["update_time"] = _CN_WEEK[day.text[-3:]]
-
-        ######
-        soup = BeautifulSoup(r, "html.parser")
-        container = soup.find("div", class_="central-container")
-        episode_container_list = {}
-        for tag in container.contents:
-            if not hasattr(tag, "attrs"):
-                continue
-            subtitle_id = tag.attrs.get("id", False)
-            if subtitle_id:
-                episode_container_list[tag.attrs.get("id")] = tag.find_next_sibling("table")
-
-        for subtitle_id, container in episode_container_list.items():
-            subtitle_groups[str(subtitle_id)]["episode"] = []
-            for tr in container.find_all("tr")[1:]:
-                title = tr.find("a", class_="magnet-link-wrap").text
-                time_string = tr.find_all("td")[2].string
-                subtitle_groups[str(subtitle_id)]["episode"].append(
-                    {
-                        "download": tr.find("a", class_="magnet-link").attrs["data-clipboard-text"],
-                        "subtitle_group": str(subtitle_id),
-                        "title": title,
-                        "episode": self.parse_episode(title),
-                        "time": int(time.mktime(time.strptime(time_string, "%Y/%m/%d %H:%M"))),
-                    }
-                )
+    def start_update(self) -> None:
+        login_state.reset()
 
-        ######
-        nr = []
-        dv = soup.find("div", class_="leftbar-nav")
-        li_list = dv.ul.find_all("li")
-        for li in li_list:
-            a = li.find("a")
-            subtitle = {
-                "id": a.attrs["data-anchor"][1:],
-                "name": a.text,
-            }
-            nr.append(subtitle)
-
-        bangumi_info["subtitle_group"] = [SubtitleGroup(**x) for x in nr]
-        return bangumi_info
+    def parse_bangumi_details_page(self, r):
+        return parse_bangumi_details_page(r)
 
     def search_by_tag(self, tag: str, subtitle: Optional[str] = None, count: Optional[int] = None) -> List[Episode]:
-        r = get_text(server_root + "Home/Search", params={"searchstr": tag})
-        s = BeautifulSoup(r, "html.parser")
-        animate = s.find_all("div", attrs={"class": "an-info-group"})[0]
-        animate_name = animate.text.strip()
-        animate_link = animate.parent.parent.attrs["href"]
-        animate_id = animate_link.split("/")[-1]
-        print_info(f"Matched animate: {animate_name} ({animate_id})")
-        animate_link = animate_link.lstrip("/")
-
-        r = get_text(server_root + animate_link)
-        s = BeautifulSoup(r, "html.parser")
-
-        lowest_distance = 1.0
-        best_sim_match_group = None
-
-        normalized_levenshtein = NormalizedLevenshtein()
-
-        subgroup_list = s.find_all("div", attrs={"class": "subgroup-text"})
-        for subgroup in subgroup_list:
-            subgroup_names = []
-            subgroup_links = []
-            sub_info = {}
-
-            for href_ele in subgroup.find_all("a", href=True):
-                link = href_ele["href"]
-
-                subgroup_link_prefix = "/Home/PublishGroup/"
-                rss_link_prefix = "/RSS/Bangumi"
-                if link:
-                    if link.startswith(subgroup_link_prefix):
-                        subgroup_names.append(href_ele.text)
-                        subgroup_links.append(link[len(subgroup_link_prefix) :])
-
-                    if link.startswith(rss_link_prefix):
-                        req: str = link[len(rss_link_prefix) + 1 :]
-                        for r in req.split("&"):
-                            key, val = r.split("=", maxsplit=1)
-                            sub_info[key] = val
-            if not subgroup_names:
-                continue
-
-            if subtitle:
-                cmp_text = " ".join(subgroup_names)
-                sim_distance = normalized_levenshtein.distance(cmp_text, subtitle)
-                if sim_distance < lowest_distance:
-                    lowest_distance = sim_distance
-                    best_sim_match_group = (subgroup, subgroup_names, subgroup_links, sub_info)
-            else:
-                best_sim_match_group = (subgroup, subgroup_names, subgroup_links, sub_info)
-                break
+        animate_name, animate_link = parse_search_anime(
+            get_text(server_root + "Home/Search", params={"searchstr": tag})
+        )
 
-        if not best_sim_match_group:
+        matched = parse_subgroup_rss(get_text(server_root + animate_link), subtitle)
+        if matched is None:
             return []
-        subgroup, subgroup_names, subgroup_links, sub_info = best_sim_match_group
-        bangumiId, subgroupid = sub_info["bangumiId"], sub_info["subgroupid"]
-        rss_url = f"{server_root}RSS/Bangumi?bangumiId={bangumiId}&subgroupid={subgroupid}"
+        rss_url, subtitle_group = matched
 
-        subtitle_group = " ".join(subgroup_names)
-        if subtitle:
-            print_info(f"Matched subtitle: {subtitle_group} ({subgroupid})")
-        else:
-            print_info(f"Use first subtitle: {subtitle_group} ({subgroupid})")
-
-        r = get_text(rss_url)
-        rss_root = ElementTree.fromstring(r)
-
-        result = []
-        for item in rss_root[0].findall("item"):
-            enclosure_el = item.find("enclosure")
-            link = enclosure_el.attrib.get("url") if enclosure_el is not None else None
-            title_el = item.find("title")
-            title = title_el.text if title_el is not None else None
-
-            xmlns = "{" + server_root + "0.1/}"
-            torrent = item.find(f"{xmlns}torrent")
-            pub_date_el = torrent.find(f"{xmlns}pubDate") if torrent is not None else None
-            pub_date = pub_date_el.text if pub_date_el is not None else None
-
-            if link and title and pub_date:
-                pub_date = pub_date.split(".")[0]
-                pub_date_ts = int(datetime.datetime.strptime(pub_date, "%Y-%m-%dT%H:%M:%S").timestamp())
-
-                result.append(
-                    Episode(
-                        download=str(yarl.URL(link).with_query({"dn": title})),
-                        name=animate_name,
-                        title=title,
-                        subtitle_group=subtitle_group,
-                        episode=self.parse_episode(title),
-                        time=pub_date_ts,
-                    )
-                )
+        result = parse_rss_episodes(get_content(rss_url), name=animate_name, subtitle_group=subtitle_group)
         result = result[::-1]
         return result
 
     def search_by_keyword(self, keyword, count=None):
-        result = []
-        r = get_text(server_root + "Home/Search", params={"searchstr": keyword})
-        s = BeautifulSoup(r, "html.parser")
-        td_list = s.find_all("tr", attrs={"class": "js-search-results-row"})
-        for tr in td_list:
-            title = tr.find("a", class_="magnet-link-wrap").text
-            time_string = tr.find_all("td")[2].string
-            u = yarl.URL(tr.find("a", class_="magnet-link").attrs.get("data-clipboard-text", ""))
-            result.append(
-                Episode(
-                    **{
-                        "download": str(u.update_query({"dn": title})),
-                        "name": keyword,
-                        "title": title,
-                        "episode": self.parse_episode(title),
-                        "time": int(time.mktime(time.strptime(time_string, "%Y/%m/%d %H:%M"))),
-                    }
-                )
-            )
-        return result
+        return parse_search_result(get_text(server_root + "Home/Search", params={"searchstr": keyword}), keyword)
+
+    def fetch_episode_of_bangumi(self, bangumi_id, max_page=cfg.max_path, subtitle_list=None, since=None):
+        if cfg.mikan_fetch_rss:
+            return fetch_rss_episodes(bangumi_id, subtitle_list)
 
-    def fetch_episode_of_bangumi(self, bangumi_id, max_page=cfg.max_path, subtitle_list=None):
         r = get_text(server_root + f"Home/Bangumi/{bangumi_id}")
         return parse_episodes(r, bangumi_id, subtitle_list)
 
+    def fetch_fingerprint(self, keyword: str, subtitle_list: Optional[List[str]] = None) -> str:
+        # rss feed of whole bangumi is much smaller than bangumi page
+        return episodes_fingerprint(fetch_rss_episodes(keyword))
+
     def fetch_bangumi_calendar(self) -> List[WebsiteBangumi]:
-        bangumi_list = []
-        for update_time, day in get_weekly_bangumi():
-            for obj in parser_day_bangumi(day):
-                obj.update_time = update_time
-                obj.cover = obj.cover.split("?")[0]
-                bangumi_list.append(obj)
-        return bangumi_list
+        return _calendar(get_weekly_bangumi())
 
     def fetch_single_bangumi(
         self,
         bangumi_id: str,
         subtitle_list: Optional[List[str]] = None,
         max_page: int = 0,
+        info_known: bool = False,
     ) -> Optional[WebsiteBangumi]:
-        html = get_text(server_root + f"Home/Bangumi/{bangumi_id}")
-        info = self.parse_bangumi_details_page(html)
-        return WebsiteBangumi(
-            name=info["name"],
-            keyword=bangumi_id,
-            status=info["status"],
-            update_time=info["update_time"],
-            subtitle_group=info["subtitle_group"],
-            episodes=parse_episodes(html, bangumi_id, subtitle_list),
+        if cfg.mikan_fetch_rss and info_known:
+            # bangumi info is already known, episodes will be fetched from rss by `fetch_episode_of_bangumi`
+            return None
+
+        soup = make_soup(get_text(server_root + f"Home/Bangumi/{bangumi_id}"))
+        info = parse_bangumi_details_page(soup)
+        if cfg.mikan_fetch_rss:
+            episodes = fetch_rss_episodes(bangumi_id, subtitle_list)
+        else:
+            episodes = parse_episodes(soup, bangumi_id, subtitle_list)
+
+        return _single_bangumi(info, bangumi_id, episodes)
+
+
+class AsyncMikanani(AsyncWebsite):
+    async def search_by_tag(
+        self, tag: str, subtitle: Optional[str] = None, count: Optional[int] = None
+    ) -> List[Episode]:
+        animate_name, animate_link = parse_search_anime(
+            await async_get_text(server_root + "Home/Search", params={"searchstr": tag})
         )
+
+        matched = parse_subgroup_rss(await async_get_text(server_root + animate_link), subtitle)
+        if matched is None:
+            return []
+        rss_url, subtitle_group = matched
+
+        result = parse_rss_episodes(await async_get_content(rss_url), name=animate_name, subtitle_group=subtitle_group)
+        return result[::-1]
+
+    async def search_by_keyword(self, keyword, count=None):
+        return parse_search_result(
+            await async_get_text(server_root + "Home/Search", params={"searchstr": keyword}), keyword
+        )
+
+    async def fetch_episode_of_bangumi(self, bangumi_id, max_page=cfg.max_path, subtitle_list=None, since=None):
+        if cfg.mikan_fetch_rss:
+            return await async_fetch_rss_episodes(bangumi_id, subtitle_list)
+
+        r = await async_get_text(server_root + f"Home/Bangumi/{bangumi_id}")
+        return await async_parse_episodes(r, bangumi_id, subtitle_list)
+
+    async def fetch_fingerprint(self, keyword: str, subtitle_list: Optional[List[str]] = None) -> str:
+        return episodes_fingerprint(await async_fetch_rss_episodes(keyword))
+
+    async def fetch_bangumi_calendar(self) -> List[WebsiteBangumi]:
+        return _calendar(parse_weekly_bangumi(await async_get_text(server_root)))
+
+    async def fetch_single_bangumi(
+        self,
+        bangumi_id: str,
+        subtitle_list: Optional[List[str]] = None,
+        max_page: int = 0,
+        info_known: bool = False,
+    ) -> Optional[WebsiteBangumi]:
+        if cfg.mikan_fetch_rss and info_known:
+            return None
+
+        if cfg.mikan_fetch_rss:
+            # bangumi page and rss feed are fetched at the same time
+            page, episodes = await asyncio.gather(
+                async_get_text(server_root + f"Home/Bangumi/{bangumi_id}"),
+                async_fetch_rss_episodes(bangumi_id, subtitle_list),
+            )
+            soup = make_soup(page)
+        else:
+            soup = make_soup(await async_get_text(server_root + f"Home/Bangumi/{bangumi_id}"))
+            episodes = await async_parse_episodes(soup, bangumi_id, subtitle_list)
+
+        return _single_bangumi(parse_bangumi_details_page(soup), bangumi_id, episodes)
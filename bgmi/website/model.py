@@ -1,10 +1,20 @@
 from operator import attrgetter
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type, TypeVar
 
 from pydantic import BaseModel, validator
 
 from bgmi.lib.constants import BANGUMI_UPDATE_TIME
 
+_M = TypeVar("_M", bound=BaseModel)
+
+
+def _trusted(cls: Type[_M], values: Dict[str, Any]) -> _M:
+    """like ``BaseModel.construct``, without looking up defaults of fields, ``values`` must contain all fields"""
+    m = cls.__new__(cls)
+    object.__setattr__(m, "__dict__", values)
+    object.__setattr__(m, "__fields_set__", set(values))
+    return m
+
 
 class Episode(BaseModel):
     title: str
@@ -14,16 +24,53 @@ class Episode(BaseModel):
     subtitle_group: Optional[str]
     name: str = ""
 
+    @classmethod
+    def trusted(
+        cls,
+        title: str,
+        download: str,
+        episode: int = 0,
+        time: int = 0,
+        subtitle_group: Optional[str] = None,
+        name: str = "",
+    ) -> "Episode":
+        """
+        construct episode from output of data source parsers without validation,
+        caller is responsible for passing values of correct type.
+        """
+        return _trusted(
+            cls,
+            {
+                "title": title,
+                "download": download,
+                "episode": episode,
+                "time": time,
+                "subtitle_group": subtitle_group,
+                "name": name,
+            },
+        )
+
     @staticmethod
-    def remove_duplicated_bangumi(result: List["Episode"]) -> List["Episode"]:
-        ret = []
-        episodes = list({i.episode for i in result})
+    def remove_duplicated_bangumi(
+        result: List["Episode"], key: Optional[Callable[["Episode"], Any]] = None
+    ) -> List["Episode"]:
+        """
+        keep one release of each episode, in the order their episode first appears.
+
+        :param key: rank of a release, the release with largest key is kept,
+            keep first release of each episode if it's ``None``
+        """
+        kept: Dict[int, Tuple[Any, Episode]] = {}
         for i in result:
-            if i.episode in episodes:
-                ret.append(i)
-                del episodes[episodes.index(i.episode)]
+            previous = kept.get(i.episode)
+            if previous is None:
+                kept[i.episode] = (key(i) if key else None, i)
+            elif key:
+                rank = key(i)
+                if rank > previous[0]:
+                    kept[i.episode] = (rank, i)
 
-        return ret
+        return [i for _, i in kept.values()]
 
     def contains_any_words(self, keywords: List[str]) -> bool:
         """Keywords should be converted to low case after passed to this function."""
@@ -45,6 +92,34 @@ class WebsiteBangumi(BaseModel):
     cover: str = ""
     episodes: List[Episode] = []
 
+    @classmethod
+    def trusted(
+        cls,
+        keyword: str,
+        update_time: str = "Unknown",
+        name: str = "",
+        status: int = 0,
+        subtitle_group: Optional[List[SubtitleGroup]] = None,
+        cover: str = "",
+        episodes: Optional[List[Episode]] = None,
+    ) -> "WebsiteBangumi":
+        """
+        construct without validation, episodes are not copied like ``WebsiteBangumi(episodes=...)`` does.
+        caller is responsible for passing values of correct type.
+        """
+        return _trusted(
+            cls,
+            {
+                "keyword": keyword,
+                "update_time": update_time,
+                "name": name,
+                "status": status,
+                "subtitle_group": subtitle_group if subtitle_group is not None else [],
+                "cover": cover,
+                "episodes": episodes if episodes is not None else [],
+            },
+        )
+
     @property
     def max_episode(self) -> int:
         return max(self.episodes, key=attrgetter("episode")).episode
@@ -1,17 +1,18 @@
 import os
 import re
-import time
 import urllib.parse
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 import requests
-from bs4 import BeautifulSoup
 from loguru import logger
 
 from bgmi.config import cfg
 from bgmi.session import session
-from bgmi.utils import print_error
-from bgmi.website.base import BaseWebsite
+from bgmi.session.aio import async_session
+from bgmi.utils import parse_episodes, parse_time, print_error
+from bgmi.website import aio
+from bgmi.website.aio import AsyncWebsite
+from bgmi.website.base import BaseWebsite, fetch_pages, make_soup
 from bgmi.website.model import Episode, SubtitleGroup, WebsiteBangumi
 
 base_url = cfg.share_dmhy_url
@@ -20,59 +21,123 @@ base_url = cfg.share_dmhy_url
 def fetch_url(url, **kwargs):
     ret = None
     try:
-        ret = session.get(url, timeout=60, **kwargs).text
+        ret = session.get(url, **kwargs).text
     except requests.ConnectionError:
-        logger.error("Create connection to {}... failed", base_url)
-        print_error("Check internet connection or try to set a DMHY mirror site with share_dmhy_url in config")
+        _connection_failed()
 
     return ret
 
 
-def parse_bangumi_with_week_days(content, update_time, array_name) -> List[WebsiteBangumi]:
-    content = re.sub("'\\+encodeURIComponent\\('(.*?)'\\)\\+'", "\\1", content)
-    content = re.sub("encodeURIComponent\\('(.*?)'\\)", "'URLE#\\1'", content)
-    r = re.compile(array_name + "\\.push\\(\\['(.*?)','(.*?)','(.*?)','(.*?)','(.*?)'\\]\\)")
-    ret = r.findall(content)
+async def async_fetch_url(url, **kwargs):
+    ret = None
+    try:
+        ret = (await async_session().get(url, **kwargs)).text
+    except requests.ConnectionError:
+        _connection_failed()
 
-    bangumi_list = []
+    return ret
 
-    for bangumi_row in ret:
-        (cover_url, name, keyword, subtitle_raw, _) = bangumi_row
-        if keyword.startswith("URLE#"):
-            keyword = urllib.parse.quote(keyword[5:])
-        bangumi = WebsiteBangumi(keyword=keyword)
-        cover = re.findall("(/images/.*)$", cover_url)[0]
 
-        bs = BeautifulSoup(subtitle_raw, "html.parser")
-        a_list = bs.find_all("a")
+def _connection_failed() -> None:
+    logger.error("Create connection to {}... failed", base_url)
+    print_error(
+        "Check internet connection or try to set a DMHY mirror site with share_dmhy_url"
+        " or network.dmhy.mirrors in config"
+    )
 
-        for a in a_list:
-            subtitle_group_name = a.get_text(strip=True)
-            subtitle_group_id_raw = re.findall("team_id%3A(.+)$", a["href"])
 
-            if (len(subtitle_group_id_raw) == 0) or subtitle_group_name == "":
-                continue
+# array name of each weekday in programme page
+_WEEK_DAY_ARRAYS = {
+    "sunarray": "Sun",
+    "monarray": "Mon",
+    "tuearray": "Tue",
+    "wedarray": "Wed",
+    "thuarray": "Thu",
+    "friarray": "Fri",
+    "satarray": "Sat",
+}
+_ENCODE_URI_COMPONENT = re.compile("'\\+encodeURIComponent\\('(.*?)'\\)\\+'|encodeURIComponent\\('(.*?)'\\)")
+_ARRAY_PUSH = re.compile(
+    "((?:sun|mon|tue|wed|thu|fri|sat)array)\\.push\\(\\['(.*?)','(.*?)','(.*?)','(.*?)','(.*?)'\\]\\)"
+)
+
+
+def _replace_encode_uri_component(m: "re.Match[str]") -> str:
+    # `'+encodeURIComponent('...')+'` is a part of string, other calls are marked to be quoted later
+    if m.group(1) is not None:
+        return m.group(1)
+    return "'URLE#" + m.group(2) + "'"
+
+
+def _parse_subtitle_groups(tag) -> List[SubtitleGroup]:
+    groups = []
+    for a in tag.find_all("a"):
+        subtitle_group_name = a.get_text(strip=True)
+        subtitle_group_id_raw = re.findall("team_id%3A(.+)$", a["href"])
+
+        if (len(subtitle_group_id_raw) == 0) or subtitle_group_name == "":
+            continue
+
+        groups.append(SubtitleGroup(id=subtitle_group_id_raw[0], name=subtitle_group_name))
+    return groups
 
-            subtitle_group_id = subtitle_group_id_raw[0]
 
-            bangumi.subtitle_group.append(SubtitleGroup(id=subtitle_group_id, name=subtitle_group_name))
+def _parse_subtitle_fragments(fragments: List[str]) -> Dict[str, List[SubtitleGroup]]:
+    """
+    parse subtitle groups html of all bangumi as a single document,
+    creating a soup for each of them is the main cost of parsing programme page.
+    """
+    soup = make_soup("".join(f"<bgmi-fragment>{f}</bgmi-fragment>" for f in fragments))
+    containers = soup.find_all("bgmi-fragment")
+    if len(containers) == len(fragments) and not any(c.find("bgmi-fragment") for c in containers):
+        return {f: _parse_subtitle_groups(c) for f, c in zip(fragments, containers)}
 
-        name = re.sub(r"\\'", "'", name)
-        bangumi.name = name
-        bangumi.update_time = update_time
-        bangumi.keyword = keyword
-        bangumi.cover = base_url + cover
+    # broken html leaks into next fragment, parse them one by one
+    return {f: _parse_subtitle_groups(make_soup(f)) for f in fragments}
 
-        # append to bangumi_list
-        bangumi_list.append(bangumi)
 
-    return bangumi_list
+def parse_bangumi_calendar(content, arrays=None) -> List[WebsiteBangumi]:
+    """
+    parse bangumi of all weekdays from programme page in a single scan,
+    bangumi are ordered by weekday like ``_WEEK_DAY_ARRAYS``.
+
+    :param arrays: mapping of array name to update time, default to all weekdays
+    """
+    if arrays is None:
+        arrays = _WEEK_DAY_ARRAYS
+
+    content = _ENCODE_URI_COMPONENT.sub(_replace_encode_uri_component, content)
+    rows = [m.groups() for m in _ARRAY_PUSH.finditer(content) if m.group(1) in arrays]
+    # same subtitle groups html may be shared by many bangumi
+    subtitle_groups = _parse_subtitle_fragments(list(dict.fromkeys(row[4] for row in rows)))
+
+    weekly: Dict[str, List[WebsiteBangumi]] = {array_name: [] for array_name in arrays}
+    for array_name, cover_url, name, keyword, subtitle_raw, _ in rows:
+        if keyword.startswith("URLE#"):
+            keyword = urllib.parse.quote(keyword[5:])
+        cover = re.findall("(/images/.*)$", cover_url)[0]
+
+        weekly[array_name].append(
+            WebsiteBangumi(
+                keyword=keyword,
+                name=re.sub(r"\\'", "'", name),
+                update_time=arrays[array_name],
+                cover=base_url + cover,
+                subtitle_group=subtitle_groups[subtitle_raw],
+            )
+        )
+
+    return [bangumi for bangumi_list in weekly.values() for bangumi in bangumi_list]
+
+
+def parse_bangumi_with_week_days(content, update_time, array_name) -> List[WebsiteBangumi]:
+    return parse_bangumi_calendar(content, {array_name: update_time})
 
 
 def parse_subtitle_list(content):
     subtitle_list = []
 
-    bs = BeautifulSoup(content, "html.parser")
+    bs = make_soup(content)
     li_list = bs.find_all("li", {"class": "team-item"})
 
     for li in li_list:
@@ -89,6 +154,16 @@ def parse_subtitle_list(content):
     return subtitle_list
 
 
+def parse_topic_rows(table):
+    """cells of rows in topic list table, only anime (``sort-2``) rows are returned"""
+    td_lists = []
+    for tr in table.tbody.find_all("tr", {"class": ""}):
+        td_list = tr.find_all("td")
+        if td_list[1].a["class"][0] == "sort-2":
+            td_lists.append(td_list)
+    return td_lists
+
+
 def unique_subtitle_list(raw_list):
     ret = []
     id_list = list({i["id"] for i in raw_list})
@@ -100,6 +175,106 @@ def unique_subtitle_list(raw_list):
     return ret
 
 
+def parse_search_page(content, keyword) -> Optional[List[Episode]]:
+    """episodes in a page of search result, ``None`` if there is no more page"""
+    bs = make_soup(content)
+
+    table = bs.find("table", {"id": "topic_list"})
+    # a page without any row is the end, not a page without anime rows
+    if table is None or table.tbody.find("tr") is None:
+        return None
+    td_lists = parse_topic_rows(table)
+    titles = [td_list[2].find("a", {"target": "_blank"}).get_text(strip=True) for td_list in td_lists]
+    episodes = []
+    for td_list, title, episode in zip(td_lists, titles, parse_episodes(titles)):
+        time_string = td_list[0].span.string
+        name = keyword
+        download = td_list[3].a["href"]
+        t = parse_time(time_string)
+
+        episodes.append(
+            Episode.trusted(
+                name=name,
+                title=title,
+                download=download,
+                episode=episode,
+                time=t,
+            )
+        )
+    return episodes
+
+
+def parse_bangumi_page(content, subtitle_list=None, since=None) -> Optional[Tuple[List[Episode], bool]]:
+    """
+    episodes in a page of bangumi and whether page only contains torrents published before ``since``,
+    ``None`` if there is no more page
+    """
+    bs = make_soup(content)
+
+    table = bs.find("table", {"id": "topic_list"})
+    if table is None:
+        return None
+    # decided by all rows, a page without anime rows is not the end of newer torrents
+    page_is_old = since is not None and all(
+        parse_time(tr.td.span.string) < since for tr in table.tbody.find_all("tr", {"class": ""})
+    )
+    td_lists = parse_topic_rows(table)
+    titles = [td_list[2].find("a", {"target": "_blank"}).get_text(strip=True) for td_list in td_lists]
+    episodes = []
+    for td_list, title, episode in zip(td_lists, titles, parse_episodes(titles)):
+        time_string = td_list[0].span.string
+        download = td_list[3].a["href"]
+        t = parse_time(time_string)
+        subtitle_group = ""
+
+        tag_list = td_list[2].find_all("span", {"class": "tag"})
+
+        for tag in tag_list:
+            href = tag.a.get("href")
+            if href is None:
+                continue
+
+            team_id_raw = re.findall(r"team_id\/(.*)$", href)
+            if len(team_id_raw) == 0:
+                continue
+            subtitle_group = team_id_raw[0]
+
+        if subtitle_list:
+            if subtitle_group not in subtitle_list:
+                continue
+
+        if os.environ.get("DEBUG", False):  # pragma: no cover
+            print(title, subtitle_group, download, episode, t)
+
+        episodes.append(
+            Episode.trusted(
+                title=title,
+                subtitle_group=subtitle_group,
+                download=download,
+                episode=episode,
+                time=t,
+            )
+        )
+
+    return episodes, page_is_old
+
+
+def _search_url() -> str:
+    return base_url + "/topics/list/"
+
+
+def _bangumi_page_url(keyword: str, page: int) -> str:
+    return _search_url() + "?keyword=" + keyword + "&page=" + str(page)
+
+
+def _is_last_bangumi_page(page: Optional[Tuple[List[Episode], bool]]) -> bool:
+    return page is None or page[1]
+
+
+def _bangumi_episodes(pages: List[Optional[Tuple[List[Episode], bool]]]) -> List[Episode]:
+    return [episode for page in pages if page is not None for episode in page[0]]
+
+
 class DmhySource(BaseWebsite):
     def search_by_keyword(self, keyword, count=None):
         """
@@ -126,74 +301,29 @@ class DmhySource(BaseWebsite):
         if count is None:
             count = 3
 
-        result = []
-        search_url = base_url + "/topics/list/"
-        for i in range(count):
-            params = {"keyword": keyword, "page": i + 1}
+        def fetch_page(page):
+            params = {"keyword": keyword, "page": page}
 
             if os.environ.get("DEBUG", False):  # pragma: no cover
-                print(search_url, params)
-
-            r = fetch_url(search_url, params=params)
-            bs = BeautifulSoup(r, "html.parser")
-
-            table = bs.find("table", {"id": "topic_list"})
-            if table is None:
-                break
-            tr_list = table.tbody.find_all("tr", {"class": ""})
-            for tr in tr_list:
-                td_list = tr.find_all("td")
-
-                if td_list[1].a["class"][0] != "sort-2":
-                    continue
-
-                time_string = td_list[0].span.string
-                name = keyword
-                title = td_list[2].find("a", {"target": "_blank"}).get_text(strip=True)
-                download = td_list[3].a["href"]
-                episode = self.parse_episode(title)
-                t = int(time.mktime(time.strptime(time_string, "%Y/%m/%d %H:%M")))
-
-                result.append(
-                    Episode(
-                        name=name,
-                        title=title,
-                        download=download,
-                        episode=episode,
-                        time=t,
-                    )
-                )
-
-        return result
+                print(_search_url(), params)
 
-    def fetch_bangumi_calendar(self):
-        week_days_mapping = [
-            ("Sun", "sunarray"),
-            ("Mon", "monarray"),
-            ("Tue", "tuearray"),
-            ("Wed", "wedarray"),
-            ("Thu", "thuarray"),
-            ("Fri", "friarray"),
-            ("Sat", "satarray"),
-        ]
-
-        bangumi_list = []
+            return parse_search_page(fetch_url(_search_url(), params=params), keyword)
+
+        pages = fetch_pages(fetch_page, count, stop=lambda page: page is None)
+        return [episode for page in pages if page is not None for episode in page]
 
+    def fetch_bangumi_calendar(self):
         url = base_url + "/cms/page/name/programme.html"
 
         r = fetch_url(url)
 
-        for update_time, array_name in week_days_mapping:
-            b_list = parse_bangumi_with_week_days(r, update_time, array_name)
-            bangumi_list.extend(b_list)
-
-        return bangumi_list
+        return parse_bangumi_calendar(r)
 
     def search_by_tag(self, tag: str, subtitle: Optional[str] = None, count: Optional[int] = None) -> List[Episode]:
         print_error("dmhy not support search by tag")
         return []
 
-    def fetch_episode_of_bangumi(self, bangumi_id, max_page=cfg.max_path, subtitle_list=None):
+    def fetch_episode_of_bangumi(self, bangumi_id, max_page=cfg.max_path, subtitle_list=None, since=None):
         """
         get all episode by bangumi id
         example
@@ -214,66 +344,47 @@ class DmhySource(BaseWebsite):
         :type subtitle_list: list
         :param max_page: how many page you want to crawl if there is no subtitle list
         :type max_page: int
+        :param since: stop crawling when a page only contains torrents published before it
+        :type since: int
         :return: list of bangumi
         :rtype: list[dict]
         """
-        result = []
-        keyword = bangumi_id
-        search_url = base_url + "/topics/list/"
-        for i in range(max_page):
-            url = search_url + "?keyword=" + keyword + "&page=" + str(i + 1)
+
+        def fetch_page(page):
+            url = _bangumi_page_url(bangumi_id, page)
 
             if os.environ.get("DEBUG", False):  # pragma: no cover
                 print(url)
 
-            r = fetch_url(url)
-            bs = BeautifulSoup(r, "html.parser")
-
-            table = bs.find("table", {"id": "topic_list"})
-            if table is None:
-                break
-            tr_list = table.tbody.find_all("tr", {"class": ""})
-            for tr in tr_list:
-                td_list = tr.find_all("td")
-
-                if td_list[1].a["class"][0] != "sort-2":
-                    continue
-
-                time_string = td_list[0].span.string
-                name = keyword
-                title = td_list[2].find("a", {"target": "_blank"}).get_text(strip=True)
-                download = td_list[3].a["href"]
-                episode = self.parse_episode(title)
-                t = int(time.mktime(time.strptime(time_string, "%Y/%m/%d %H:%M")))
-                subtitle_group = ""
-
-                tag_list = td_list[2].find_all("span", {"class": "tag"})
-
-                for tag in tag_list:
-                    href = tag.a.get("href")
-                    if href is None:
-                        continue
-
-                    team_id_raw = re.findall(r"team_id\/(.*)$", href)
-                    if len(team_id_raw) == 0:
-                        continue
-                    subtitle_group = team_id_raw[0]
-
-                if subtitle_list:
-                    if subtitle_group not in subtitle_list:
-                        continue
-
-                if os.environ.get("DEBUG", False):  # pragma: no cover
-                    print(name, title, subtitle_group, download, episode, t)
-
-                result.append(
-                    Episode(
-                        title=title,
-                        subtitle_group=subtitle_group,
-                        download=download,
-                        episode=episode,
-                        time=t,
-                    )
-                )
-
-        return result
+            return parse_bangumi_page(fetch_url(url), subtitle_list, since)
+
+        return _bangumi_episodes(fetch_pages(fetch_page, max_page, stop=_is_last_bangumi_page))
+
+
+class AsyncDmhySource(AsyncWebsite):
+    async def search_by_keyword(self, keyword, count=None):
+        if count is None:
+            count = 3
+
+        async def fetch_page(page):
+            return parse_search_page(
+                await async_fetch_url(_search_url(), params={"keyword": keyword, "page": page}), keyword
+            )
+
+        pages = await aio.fetch_pages(fetch_page, count, stop=lambda page: page is None)
+        return [episode for page in pages if page is not None for episode in page]
+
+    async def fetch_bangumi_calendar(self):
+        return parse_bangumi_calendar(await async_fetch_url(base_url + "/cms/page/name/programme.html"))
+
+    async def search_by_tag(
+        self, tag: str, subtitle: Optional[str] = None, count: Optional[int] = None
+    ) -> List[Episode]:
+        print_error("dmhy not support search by tag")
+        return []
+
+    async def fetch_episode_of_bangumi(self, bangumi_id, max_page=cfg.max_path, subtitle_list=None, since=None):
+        async def fetch_page(page):
+            return parse_bangumi_page(await async_fetch_url(_bangumi_page_url(bangumi_id, page)), subtitle_list, since)
+
+        return _bangumi_episodes(await aio.fetch_pages(fetch_page, max_page, stop=_is_last_bangumi_page))
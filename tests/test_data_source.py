@@ -1,8 +1,17 @@
+import asyncio
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
 import pytest
+import requests
+import yarl
 
 from bgmi.lib.fetch import DATA_SOURCE_MAP
-from bgmi.website import mikan
-from bgmi.website.base import BaseWebsite
+from bgmi.website import aio, bangumi_moe, mikan, share_dmhy
+from bgmi.website.base import BaseWebsite, fetch_all, fetch_pages
 from bgmi.website.model import Episode, SubtitleGroup, WebsiteBangumi
 
 
@@ -55,3 +64,381 @@ def test_mikan_fetch_all_episode():
     w = mikan.Mikanani()
     results = w.fetch_episode_of_bangumi("2242", subtitle_list=["34"])
     assert len(results) > 15, "should fetch more episode in expand button"
+
+
+def test_mikan_parse_rss():
+    content = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0"><channel>
+<title>Mikan Project - 大欺诈师</title>
+<item>
+  <title>[极影字幕社] 大欺诈师 第02集 GB 1080P</title>
+  <torrent xmlns="https://mikanani.me/0.1/"><pubDate>2020-04-17T01:15:00.123</pubDate></torrent>
+  <enclosure type="application/x-bittorrent" length="1" url="https://mikanani.me/Download/20200417/b.torrent" />
+</item>
+<item>
+  <title>[极影字幕社] 大欺诈师 第01集 GB 1080P</title>
+  <torrent xmlns="https://mikanani.me/0.1/"><pubDate>2020-04-10T01:15:00</pubDate></torrent>
+  <enclosure type="application/x-bittorrent" length="1" url="https://mikanani.me/Download/20200410/a.torrent" />
+</item>
+</channel></rss>""".encode()
+
+    episodes = mikan.parse_rss_episodes(content, subtitle_group="34")
+
+    assert [e.episode for e in episodes] == [2, 1]
+    assert all(e.subtitle_group == "34" for e in episodes)
+    assert episodes[1].download.startswith("https://mikanani.me/Download/20200410/a.torrent?dn=")
+    assert episodes[0].time > episodes[1].time
+
+
+def _bangumi_moe_pages(*pages):
+    def torrent(i, publish_time):
+        return {"_id": str(i), "team_id": "t", "title": f"[t] name [{i:02d}]", "publish_time": publish_time}
+
+    def get_response(url, method="GET", json=None):
+        return {"torrents": [torrent(i, t) for i, t in pages[json["p"] - 1]]}
+
+    return get_response
+
+
+@pytest.mark.parametrize("connections", [1, 4])
+def test_bangumi_moe_stop_at_old_page(connections, monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.max_connections_per_host", connections)
+    get_response = _bangumi_moe_pages(
+        [(3, "2020-01-03T00:00:00.000Z"), (2, "2020-01-02T00:00:00.000Z")],
+        [(1, "2019-01-01T00:00:00.000Z")],
+        [(0, "2018-01-01T00:00:00.000Z")],
+        [(-1, "2017-01-01T00:00:00.000Z")],
+    )
+
+    with mock.patch("bgmi.website.bangumi_moe.get_response", side_effect=get_response) as m:
+        episodes = bangumi_moe.BangumiMoe().fetch_episode_of_bangumi(
+            "id", max_page=4, since=int(datetime.datetime(2019, 6, 1).timestamp())
+        )
+
+    # pages already requested when an old page is found are ignored
+    assert 2 <= m.call_count <= min(connections + 1, 4)
+    if connections == 1:
+        assert m.call_count == 2
+    assert [e.episode for e in episodes] == [3, 2, 1]
+
+
+def test_async_bangumi_moe(monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.max_connections_per_host", 1)
+    get_response = _bangumi_moe_pages(
+        [(3, "2020-01-03T00:00:00.000Z"), (2, "2020-01-02T00:00:00.000Z")],
+        [(1, "2019-01-01T00:00:00.000Z")],
+        [(0, "2018-01-01T00:00:00.000Z")],
+    )
+
+    with mock.patch("bgmi.website.bangumi_moe.async_get_response", side_effect=get_response) as m:
+        episodes = asyncio.run(
+            bangumi_moe.AsyncBangumiMoe().fetch_episode_of_bangumi(
+                "id", max_page=3, since=int(datetime.datetime(2019, 6, 1).timestamp())
+            )
+        )
+    assert m.await_count == 2
+    assert [e.episode for e in episodes] == [3, 2, 1]
+
+    with mock.patch("bgmi.website.bangumi_moe.async_get_response", side_effect=get_response):
+        episodes = asyncio.run(bangumi_moe.AsyncBangumiMoe().search_by_keyword("name", count=3))
+    assert [e.episode for e in episodes] == [0, 1, 2, 3]
+
+
+def test_bangumi_moe_search_pages(monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.max_connections_per_host", 4)
+    get_page = _bangumi_moe_pages(
+        [(3, "2020-01-03T00:00:00.000Z"), (2, "2020-01-02T00:00:00.000Z")],
+        [(1, "2020-01-01T00:00:00.000Z")],
+        [(0, "2019-12-31T00:00:00.000Z")],
+    )
+
+    def get_response(url, method="GET", json=None):
+        time.sleep((5 - json["p"]) / 1000)
+        return {**get_page(url, method, json), "page_count": 2}
+
+    with mock.patch("bgmi.website.bangumi_moe.get_response", side_effect=get_response) as m:
+        episodes = bangumi_moe.BangumiMoe().search_by_keyword("name", count=10)
+
+    assert m.call_count == 2, "pages after page_count should not be requested"
+    assert [e.episode for e in episodes] == [1, 2, 3]
+
+    with mock.patch("bgmi.website.bangumi_moe.get_response", side_effect=[{"torrents": []}]) as m:
+        assert bangumi_moe.BangumiMoe().search_by_keyword("name", count=10) == []
+    assert m.call_count == 1, "should stop at empty page"
+
+
+def test_fetch_pages_in_order(monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.max_connections_per_host", 3)
+    first_page_done = threading.Event()
+    started = []
+
+    def fetch_page(page):
+        started.append(page)
+        if page == 1:
+            first_page_done.set()
+        else:
+            assert first_page_done.is_set(), "first page should be fetched alone"
+        # later pages finish first
+        time.sleep((10 - page) / 1000)
+        return page
+
+    assert fetch_pages(fetch_page, 9) == list(range(1, 10))
+    assert started[0] == 1
+    assert fetch_pages(fetch_page, 9, stop=lambda page: page == 4) == [1, 2, 3, 4]
+    assert fetch_pages(fetch_page, 0) == []
+
+    assert fetch_all(lambda x: x * 2, [3, 2, 1]) == [6, 4, 2]
+
+
+def test_async_fetch_pages_in_order(monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.max_connections_per_host", 3)
+    started = []
+    in_flight = []
+
+    async def fetch_page(page):
+        started.append(page)
+        in_flight.append(page)
+        assert len(in_flight) <= 3
+        # later pages finish first
+        await asyncio.sleep((10 - page) / 1000)
+        in_flight.remove(page)
+        return page
+
+    async def double(x):
+        return x * 2
+
+    async def main():
+        assert await aio.fetch_pages(fetch_page, 9) == list(range(1, 10))
+        assert await aio.fetch_pages(fetch_page, 9, stop=lambda page: page == 4) == [1, 2, 3, 4]
+        assert await aio.fetch_pages(fetch_page, 0) == []
+        assert await aio.fetch_all(double, [3, 2, 1]) == [6, 4, 2]
+
+    asyncio.run(main())
+    assert started[0] == 1
+
+
+def test_mikan_login_state(monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.mikan_username", "user")
+    monkeypatch.setattr("bgmi.config.cfg.mikan_password", "pass")
+    session = mock.Mock(cookies=requests.cookies.RequestsCookieJar())
+    monkeypatch.setattr(mikan, "requests", session)
+    monkeypatch.setattr(mikan, "login_state", mikan.LoginState())
+    host = yarl.URL(mikan.server_root).host
+    logged_in = {"value": False}
+
+    def get(url, params=None, headers=None):
+        if url == mikan.login_url:
+            return mock.Mock(text='<input name="__RequestVerificationToken" value="t">')
+        page = "退出" if logged_in["value"] else "登录"
+        return mock.Mock(text=f"{url} {page}", headers={"content-type": "text/html; charset=utf-8"})
+
+    def post(url, **kwargs):
+        logged_in["value"] = True
+        session.cookies.set(mikan._AUTH_COOKIE, "v", domain=host, expires=int(time.time()) + 3600)
+        return mock.Mock(text="")
+
+    session.get.side_effect = get
+    session.post.side_effect = post
+
+    # no auth cookie, login before fetching page
+    assert mikan.get_text("a") == "a 退出"
+    assert mikan.get_text("b") == "b 退出"
+    assert [c.args[0] for c in session.get.call_args_list] == [mikan.login_url, "a", "b"]
+    assert session.post.call_count == 1
+
+    # auth cookie exists but server session expired, found in next update
+    mikan.Mikanani().start_update()
+    logged_in["value"] = False
+    session.get.reset_mock()
+    assert mikan.get_text("c") == "c 退出"
+    assert mikan.get_text("d") == "d 退出"
+    assert [c.args[0] for c in session.get.call_args_list] == ["c", mikan.login_url, "c", "d"]
+    assert session.get.call_args_list[0].kwargs["headers"] == {"Cache-Control": "no-cache"}, "probe bypasses cache"
+    assert session.post.call_count == 2
+
+    # long running process probes session again after a while
+    session.get.reset_mock()
+    with mock.patch.object(mikan.LoginState, "ttl", 0):
+        assert mikan.get_text("e") == "e 退出"
+    assert [c.args[0] for c in session.get.call_args_list] == ["e"]
+    assert session.get.call_args_list[0].kwargs["headers"] == {"Cache-Control": "no-cache"}
+
+    # callers waiting for a probe don't fetch their pages one by one
+    mikan.login_state.reset()
+    probing = threading.Event()
+    release = threading.Event()
+
+    def slow_get(url, params=None, headers=None):
+        if headers:
+            probing.set()
+            release.wait(5)
+        return get(url, params, headers)
+
+    session.get.side_effect = slow_get
+    with ThreadPoolExecutor(3) as executor:
+        probe = executor.submit(mikan.get_text, "f")
+        probing.wait(5)
+        others = [executor.submit(mikan.get_text, url) for url in "gh"]
+        release.set()
+        assert [f.result() for f in [probe, *others]] == ["f 退出", "g 退出", "h 退出"]
+
+
+MIKAN_BANGUMI_PAGE = """<html><body>
+<div class="pull-left leftbar-container">
+  <p class="bangumi-title">大欺诈师</p>
+  <p class="bangumi-info">放送日期：星期五</p>
+  <div class="leftbar-nav"><ul>
+    <li><a data-anchor="#34">极影字幕社</a></li>
+    <li><a data-anchor="#583">ANi</a></li>
+  </ul></div>
+</div>
+<div class="central-container">
+  <div class="subgroup-text" id="34">极影字幕社</div>
+  <table>
+    <tr><th>番组名</th><th>大小</th><th>更新时间</th></tr>
+    <tr>
+      <td><a class="magnet-link-wrap">[极影字幕社] 大欺诈师 第02集 GB 1080P</a>
+          <a class="magnet-link" data-clipboard-text="magnet:?xt=urn:btih:2"></a></td>
+      <td>300MB</td><td>2020/04/17 01:15</td>
+    </tr>
+    <tr>
+      <td><a class="magnet-link-wrap">[极影字幕社] 大欺诈师 第01集 GB 1080P</a>
+          <a class="magnet-link" data-clipboard-text="magnet:?xt=urn:btih:1"></a></td>
+      <td>300MB</td><td>2020/04/10 01:15</td>
+    </tr>
+  </table>
+  <div class="subgroup-text" id="583">ANi</div>
+  <table>
+    <tr><th>番组名</th><th>大小</th><th>更新时间</th></tr>
+    <tr>
+      <td><a class="magnet-link-wrap">[ANi] 大欺诈师 - 01 [1080P]</a>
+          <a class="magnet-link" data-clipboard-text="magnet:?xt=urn:btih:3"></a></td>
+      <td>500MB</td><td>2020/04/10 02:00</td>
+    </tr>
+  </table>
+</div>
+</body></html>"""
+
+
+@pytest.mark.parametrize("parser", ["html.parser", "lxml"])
+def test_mikan_parse_bangumi_page(parser, monkeypatch):
+    if parser == "lxml":
+        pytest.importorskip("lxml")
+    monkeypatch.setattr("bgmi.config.cfg.html_parser", parser)
+    monkeypatch.setattr("bgmi.config.cfg.mikan_fetch_rss", False)
+
+    with (
+        mock.patch("bgmi.website.mikan.get_text", return_value=MIKAN_BANGUMI_PAGE),
+        mock.patch("bgmi.website.mikan.make_soup", wraps=mikan.make_soup) as make_soup,
+    ):
+        bangumi = mikan.Mikanani().fetch_single_bangumi("2242", subtitle_list=["34"])
+
+    assert make_soup.call_count == 1, "bangumi page should be parsed only once"
+    assert bangumi.name == "大欺诈师"
+    assert bangumi.update_time == "Fri"
+    assert [s.id for s in bangumi.subtitle_group] == ["34", "583"]
+    assert [(e.episode, e.download, e.subtitle_group) for e in bangumi.episodes] == [
+        (2, "magnet:?xt=urn:btih:2", "34"),
+        (1, "magnet:?xt=urn:btih:1", "34"),
+    ]
+
+
+def test_async_mikan_parse_bangumi_page(monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.mikan_fetch_rss", False)
+
+    with mock.patch("bgmi.website.mikan.async_get_text", return_value=MIKAN_BANGUMI_PAGE):
+        bangumi = asyncio.run(mikan.AsyncMikanani().fetch_single_bangumi("2242", subtitle_list=["34"]))
+
+    with mock.patch("bgmi.website.mikan.get_text", return_value=MIKAN_BANGUMI_PAGE):
+        assert bangumi == mikan.Mikanani().fetch_single_bangumi("2242", subtitle_list=["34"])
+    assert bangumi.name == "大欺诈师"
+    assert [e.episode for e in bangumi.episodes] == [2, 1]
+
+
+DMHY_PROGRAMME_PAGE = """<script>
+var sunarray = new Array();
+var monarray = new Array();
+var friarray = new Array();
+monarray.push(['https://share.dmhy.org/images/weekly/a.jpg','葬送的芙莉蓮','芙莉蓮|Frieren','<a href="/topics/list?keyword=%E8%8A%99+team_id%3A619">桜都字幕組</a><a href="/topics/list?keyword=%E8%8A%99+team_id%3A801">NC-Raws</a>','']);
+friarray.push(['https://share.dmhy.org/images/weekly/b.jpg','It\\'s MyGO',encodeURIComponent('MyGO!!!!!'),'<a href="/topics/list?keyword=MyGO+team_id%3A619">桜都字幕組</a>','']);
+sunarray.push(['https://share.dmhy.org/images/weekly/c.jpg','藥屋少女','藥屋少女'+encodeURIComponent('的呢喃')+'','<a href="/topics/list?keyword=%E8%8A%99+team_id%3A619">桜都字幕組</a><a href="/topics/list?keyword=%E8%8A%99+team_id%3A801">NC-Raws</a>','']);
+monarray.push(['https://share.dmhy.org/images/weekly/d.jpg','間諜家家酒','SPY×FAMILY','<a href="/topics/list?keyword=x">全部</a>','']);
+</script>"""
+
+
+def test_dmhy_parse_calendar():
+    with mock.patch("bgmi.website.share_dmhy.make_soup", wraps=share_dmhy.make_soup) as make_soup:
+        bangumi_list = share_dmhy.parse_bangumi_calendar(DMHY_PROGRAMME_PAGE)
+
+    assert make_soup.call_count == 1, "subtitle groups html of all bangumi should be parsed at once"
+    assert [(b.update_time, b.name, b.keyword) for b in bangumi_list] == [
+        ("Sun", "藥屋少女", "藥屋少女的呢喃"),
+        ("Mon", "葬送的芙莉蓮", "芙莉蓮|Frieren"),
+        ("Mon", "間諜家家酒", "SPY×FAMILY"),
+        ("Fri", "It's MyGO", "MyGO%21%21%21%21%21"),
+    ]
+    assert bangumi_list[0].cover == share_dmhy.base_url + "/images/weekly/c.jpg"
+    assert [g.id for g in bangumi_list[1].subtitle_group] == ["619", "801"]
+    assert bangumi_list[2].subtitle_group == []
+    assert [g.id for g in bangumi_list[3].subtitle_group] == ["619"]
+
+    assert share_dmhy.parse_bangumi_with_week_days(DMHY_PROGRAMME_PAGE, "Mon", "monarray") == bangumi_list[1:3]
+
+
+def _dmhy_topic_page(*rows):
+    """topic list page of ``(sort, time, title)`` rows"""
+    trs = "".join(
+        f"""<tr class=""><td><span>{t}</span></td><td><a class="{sort}"></a></td>
+        <td><span class="tag"><a href="/topics/list/team_id/619">t</a></span><a target="_blank">{title}</a></td>
+        <td><a href="magnet:{title}"></a></td></tr>"""
+        for sort, t, title in rows
+    )
+    return f'<table id="topic_list"><tbody>{trs}</tbody></table>'
+
+
+def test_dmhy_stop_at_old_page(monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.max_connections_per_host", 1)
+    pages = [
+        _dmhy_topic_page(("sort-2", "2020/01/03 00:00", "[t] name [03]")),
+        # newer torrents of other categories, later pages may still have new anime
+        _dmhy_topic_page(("sort-31", "2020/01/02 00:00", "[t] name music")),
+        _dmhy_topic_page(("sort-2", "2020/01/01 00:00", "[t] name [02]")),
+        _dmhy_topic_page(("sort-2", "2018/01/01 00:00", "[t] name [01]")),
+        _dmhy_topic_page(("sort-2", "2017/01/01 00:00", "[t] name [00]")),
+    ]
+
+    def fetch_url(url, **kwargs):
+        return pages[int(url.rsplit("=", 1)[1]) - 1]
+
+    with mock.patch("bgmi.website.share_dmhy.fetch_url", side_effect=fetch_url) as m:
+        episodes = share_dmhy.DmhySource().fetch_episode_of_bangumi(
+            "name", max_page=5, since=int(datetime.datetime(2019, 6, 1).timestamp())
+        )
+    assert m.call_count == 4
+    assert [e.episode for e in episodes] == [3, 2, 1]
+
+    with mock.patch("bgmi.website.share_dmhy.fetch_url", side_effect=fetch_url) as m:
+        episodes = share_dmhy.DmhySource().fetch_episode_of_bangumi("name", max_page=5)
+    assert m.call_count == 5
+    assert [e.episode for e in episodes] == [3, 2, 1, 0]
+
+
+def test_async_dmhy_stop_at_old_page(monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.max_connections_per_host", 1)
+    pages = [
+        _dmhy_topic_page(("sort-2", "2020/01/03 00:00", "[t] name [03]")),
+        _dmhy_topic_page(("sort-2", "2018/01/01 00:00", "[t] name [01]")),
+        _dmhy_topic_page(("sort-2", "2017/01/01 00:00", "[t] name [00]")),
+    ]
+
+    def fetch_url(url, **kwargs):
+        return pages[int(url.rsplit("=", 1)[1]) - 1]
+
+    with mock.patch("bgmi.website.share_dmhy.async_fetch_url", side_effect=fetch_url) as m:
+        episodes = asyncio.run(
+            share_dmhy.AsyncDmhySource().fetch_episode_of_bangumi(
+                "name", max_page=3, since=int(datetime.datetime(2019, 6, 1).timestamp())
+            )
+        )
+    assert m.await_count == 2
+    assert [e.episode for e in episodes] == [3, 1]
@@ -1,12 +1,15 @@
 import os
+import time
 from unittest import mock
 
 import pytest
 
 from bgmi.config import cfg
 from bgmi.lib.controllers import update
+from bgmi.lib.download import download_prepare, get_download_driver
 from bgmi.lib.models import Bangumi, Followed
 from bgmi.main import main_for_test
+from bgmi.website.base import BaseWebsite
 from bgmi.website.model import Episode
 
 
@@ -35,13 +38,15 @@ def test_search_download(mock_download_driver: mock.Mock):
 @pytest.mark.usefixtures("_clean_bgmi")
 def test_update_download(mock_download_driver: mock.Mock):
     name = "hello world"
-    mock_website = mock.Mock()
-    mock_website.get_maximum_episode = mock.Mock(
+    now = int(time.time())
+    mock_website = BaseWebsite()
+    mock_website.fetch_fingerprint = mock.Mock(return_value="fingerprint")
+    mock_website.fetch_followed_episodes = mock.Mock(
         return_value=(
-            4,
+            None,
             [
-                Episode(episode=3, download="magnet:mm", title="t 720p", name=name),
-                Episode(episode=4, download="magnet:4", title="t 1080p", name=name),
+                Episode(episode=3, download="magnet:mm", title="t 720p", time=now),
+                Episode(episode=4, download="magnet:4", title="t 1080p", time=now),
             ],
         )
     )
@@ -50,8 +55,12 @@ def test_update_download(mock_download_driver: mock.Mock):
 
     Followed(bangumi_name=name, episode=2).save()
 
-    with mock.patch("bgmi.lib.controllers.website", mock_website):
+    with (
+        mock.patch("bgmi.lib.controllers.website", mock_website),
+        mock.patch("bgmi.lib.controllers.session.warm_up") as warm_up,
+    ):
         update([name], download=[3, 4], not_ignore=False)
+    warm_up.assert_called_once()
 
     mock_download_driver.add_download.assert_has_calls(
         [
@@ -61,6 +70,50 @@ def test_update_download(mock_download_driver: mock.Mock):
     )
 
 
+@pytest.mark.usefixtures("_clean_bgmi")
+def test_update_skip_broken_subscription(mock_download_driver: mock.Mock):
+    now = int(time.time())
+
+    def fetch_followed_episodes(keyword, **kwargs):
+        if keyword == "broken":
+            raise ValueError("unexpected page")
+        return None, [Episode(episode=3, download="magnet:mm", title="t 720p", time=now)]
+
+    mock_website = BaseWebsite()
+    mock_website.fetch_fingerprint = mock.Mock(return_value="fingerprint")
+    mock_website.fetch_followed_episodes = mock.Mock(side_effect=fetch_followed_episodes)
+
+    for name in ["hello world", "broken"]:
+        Bangumi(name=name, subtitle_group="", keyword=name, cover="").save()
+        Followed(bangumi_name=name, episode=2).save()
+
+    messages = []
+    with (
+        mock.patch("bgmi.lib.controllers.website", mock_website),
+        mock.patch("bgmi.lib.controllers.session.warm_up"),
+        mock.patch("bgmi.lib.controllers.print_info", side_effect=messages.append),
+        mock.patch("bgmi.lib.controllers.print_success", side_effect=messages.append),
+        mock.patch("bgmi.lib.controllers.print_warning", side_effect=messages.append),
+    ):
+        result = update(["hello world", "broken"], download=True, not_ignore=False)
+
+    # output of each subscription is printed together, like updating them one by one
+    fetching = messages.index("fetching hello world ...")
+    assert messages[fetching : fetching + 4] == [
+        "fetching hello world ...",
+        "hello world updated, episode: 3",
+        "fetching broken ...",
+        "error ValueError('unexpected page') to fetch broken, skip",
+    ]
+
+    assert result["data"]["updated"] == [{"bangumi": "hello world", "episode": 3}]
+    assert Followed.get(bangumi_name="hello world").episode == 3
+    assert Followed.get(bangumi_name="broken").episode == 2
+    mock_download_driver.add_download.assert_has_calls(
+        [mock.call(url="magnet:mm", save_path=os.path.join(cfg.save_path, "hello world", "3"))]
+    )
+
+
 def test_search_with_filter(mock_download_driver: mock.Mock):
     mock_website = mock.Mock()
     mock_website.search_by_keyword = mock.Mock(
@@ -78,3 +131,18 @@ def test_search_with_filter(mock_download_driver: mock.Mock):
     mock_download_driver.add_download.assert_called_once_with(
         url="magnet:mm", save_path=os.path.join(cfg.save_path, "海贼王", "3")
     )
+
+
+@pytest.mark.usefixtures("_clean_bgmi")
+def test_download_driver_recreated_after_failure():
+    broken, driver = mock.Mock(), mock.Mock()
+    broken.add_download.side_effect = ConnectionRefusedError("refused")
+    manager = mock.Mock(side_effect=[mock.Mock(driver=broken), mock.Mock(driver=driver)])
+
+    get_download_driver.cache_clear()
+    with mock.patch("stevedore.DriverManager", manager):
+        download_prepare([Episode(name="a", title=f"a {i}", download=f"magnet:{i}", episode=i) for i in (1, 2)])
+    get_download_driver.cache_clear()
+
+    assert manager.call_count == 2
+    driver.add_download.assert_called_once_with(url="magnet:2", save_path=os.path.join(cfg.save_path, "a", "2"))
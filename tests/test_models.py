@@ -1,5 +1,9 @@
-from bgmi.lib.models import Filter
-from bgmi.website.model import Episode
+import time
+
+import pytest
+
+from bgmi.lib.models import STATUS_FOLLOWED, STATUS_UPDATED, Bangumi, Filter, Followed
+from bgmi.website.model import Episode, WebsiteBangumi
 
 
 def test_include():
@@ -30,3 +34,46 @@ def test_exclude():
     )
     assert len(e) == 2, e
     assert {x.download for x in e} == {"1", "2"}
+
+
+@pytest.mark.usefixtures("_clean_bgmi")
+def test_followed_subscriptions():
+    now = int(time.time())
+    for i in range(3):
+        Bangumi.create(name=f"b{i}", keyword=f"k{i}", subtitle_group="", update_time="Mon", cover="")
+        Followed.create(bangumi_name=f"b{i}", status=STATUS_UPDATED, updated_time=now - i * 86400)
+    Followed.create(bangumi_name="not-exist", status=STATUS_FOLLOWED)
+    Filter.create(bangumi_name="b1", include="1080")
+
+    assert [f.bangumi_name for f in Followed.get_subscriptions()] == ["b0", "b1", "b2"]
+
+    subscriptions = Followed.get_subscriptions(["b1", "not-exist", "b0"])
+    assert [f.bangumi_name for f in subscriptions] == ["b1", "not-exist", "b0"]
+    assert subscriptions[0].bangumi_obj.keyword == "k1"
+    assert subscriptions[0].filter_obj.include == "1080"
+    assert subscriptions[1].bangumi_obj is None
+    assert subscriptions[2].filter_obj is None
+
+    assert Followed.mark_outdated(before=now - 86400 // 2) == 2
+    assert [f.status for f in Followed.select().order_by(Followed.bangumi_name)][:3] == [
+        STATUS_UPDATED,
+        STATUS_FOLLOWED,
+        STATUS_FOLLOWED,
+    ]
+
+
+def test_episode_trusted():
+    kwargs = dict(title="[a] b [01]", download="magnet:?xt=1", episode=1, time=1700000000, subtitle_group="34")
+    e = Episode.trusted(**kwargs)
+    assert e == Episode(**kwargs)
+    assert e.dict() == Episode(**kwargs).dict()
+    assert Episode.parse_obj(e.dict()) == e
+
+    e.name = "b"
+    assert e.name == "b"
+    assert Episode.trusted(**kwargs).name == ""
+
+    b = WebsiteBangumi.trusted(keyword="1", update_time="Mon", episodes=[e])
+    assert b.episodes[0] is e
+    assert b.dict() == WebsiteBangumi(keyword="1", update_time="Mon", episodes=[e]).dict()
+    assert WebsiteBangumi.trusted(keyword="2").episodes == []
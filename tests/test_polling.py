@@ -0,0 +1,51 @@
+import calendar
+
+from bgmi.lib import polling
+from bgmi.lib.models import Followed
+
+# Wednesday 2024-01-03 22:00 in timezone of data sources
+RELEASE = calendar.timegm((2024, 1, 3, 22, 0, 0)) - polling.SOURCE_UTC_OFFSET
+
+
+def test_expected_release_from_history():
+    f = Followed(bangumi_name="a")
+    for week in range(4):
+        polling.record_release(f, int(RELEASE + week * polling.WEEK + week * 600))
+    # an episode delayed to next day
+    polling.record_release(f, int(RELEASE + 4 * polling.WEEK + polling.DAY))
+
+    f.last_polled = int(RELEASE + 5 * polling.WEEK - 3600)
+
+    # 2 hours after expected release
+    now = RELEASE + 5 * polling.WEEK + 2 * 3600
+    assert polling.is_hot(f, "Mon", now)
+    assert polling.is_due(f, "Mon", now)
+
+    # 2 days after
+    now = RELEASE + 5 * polling.WEEK + 2 * polling.DAY
+    f.last_polled = int(now - 3600)
+    assert not polling.is_hot(f, "Mon", now)
+    assert not polling.is_due(f, "Mon", now)
+
+
+def test_expected_release_from_weekday():
+    f = Followed(bangumi_name="a", last_polled=int(RELEASE - 3 * 3600))
+    assert polling.is_hot(f, "Wed", RELEASE)
+    assert not polling.is_hot(f, "Fri", RELEASE)
+    assert not polling.is_due(f, "Fri", RELEASE)
+    assert polling.is_hot(f, "Unknown", RELEASE)
+    assert polling.is_due(Followed(bangumi_name="b"), "Fri", RELEASE)
+
+
+def test_priority():
+    f = Followed(bangumi_name="a")
+    assert polling.priority(f, "Wed", RELEASE) < polling.priority(f, "Tue", RELEASE)
+    assert polling.priority(f, "Tue", RELEASE) < polling.priority(f, "Sun", RELEASE)
+    assert polling.priority(f, "Unknown", RELEASE) == polling.WEEK
+
+
+def test_week_offset_in_source_timezone():
+    # Tuesday 23:00 in UTC is Wednesday 07:00 in timezone of data sources
+    ts = calendar.timegm((2024, 1, 2, 23, 0, 0))
+    assert polling.week_offset(ts) == 2 * polling.DAY + 7 * 3600
+    assert polling.is_hot(Followed(bangumi_name="a"), "Wed", ts)
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from bgmi.lib import scheduler
+
+
+def test_run_pending(tmp_path):
+    state_file = tmp_path.joinpath("daemon.json")
+    calls = []
+
+    def failed():
+        calls.append("failed")
+        raise SystemExit(1)
+
+    s = scheduler.Scheduler(state_file)
+    s.add_job("a", 60, lambda: calls.append("a"))
+    s.add_job("failed", 60, failed)
+
+    s.run_pending()
+    s.run_pending()
+    assert calls == ["a", "failed"], "job should not run again before next run time"
+
+    state = scheduler.load_state(state_file)
+    assert state["jobs"]["a"]["next_run"] > time.time() + 50
+    assert state["jobs"]["a"]["last_error"] is None
+    assert state["jobs"]["failed"]["last_error"] == "SystemExit(1)"
+
+    # next run time is restored after restarting
+    s = scheduler.Scheduler(state_file)
+    s.add_job("a", 60, lambda: calls.append("a"))
+    s.run_pending()
+    assert calls == ["a", "failed"]
+
+
+def test_lock(tmp_path):
+    lock_file = tmp_path.joinpath("daemon.lock")
+    assert not scheduler.is_locked(lock_file)
+
+    f = scheduler.lock(lock_file)
+    assert scheduler.is_locked(lock_file)
+    with pytest.raises(scheduler.AlreadyRunning):
+        scheduler.lock(lock_file)
+
+    f.close()
+    assert not scheduler.is_locked(lock_file)
@@ -0,0 +1,415 @@
+import asyncio
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from bgmi.config import SourceNetwork
+from bgmi.session import Session, SourceAdapter
+from bgmi.session.aio import AsyncSession
+from bgmi.session.cache import HTTPCache
+from bgmi.session.cassette import Cassette
+from bgmi.session.mirror import MirrorPool
+from bgmi.session.ratelimit import TokenBucket
+from bgmi.session.singleflight import SingleFlight
+from bgmi.website.base import fetch_all
+
+
+class _Handler(BaseHTTPRequestHandler):
+    hits = 0
+    not_modified = 0
+    connection = None
+    cookie = None
+
+    def do_GET(self):
+        type(self).hits += 1
+        type(self).connection = self.headers.get("Connection")
+        type(self).cookie = self.headers.get("Cookie")
+        if self.path == "/flaky" and type(self).hits < 3:
+            self.send_response(502)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/busy" and type(self).hits < 3:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.path == "/login" and "token=1" not in self.headers.get("Cookie", ""):
+            self.send_response(302)
+            self.send_header("Set-Cookie", "token=1; Path=/")
+            self.send_header("Location", "/login")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            type(self).not_modified += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        if self.path.startswith("/slow"):
+            time.sleep(0.2)
+
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def http_server():
+    _Handler.hits = 0
+    _Handler.not_modified = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture()
+def dmhy_server(http_server, monkeypatch):
+    """``http_server`` serving as share.dmhy.org"""
+    monkeypatch.setattr("bgmi.config.cfg.share_dmhy_url", http_server)
+    monkeypatch.setattr("bgmi.config.cfg.network.dmhy.rate_limit", 0)
+    return http_server
+
+
+def test_http_cache_revalidate(dmhy_server, tmp_path, monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.network.dmhy.cache_ttl", 0)
+    s = Session(max_connections_per_host=2, cache=HTTPCache(tmp_path, max_size=1024 * 1024))
+
+    assert s.get(dmhy_server + "/a").text == "/a"
+    # cache_ttl=0, so response is revalidated every time
+    r = s.get(dmhy_server + "/a")
+    assert r.text == "/a"
+    assert r.from_cache
+    assert _Handler.hits == 2
+    assert _Handler.not_modified == 1
+
+    monkeypatch.setattr("bgmi.config.cfg.network.dmhy.cache_ttl", 3600)
+    assert s.get(dmhy_server + "/a").text == "/a"
+    assert _Handler.hits == 2, "fresh response should not hit network"
+
+
+def test_http_cache_only_data_source(http_server, tmp_path, monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.network.other.cache_ttl", 3600)
+    s = Session(max_connections_per_host=2, cache=HTTPCache(tmp_path, max_size=1024 * 1024))
+
+    s.get(http_server + "/cover.jpg")
+    r = s.get(http_server + "/cover.jpg")
+    assert not getattr(r, "from_cache", False)
+    assert _Handler.hits == 2
+    assert not list(tmp_path.iterdir())
+
+
+def test_http_cache_evict(dmhy_server, tmp_path):
+    cache = HTTPCache(tmp_path, max_size=64)
+    s = Session(max_connections_per_host=2, cache=cache)
+    for i in range(20):
+        s.get(f"{dmhy_server}/{i:04d}")
+
+    assert sum(f.stat().st_size for f in tmp_path.glob("*.body")) <= 64
+
+
+def test_http_cache_file_removed(dmhy_server, tmp_path):
+    # like a file removed by another process sharing the cache while it's scanned
+    tmp_path.joinpath("removed.body").symlink_to(tmp_path.joinpath("missing"))
+    s = Session(max_connections_per_host=2, cache=HTTPCache(tmp_path, max_size=64))
+    for i in range(20):
+        assert s.get(f"{dmhy_server}/{i:04d}").status_code == 200
+
+
+def test_source_adapter(http_server):
+    s = Session(max_connections_per_host=2)
+    adapter = SourceAdapter(SourceNetwork(retries=2, backoff_factor=0, keep_alive=False, read_timeout=5))
+    s.mount(http_server, adapter)
+    assert adapter.timeout == (10, 5)
+
+    r = s.get(http_server + "/flaky")
+    assert r.status_code == 200
+    assert _Handler.hits == 3
+    assert _Handler.connection == "close"
+
+    s.mount(http_server, SourceAdapter(SourceNetwork(retries=0)))
+    _Handler.hits = 0
+    assert s.get(http_server + "/flaky").status_code == 502, "response is returned when retries are exhausted"
+    assert _Handler.connection == "keep-alive"
+
+
+def test_token_bucket():
+    now = 0.0
+
+    def sleep(seconds):
+        nonlocal now
+        now += seconds
+
+    bucket = TokenBucket(rate=2, burst=3, clock=lambda: now, sleep=sleep)
+    assert [bucket.acquire() for _ in range(5)] == [0, 0, 0, 0.5, 0.5]
+
+    bucket.throttle(10)
+    assert bucket.rate == 1
+    assert [bucket.acquire() for _ in range(2)] == [10, 1], "no burst after pause"
+
+    for _ in range(30):
+        bucket.success()
+    assert bucket.rate == 2
+    assert bucket.stats() == {"requests": 7, "waits": 4, "waited": 12, "throttled": 1, "rate": 2}
+
+
+def test_rate_limit_retry_after(http_server, monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.network.other.rate_limit", 100)
+    monkeypatch.setattr("bgmi.config.cfg.network.other.retries", 2)
+    s = Session(max_connections_per_host=2)
+    # retries of adapter don't consume 429/503, even with `Retry-After`
+    s.mount(http_server, SourceAdapter(SourceNetwork(retries=2, backoff_factor=0)))
+
+    r = s.get(http_server + "/busy")
+    assert r.status_code == 200
+    assert _Handler.hits == 3
+
+    stats = s.rate_limit_stats()[http_server.split("//")[1]]
+    assert stats["requests"] == 3
+    assert stats["throttled"] == 2
+
+    _Handler.hits = 0
+    monkeypatch.setattr("bgmi.config.cfg.network.other.rate_limit", 0)
+    assert Session(max_connections_per_host=2).get(http_server + "/busy").status_code == 200, "retried without limiter"
+
+
+def test_single_flight():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return [1]
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(flight.do, "k", func)
+        started.wait(5)
+        followers = [executor.submit(flight.do, "k", func) for _ in range(3)]
+        time.sleep(0.05)
+        release.set()
+        assert leader.result() == ([1], False)
+        assert [f.result() for f in followers] == [([1], True)] * 3
+    assert len(calls) == 1
+    assert len(flight) == 0
+
+    def fail():
+        raise ValueError("x")
+
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: 2) == (2, False)
+
+
+def test_session_single_flight(dmhy_server):
+    s = Session(max_connections_per_host=4)
+    with ThreadPoolExecutor(3) as executor:
+        responses = list(executor.map(lambda _: s.get(dmhy_server + "/slow"), range(3)))
+
+    assert _Handler.hits == 1
+    assert [r.text for r in responses] == ["/slow"] * 3
+    assert len({id(r) for r in responses}) == 3, "every caller should get its own response"
+    assert len({id(r.headers) for r in responses}) == 3
+
+
+def test_session_single_flight_redirect(dmhy_server):
+    s = Session(max_connections_per_host=2)
+    responses = []
+    # redirected back to the same url after setting a cookie
+    t = threading.Thread(target=lambda: responses.append(s.get(dmhy_server + "/login")), daemon=True)
+    t.start()
+    t.join(5)
+
+    assert not t.is_alive(), "redirected request should not wait for itself"
+    assert responses[0].text == "/login"
+    assert _Handler.hits == 2
+    assert len(s.in_flight) == 0
+
+
+def test_session_reuse_responses(dmhy_server):
+    s = Session(max_connections_per_host=2)
+    with s.reuse_responses():
+        assert s.get(dmhy_server + "/a").text == "/a"
+        # fan-out threads share responses of the context they are started in
+        assert [r.text for r in fetch_all(lambda _: s.get(dmhy_server + "/a"), range(3))] == ["/a"] * 3
+        assert _Handler.hits == 1
+        s.get(dmhy_server + "/a", headers={"Cache-Control": "no-cache"})
+        assert _Handler.hits == 2
+
+    s.get(dmhy_server + "/a")
+    assert _Handler.hits == 3, "responses are not kept after the context"
+
+
+def test_save_cookies(tmp_path):
+    s = Session(max_connections_per_host=2)
+    cookies_file = tmp_path.joinpath("cookies")
+    s.load_cookies(cookies_file)
+    s.save_cookies()
+    assert cookies_file.exists()
+    mtime = cookies_file.stat().st_mtime_ns
+
+    s.save_cookies()
+    assert cookies_file.stat().st_mtime_ns == mtime, "unchanged cookies should not be written again"
+
+    s.cookies.set("k", "v", domain="example.com")
+    s.save_cookies()
+    assert list(tmp_path.iterdir()) == [cookies_file]
+
+    s2 = Session(max_connections_per_host=2)
+    s2.load_cookies(cookies_file)
+    assert s2.cookies.get("k") == "v"
+
+
+def test_cassette(http_server, tmp_path):
+    recorder = Session(max_connections_per_host=2, cassette=Cassette(tmp_path, replay=False))
+    assert recorder.get(http_server + "/a").text == "/a"
+    assert recorder.post(http_server + "/b", json={"p": 1}).status_code == 501
+    assert _Handler.hits == 1
+
+    player = Session(max_connections_per_host=2, cassette=Cassette(tmp_path, replay=True))
+    r = player.get(http_server + "/a")
+    assert r.text == "/a"
+    assert r.headers["ETag"] == '"v1"'
+    assert player.post(http_server + "/b", json={"p": 1}).status_code == 501
+    assert _Handler.hits == 1, "replay should not hit network"
+
+    with pytest.raises(requests.ConnectionError):
+        player.post(http_server + "/b", json={"p": 2})
+
+
+def test_mirror_pool():
+    now = 0.0
+    pool = MirrorPool(["https://a/", "https://b/", "https://c/", "https://a/"], clock=lambda: now)
+    assert len(pool) == 3
+    assert pool.best() == "https://a/"
+
+    pool.report("https://a/", 0.5)
+    assert pool.best() == "https://b/", "mirrors never used should be tried"
+    pool.report("https://b/", 0.1)
+    pool.report("https://c/", 0.3)
+    assert pool.best() == "https://b/"
+    assert pool.best(exclude={"https://b/"}) == "https://c/"
+
+    pool.report("https://b/", None)
+    assert pool.best() == "https://c/", "failed mirror should cool down"
+    now += 1
+    pool.report("https://a/", None)
+    pool.report("https://c/", None)
+    assert pool.best() == "https://b/", "mirror recovering first is used when all are failing"
+
+    now += 29
+    pool.report("https://b/", 0.1)
+    assert pool.best() == "https://b/"
+    assert pool.stats()["https://b/"]["errors"] == 1
+
+
+def test_session_mirror_failover(http_server, monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        dead = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    monkeypatch.setattr("bgmi.config.cfg.mikan_url", dead)
+    monkeypatch.setattr("bgmi.config.cfg.network.mikan_project.mirrors", [http_server])
+    s = Session(max_connections_per_host=2)
+
+    assert s.get(dead + "/a").text == "/a"
+    assert s.get(dead + "/b").text == "/b"
+    stats = s.mirror_stats()["mikan_project"]
+    assert stats[dead + "/"]["errors"] == 1, "dead mirror should not be tried again in cooldown"
+    assert stats[http_server + "/"]["requests"] == 2
+
+
+def test_session_mirror_cookies(http_server, monkeypatch):
+    with socket.socket() as sock:
+        # another host than mirror, cookies are not shared between hosts
+        sock.bind(("127.0.0.2", 0))
+        dead = f"http://127.0.0.2:{sock.getsockname()[1]}"
+    monkeypatch.setattr("bgmi.config.cfg.mikan_url", dead)
+    monkeypatch.setattr("bgmi.config.cfg.network.mikan_project.mirrors", [http_server])
+    s = Session(max_connections_per_host=2)
+    s.cookies.set("primary", "1", domain="127.0.0.2")
+
+    # mirror sets a cookie and redirects to itself
+    assert s.get(dead + "/login").text == "/login"
+    assert s.cookies.get("token", domain="127.0.0.2") == "1", "cookie should be set for configured url too"
+
+    assert s.get(dead + "/a").text == "/a"
+    assert _Handler.cookie == "token=1", "mirror should get its own cookies"
+
+
+def test_async_session(dmhy_server, tmp_path, monkeypatch):
+    monkeypatch.setattr("bgmi.config.cfg.network.dmhy.cache_ttl", 0)
+    monkeypatch.setattr("bgmi.config.cfg.network.dmhy.backoff_factor", 0)
+    s = Session(max_connections_per_host=2, cache=HTTPCache(tmp_path, max_size=1024 * 1024))
+
+    async def main():
+        a = AsyncSession(s)
+        responses = await asyncio.gather(*(a.get(dmhy_server + "/slow") for _ in range(3)))
+        assert [r.text for r in responses] == ["/slow"] * 3
+        assert _Handler.hits == 1, "identical requests should be sent once"
+
+        r = await a.get(dmhy_server + "/slow")
+        assert r.from_cache
+        assert _Handler.not_modified == 1, "response should be revalidated with http cache of session"
+
+        # cookie set by redirect response is sent to redirected url
+        r = await a.get(dmhy_server + "/login")
+        assert r.text == "/login"
+        assert [h.status_code for h in r.history] == [302]
+        assert s.cookies.get("token") == "1", "cookies should be kept by session"
+
+        _Handler.hits = 0
+        r = await a.get(dmhy_server + "/flaky")
+        assert r.status_code == 200
+        assert _Handler.hits == 3
+
+    asyncio.run(main())
+
+
+def test_async_session_mirror(http_server, monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.2", 0))
+        dead = f"http://127.0.0.2:{sock.getsockname()[1]}"
+    monkeypatch.setattr("bgmi.config.cfg.mikan_url", dead)
+    monkeypatch.setattr("bgmi.config.cfg.network.mikan_project.mirrors", [http_server])
+    monkeypatch.setattr("bgmi.config.cfg.network.mikan_project.rate_limit", 100)
+    monkeypatch.setattr("bgmi.config.cfg.network.mikan_project.retries", 0)
+    s = Session(max_connections_per_host=2)
+
+    async def main():
+        a = AsyncSession(s)
+        assert (await a.get(dead + "/login")).text == "/login"
+        assert (await a.get(dead + "/a")).text == "/a"
+
+    asyncio.run(main())
+    assert s.cookies.get("token", domain="127.0.0.2") == "1", "cookie should be set for configured url too"
+    assert s.mirror_stats()["mikan_project"][dead + "/"]["errors"] == 1
+    assert s.rate_limit_stats()[http_server.split("//")[1]]["requests"] == 3, "rate limiter should be shared"
+
+
+def test_async_session_proxy(http_server):
+    s = Session(max_connections_per_host=2)
+    # test server responses path of request, which is the full url for a proxy
+    s.proxies = {"http": http_server, "https": http_server}
+
+    async def main():
+        return await AsyncSession(s).get("http://bgmi.example/a")
+
+    assert asyncio.run(main()).text == "http://bgmi.example/a"
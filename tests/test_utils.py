@@ -1,4 +1,6 @@
+import datetime
 import shutil
+import time
 from pathlib import Path
 from typing import List, Tuple
 
@@ -6,7 +8,17 @@ import pytest
 
 from bgmi.config import cfg
 from bgmi.front.index import get_player
-from bgmi.utils import episode_filter_regex, parse_episode
+from bgmi.utils import (
+    _fast_parse_episode,
+    _local_hour_timestamp,
+    episode_filter_regex,
+    get_episode_filter,
+    parse_episode,
+    parse_episode_stats,
+    parse_episodes,
+    parse_time,
+    release_preference_key,
+)
 from bgmi.website.model import Episode
 
 _episode_cases: List[Tuple[str, int]] = [
@@ -48,6 +60,73 @@ def test_episode_parse(title, episode):
     ), f"\ntitle: {title!r}\nepisode: {episode}\nparsed episode: {parse_episode(title)}"
 
 
+_fast_path_cases: List[Tuple[str, int]] = [
+    ("[喵萌奶茶屋&LoliHouse] 葬送的芙莉莲 / Sousou no Frieren - 07 [WebRip 1080p HEVC-10bit AAC][简繁日内封字幕]", 7),
+    ("【喵萌奶茶屋】★七月新番★[来自深渊/Made in Abyss][07][GB][720P]", 7),
+    ("[桜都字幕组] 间谍过家家 / Spy x Family [12][1080P][简繁内封]", 12),
+    ("[ANi] 葬送的芙莉蓮 - 07 [1080P][Baha][WEB-DL][AAC AVC][CHT][MP4]", 7),
+    ("[云光字幕组] 死神 千年血战篇 第07话 [简体双语][1080p]招募翻译", 7),
+    ("[织梦字幕组][间谍过家家 SPY×FAMILY][25集][1080P][AVC][简日双语]", 25),
+    ("[NC-Raws] 咒术回战 / Jujutsu Kaisen - 47 (B-Global 3840x2160 HEVC AAC MKV)", 47),
+]
+
+
+@pytest.mark.parametrize(("title", "episode"), _episode_cases + _fast_path_cases)
+def test_fast_parse_episode(title, episode):
+    # fast path either gives up, or agree with general parser
+    assert _fast_parse_episode(title) in (None, episode)
+    assert parse_episode.__wrapped__(title) == episode
+
+
+def test_fast_parse_episode_hit():
+    assert _fast_parse_episode("[Sub] Title - 07 [1080p][MP4]") == 7
+    assert _fast_parse_episode("[Sub][Title][07][GB][720P]") == 7
+    assert _fast_parse_episode("[Sub] Title 第07话 [1080p]") == 7
+    # range and multiple numbers are left to general parser
+    assert _fast_parse_episode("[Sub][Title][01-12][GB][720P]") is None
+    assert _fast_parse_episode("[Sub][Title 2][07][GB][720P]") is None
+
+
+def test_parse_episodes():
+    parse_episode.cache_clear()
+    titles = [title for title, _ in _fast_path_cases]
+    assert parse_episodes(titles + titles) == [episode for _, episode in _fast_path_cases] * 2
+
+    stats = parse_episode_stats()
+    assert stats["misses"] == len(titles)
+    assert stats["hits"] == 0
+    assert parse_episodes(titles) == [episode for _, episode in _fast_path_cases]
+    assert parse_episode_stats()["hit_rate"] == 0.5
+
+
+@pytest.mark.skipif(not hasattr(time, "tzset"), reason="time.tzset is not available on windows")
+@pytest.mark.parametrize("tz", ["Asia/Shanghai", "America/New_York", "UTC"])
+def test_parse_time(monkeypatch, tz):
+    monkeypatch.setenv("TZ", tz)
+    time.tzset()
+    try:
+        _local_hour_timestamp.cache_clear()
+        # every 37 minutes of a year, crossing DST changes
+        t = datetime.datetime(2023, 1, 1)
+        for _ in range(0, 365 * 24 * 60, 37):
+            t += datetime.timedelta(minutes=37)
+            s = t.strftime("%Y/%m/%d %H:%M")
+            assert parse_time(s) == int(time.mktime(time.strptime(s, "%Y/%m/%d %H:%M"))), s
+
+            s = t.strftime("%Y-%m-%dT%H:%M:%S") + ".000Z"
+            expected = int(datetime.datetime.strptime(s.split(".")[0], "%Y-%m-%dT%H:%M:%S").timestamp())
+            assert parse_time(s) == expected, s
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+        _local_hour_timestamp.cache_clear()
+
+    with pytest.raises(ValueError):
+        parse_time("2023/13/01 12:00")
+    with pytest.raises(ValueError):
+        parse_time("12:00")
+
+
 def test_remove_dupe():
     e = Episode.remove_duplicated_bangumi(
         [
@@ -63,6 +142,41 @@ def test_remove_dupe():
     assert {x.episode for x in e} == {1, 2, 3, 5}
 
 
+def test_remove_dupe_with_preference(monkeypatch):
+    episodes = [
+        Episode(title="[A][01][720p]", download="1", episode=1, subtitle_group="a", time=1),
+        Episode(title="[B][01][1080p]", download="2", episode=1, subtitle_group="b", time=2),
+        Episode(title="[A][02][720p]", download="3", episode=2, subtitle_group="a", time=4),
+        Episode(title="[C][02][1080p]", download="4", episode=2, subtitle_group="c", time=3),
+        Episode(title="[C][03][720p]", download="5", episode=3, subtitle_group="c", time=5),
+    ]
+
+    assert release_preference_key() is None
+    assert [e.download for e in Episode.remove_duplicated_bangumi(episodes)] == ["1", "3", "5"]
+
+    monkeypatch.setattr(cfg.release_preference, "newest", True)
+    assert [e.download for e in Episode.remove_duplicated_bangumi(episodes, release_preference_key())] == [
+        "2",
+        "3",
+        "5",
+    ]
+
+    monkeypatch.setattr(cfg.release_preference, "keywords", ["1080"])
+    assert [e.download for e in Episode.remove_duplicated_bangumi(episodes, release_preference_key())] == [
+        "2",
+        "4",
+        "5",
+    ]
+
+    # subtitle group goes before keywords
+    monkeypatch.setattr(cfg.release_preference, "subtitle_groups", ["a"])
+    assert [e.download for e in Episode.remove_duplicated_bangumi(episodes, release_preference_key())] == [
+        "1",
+        "3",
+        "5",
+    ]
+
+
 def test_episode_regex():
     e = episode_filter_regex(
         [
@@ -79,6 +193,36 @@ def test_episode_regex():
     assert {x.name for x in e} == {"1"}
 
 
+def test_episode_filter(monkeypatch):
+    monkeypatch.setattr(cfg, "enable_global_filters", True)
+    monkeypatch.setattr(cfg, "global_filters", ["HEVC"])
+    monkeypatch.setattr(cfg, "enable_global_include_keywords", True)
+    monkeypatch.setattr(cfg, "global_include_keywords", ["1080"])
+
+    episodes = [
+        Episode(title="[A] Title - 01 [1080p][GB]", download="1"),
+        Episode(title="[A] Title - 01 [720p][GB]", download="2"),
+        Episode(title="[B] Title - 01 [1080p][BIG5]", download="3"),
+        Episode(title="[A] Title - 01 [1080p HEVC][GB]", download="4"),
+        Episode(title="[C] Title - 01 [1080p][gb]", download="5"),
+        Episode(title="[A] Title (a+b) - 01 [1080p][GB]", download="6"),
+    ]
+
+    f = get_episode_filter(include="gb, big5", exclude="[c]", regex=r"^\[[AB]\]")
+    assert f is get_episode_filter(include="gb, big5", exclude="[c]", regex=r"^\[[AB]\]")
+    assert [e.download for e in f.apply(episodes)] == ["1", "3", "6"]
+
+    # keywords are not regex
+    assert [e.download for e in get_episode_filter(include="(a+b)").apply(episodes)] == ["6"]
+
+    # config changes are picked up
+    monkeypatch.setattr(cfg, "enable_global_include_keywords", False)
+    assert [e.download for e in get_episode_filter(exclude="[c]").apply(episodes)] == ["1", "2", "3", "6"]
+    monkeypatch.setattr(cfg, "global_include_keywords", [])
+    monkeypatch.setattr(cfg, "enable_global_include_keywords", True)
+    assert get_episode_filter().apply(episodes) == []
+
+
 def test_episode_exclude_word():
     assert Episode(title="a b c", download="").contains_any_words(["a"])
     assert Episode(title="A B c", download="").contains_any_words(["a", "b"])